@@ -0,0 +1,204 @@
+# library_benchmark.py
+"""音乐库操作的基准测试（无界面）
+
+生成 1k/10k/100k 条合成 Music，分别计时预设保存/加载、增删改、筛选和标签菜单重建，
+结果写入 JSON，可与之前的结果比较以发现性能回退：
+
+    python benchmarks/library_benchmark.py --output bench.json
+    python benchmarks/library_benchmark.py --sizes 1000 10000 --compare bench.json
+"""
+
+import argparse
+import json
+import os
+import platform
+import random
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from src.library_store import LibraryStore  # noqa: E402
+from src.music import Music, MusicManager  # noqa: E402
+from src.play_mode import PlayMode  # noqa: E402
+
+TAG_VOCABULARY = [f"tag{i:03d}" for i in range(200)] + ["battle", "forest", "cave", "tavern", "vocal", "calm", "战斗", "森林"]
+WORDS = ["dark", "light", "wind", "rain", "drums", "theme", "loop", "ambience", "boss", "town", "雨", "风", "夜"]
+PLAY_MODES = list(PlayMode)
+
+
+def make_library(size, seed=0):
+    """生成可复现的合成音乐库"""
+    rng = random.Random(seed)
+    library = []
+    for index in range(size):
+        name = f"{rng.choice(WORDS)} {rng.choice(WORDS)} {index:06d}.mp3"
+        tags = rng.sample(TAG_VOCABULARY, rng.randint(1, 5))
+        library.append(Music(name=name, absolute_path=f"/music/{name}", tags=tags,
+                             play_mode=rng.choice(PLAY_MODES), start_time=0, end_time=rng.uniform(5, 300)))
+    return library
+
+
+def measure(function, repeat, teardown=None):
+    """运行 repeat 次，返回各次耗时（秒）；teardown 在每次计时之后运行，不计入耗时"""
+    timings = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        function()
+        timings.append(time.perf_counter() - started)
+        if teardown is not None:
+            teardown()
+    return timings
+
+
+def summarize(timings, operations=1):
+    return {
+        "median_ms": statistics.median(timings) * 1000,
+        "min_ms": min(timings) * 1000,
+        "max_ms": max(timings) * 1000,
+        "per_op_us": statistics.median(timings) / operations * 1e6,
+        "operations": operations,
+        "runs": len(timings),
+    }
+
+
+def filled_manager(library):
+    manager = MusicManager()
+    for music in library:
+        manager.add_music(music)
+    return manager
+
+
+def bench_size(size, repeat, work_dir):
+    library = make_library(size)
+    rng = random.Random(1)
+    sample_size = min(1000, size)
+    results = {}
+
+    # 增删改
+    def add_all():
+        filled_manager(library)
+    results["add_music"] = summarize(measure(add_all, repeat), size)
+
+    manager = filled_manager(library)
+    victims = rng.sample(library, sample_size)
+
+    def update_some():
+        for music in victims:
+            manager.update_music(music.name, new_tags=music.tags[::-1], new_play_mode=rng.choice(PLAY_MODES))
+    results["update_music"] = summarize(measure(update_some, repeat), sample_size)
+
+    def remove_some():
+        for music in victims:
+            manager.remove_music(music.name)
+
+    def readd():
+        for music in victims:
+            manager.add_music(music)
+    results["remove_music"] = summarize(measure(remove_some, repeat, teardown=readd), sample_size)
+
+    # 筛选
+    queries = {
+        "filter_tag": dict(query="battle"),
+        "filter_boolean": dict(query="battle AND (forest OR cave) NOT vocal"),
+        "filter_play_mode": dict(play_mode=PlayMode.LOOP),
+        "filter_combined": dict(query="tag001 OR tag002 OR 战斗", play_mode=PlayMode.ONCE, search="dark"),
+    }
+    for label, kwargs in queries.items():
+        def run_filter(kwargs=kwargs):
+            manager._query_cache.clear()  # 计时的是未命中缓存的查询
+            manager.filter(**kwargs)
+        results[label] = summarize(measure(run_filter, repeat))
+
+    def type_search():
+        for prefix in ("d", "da", "dar", "dark", "dark ", "dark w", "dark wi"):
+            manager.filter(search=prefix)
+    results["search_as_you_type"] = summarize(measure(type_search, repeat), 7)
+
+    def rebuild_tag_menu():
+        ["所有标签"] + sorted(manager.get_tags())
+    results["tag_menu_options"] = summarize(measure(rebuild_tag_menu, repeat))
+
+    # 预设保存/加载
+    db_path = os.path.join(work_dir, f"library_{size}.db")
+    store = LibraryStore(db_path)
+    try:
+        results["save_preset"] = summarize(measure(lambda: store.save_preset("bench", library), repeat), size)
+        results["load_preset"] = summarize(measure(lambda: store.load_preset("bench"), repeat), size)
+        results["load_first_screen"] = summarize(measure(lambda: next(store.iter_preset("bench")), repeat))
+        results["upsert_one"] = summarize(measure(lambda: store.upsert_music(victims[0], "bench"), repeat))
+
+        def load_into_manager():
+            loaded = filled_manager([])
+            for batch in store.iter_preset("bench"):
+                for music in batch:
+                    loaded.add_music(music)
+        results["load_preset_into_manager"] = summarize(measure(load_into_manager, repeat), size)
+    finally:
+        store.close()
+    return results
+
+
+def git_revision():
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True,
+                              cwd=os.path.dirname(os.path.abspath(__file__)), check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def compare(current, baseline, threshold):
+    """打印比基线慢 threshold 倍以上的项目，返回回退数量"""
+    regressions = 0
+    for size, operations in current["results"].items():
+        for name, result in operations.items():
+            base = baseline.get("results", {}).get(size, {}).get(name)
+            if not base or base["median_ms"] <= 0:
+                continue
+            ratio = result["median_ms"] / base["median_ms"]
+            if ratio >= threshold:
+                regressions += 1
+                print(f"REGRESSION {size:>7} {name:<26} {base['median_ms']:9.2f} ms -> {result['median_ms']:9.2f} ms "
+                      f"({ratio:.2f}x)")
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description="LiveAudioPlayer library benchmarks")
+    parser.add_argument("--sizes", type=int, nargs="+", default=[1000, 10000, 100000])
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--output", help="write results to this JSON file")
+    parser.add_argument("--compare", help="baseline JSON to compare against")
+    parser.add_argument("--threshold", type=float, default=1.25, help="slowdown ratio reported as a regression")
+    args = parser.parse_args()
+
+    report = {
+        "revision": git_revision(),
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "repeat": args.repeat,
+        "results": {},
+    }
+    with tempfile.TemporaryDirectory() as work_dir:
+        for size in args.sizes:
+            started = time.perf_counter()
+            report["results"][str(size)] = bench_size(size, args.repeat, work_dir)
+            print(f"{size:>7} entries: {time.perf_counter() - started:.1f} s")
+            for name, result in report["results"][str(size)].items():
+                print(f"        {name:<26} {result['median_ms']:10.2f} ms  ({result['per_op_us']:9.2f} us/op)")
+
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(report, f, ensure_ascii=False, indent=2)
+    if args.compare:
+        with open(args.compare, "r", encoding="utf-8") as f:
+            regressions = compare(report, json.load(f), args.threshold)
+        sys.exit(1 if regressions else 0)
+
+
+if __name__ == "__main__":
+    main()
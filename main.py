@@ -1,27 +1,53 @@
+import time
+_PROCESS_STARTED = time.perf_counter()  # 启动计时起点，包含下面的模块导入
+
+import argparse
+import threading
 import customtkinter
 import customtkinter
 import os
-from tkinter import filedialog, messagebox
+from tkinter import filedialog
 from PIL import Image
 import pygame
 import random
+import queue
 from tkinter import filedialog
 from src.play_mode import PlayMode
 from src.ImportMusicWindow import ImportMusicWindow
 import os, json
-import shutil
 from src.music import Music, MusicManager
 from src.scrollable_music_info import ScrollableMusicInfo
 from src.ScrollableMusicListFrame import ScrollableMusicListFrame
+from src.mixer_engine import MixerEngine, FADE_CURVES
+from src.spectrum_visualizer import RingBuffer, SpectrumVisualizer
+from src.soundboard import Soundboard
+from src.pcm_cache import PCMCache
+from src.decoded_store import DecodedStore
+from src.audio_probe import DurationCache
+from src.library_store import LibraryStore, fit_trim
+from src.startup_profile import StartupProfiler
+from src.import_queue import ImportQueue, find_audio_files, folder_tags
+from src.content_store import ContentStore
+from src.scene import ScenePreparer
+from src.library_scanner import LibraryScanner
+from src.control_server import DEFAULT_PORT, CommandError, ControlServer, LibrarySnapshot
+from src import tag_query
+from src.audio_analysis import AudioAnalyzer, FeatureCache, normalization_gain_db
+from src import instrumentation
+from src.instrumentation import EventLoopMonitor, timed
+from src.instrumentation_panel import InstrumentationPanel
             
 import hashlib
-# 初始化Pygame Mixer
-pygame.mixer.init()
 
+AUDIO_BUFFER_FRAMES = 512  # 声卡输出缓冲区，决定热键触发后还要多久才能听到声音
+LIBRARY_SCAN_INTERVAL_MS = 60 * 1000  # 后台扫描 music_dir 的间隔
+SCENE_PREPARE_TIMEOUT = 10.0  # 远程切换场景时等待后台准备的最长时间（秒）
 
 class LiveAudioPlayer(customtkinter.CTk):
-    def __init__(self):
+    def __init__(self, startup_profile=False, control_port=DEFAULT_PORT):
         super().__init__()
+        self.profiler = StartupProfiler(enabled=startup_profile, origin=_PROCESS_STARTED)
+        self.profiler.checkpoint("imports + Tk")
 
         self.title("LiveAudioPlayer")
         self.geometry("1200x800")
@@ -30,23 +56,25 @@ class LiveAudioPlayer(customtkinter.CTk):
         self.filter_tag = None  # 当前筛选标签
         self.tag_library = {}  # 标签库，用于存储标签和其对应的音乐文件
         self.filter_tags = {}
+        self.pcm_cache = PCMCache(max_bytes=512 * 1024 * 1024)  # 已解码片段的内存缓存
+        self.soundboard = Soundboard(self.pcm_cache, buffer_frames=AUDIO_BUFFER_FRAMES)  # 热键音效板
         
         # 设置网格布局
         self.grid_rowconfigure(0, weight=1)
         self.grid_columnconfigure(1, weight=5)  # 主区域占3倍宽度
         self.grid_columnconfigure(2, weight=1)  # 右侧操作栏占1倍宽度
 
-        # 加载图标
-        image_path = os.path.join(os.path.dirname(os.path.realpath(__file__)), "assets")
-        self.logo_image = customtkinter.CTkImage(Image.open(os.path.join(image_path, "logo.png")), size=(26, 26))
-        self.import_image = customtkinter.CTkImage(Image.open(os.path.join(image_path, "import.png")), size=(20, 20))
-        self.play_image = customtkinter.CTkImage(Image.open(os.path.join(image_path, "play.png")), size=(20, 20))
-        self.settings_image = customtkinter.CTkImage(Image.open(os.path.join(image_path, "settings.png")), size=(20, 20))
+        # 图标在后台线程中解码，窗口先以无图标的状态显示
+        self.logo_image = None
+        self.import_image = None
+        self.play_image = None
+        self.settings_image = None
+        self.mixer_engine = None  # 混音引擎在后台初始化，见 init_audio
 
         # 创建导航栏
         self.navigation_frame = customtkinter.CTkFrame(self, corner_radius=0)
         self.navigation_frame.grid(row=0, column=0, sticky="nsew")
-        self.navigation_frame.grid_rowconfigure(4, weight=1)
+        self.navigation_frame.grid_rowconfigure(5, weight=1)
 
         self.navigation_frame_label = customtkinter.CTkLabel(self.navigation_frame, text="  LiveAudioPlayer", image=self.logo_image,
                                                              compound="left", font=customtkinter.CTkFont(size=15, weight="bold"))
@@ -63,22 +91,39 @@ class LiveAudioPlayer(customtkinter.CTk):
                                                      image=self.import_image, anchor="w", command=self.import_music)
         self.import_button.grid(row=2, column=0, sticky="ew")
 
+        self.import_folder_button = customtkinter.CTkButton(self.navigation_frame, corner_radius=0, height=40, border_spacing=10, text="Import Folder",
+                                                            fg_color="transparent", text_color=("gray10", "gray90"), hover_color=("gray70", "gray30"),
+                                                            anchor="w", command=self.import_music_folder)
+        self.import_folder_button.grid(row=3, column=0, sticky="ew")
+
         self.settings_button = customtkinter.CTkButton(self.navigation_frame, corner_radius=0, height=40, border_spacing=10, text="Settings",
                                                        fg_color="transparent", text_color=("gray10", "gray90"), hover_color=("gray70", "gray30"),
                                                        image=self.settings_image, anchor="w", command=self.settings_button_event)
-        self.settings_button.grid(row=3, column=0, sticky="ew")
+        self.settings_button.grid(row=4, column=0, sticky="ew")
+
+        # 批量导入进度（导入时显示）
+        self.import_progress_frame = customtkinter.CTkFrame(self.navigation_frame, fg_color="transparent")
+        self.import_progress_label = customtkinter.CTkLabel(self.import_progress_frame, text="", font=("Arial", 10))
+        self.import_progress_label.grid(row=0, column=0, columnspan=2, sticky="w")
+        self.import_progress_bar = customtkinter.CTkProgressBar(self.import_progress_frame, width=120)
+        self.import_progress_bar.grid(row=1, column=0, padx=(0, 5))
+        self.import_cancel_button = customtkinter.CTkButton(self.import_progress_frame, text="Cancel", width=50,
+                                                            command=self.cancel_import)
+        self.import_cancel_button.grid(row=1, column=1)
 
         # 模式切换菜单
         self.appearance_mode_menu = customtkinter.CTkOptionMenu(self.navigation_frame, values=["Light", "Dark", "System"],
                                                                 command=self.change_appearance_mode_event)
-        self.appearance_mode_menu.grid(row=6, column=0, padx=20, pady=20, sticky="s")
+        self.appearance_mode_menu.grid(row=7, column=0, padx=20, pady=20, sticky="s")
 
         # 创建主要显示区域（如音频频谱、全局控制）
         self.home_frame = customtkinter.CTkFrame(self, corner_radius=0, fg_color="transparent")
         self.home_frame.grid(row=0, column=1, sticky="nsew", padx=20, pady=20)
 
-        self.home_frame_label = customtkinter.CTkLabel(self.home_frame, text="Audio Visualization")
-        self.home_frame_label.grid(row=0, column=0, padx=20, pady=20)
+        self.home_frame.grid_columnconfigure(0, weight=1)
+        # 实时频谱和电平表，混音引擎就绪后开始绘制
+        self.visualizer = SpectrumVisualizer(self.home_frame, fg_color="transparent")
+        self.visualizer.grid(row=0, column=0, sticky="nsew", padx=20, pady=20)
 
         # 全局控制区
         self.control_frame = customtkinter.CTkFrame(self.home_frame)
@@ -94,6 +139,33 @@ class LiveAudioPlayer(customtkinter.CTk):
         self.volume_slider.set(50)
         self.volume_slider.grid(row=0, column=2, padx=5)
 
+        # 列表播放的交叉淡化设置
+        self.crossfade_label = customtkinter.CTkLabel(self.control_frame, text="Crossfade 3.0 s")
+        self.crossfade_label.grid(row=1, column=0, padx=5, pady=(5, 0))
+        self.crossfade_slider = customtkinter.CTkSlider(self.control_frame, from_=0, to=10, number_of_steps=20,
+                                                        command=self.set_crossfade_seconds)
+        self.crossfade_slider.grid(row=1, column=1, padx=5, pady=(5, 0))
+        self.fade_curve_menu = customtkinter.CTkOptionMenu(self.control_frame, values=list(FADE_CURVES),
+                                                           command=self.set_fade_curve)
+        self.fade_curve_menu.grid(row=1, column=2, padx=5, pady=(5, 0))
+        # LOOP 模式接缝处理
+        self.loop_seam_menu = customtkinter.CTkOptionMenu(self.control_frame, values=["crossfade", "zero_crossing", "none"],
+                                                          command=self.set_loop_seam)
+        self.loop_seam_menu.grid(row=1, column=3, padx=5, pady=(5, 0))
+
+        # 混音耗时显示
+        self.mix_stats_label = customtkinter.CTkLabel(self.control_frame, text="", font=("Arial", 10))
+        self.mix_stats_label.grid(row=2, column=0, columnspan=4, padx=5, pady=(5, 0))
+
+        # 设置页：运行时诊断面板
+        self.event_loop_monitor = EventLoopMonitor(self)  # 用 after() 心跳测量事件循环延迟
+        self.settings_frame = customtkinter.CTkFrame(self, corner_radius=0, fg_color="transparent")
+        self.settings_frame.grid_columnconfigure(0, weight=1)
+        self.settings_frame.grid_rowconfigure(0, weight=1)
+        self.instrumentation_panel = InstrumentationPanel(self.settings_frame, self.collect_diagnostics,
+                                                          reset=self.reset_diagnostics)
+        self.instrumentation_panel.grid(row=0, column=0, sticky="nsew")
+
         # 右侧操作栏
         self.right_panel = customtkinter.CTkFrame(self, width=250, corner_radius=0)
         self.right_panel.grid(row=0, column=2, sticky="nsew", padx=20, pady=20)
@@ -106,78 +178,542 @@ class LiveAudioPlayer(customtkinter.CTk):
         )
         self.file_list_label.grid(row=0, column=0, padx=10, pady=10)
 
+        # 搜索框：每次按键在上一次结果中继续收窄
+        self.search_entry = customtkinter.CTkEntry(self.right_panel, placeholder_text="搜索名称或标签")
+        self.search_entry.grid(row=1, column=0, sticky="ew", padx=10)
+        self.search_entry.bind("<KeyRelease>", lambda e: self.file_list_frame.apply_search(self.search_entry.get()))
+
         # 创建音乐文件列表框架
         self.file_list_frame = ScrollableMusicListFrame(
             self.right_panel,
             app=self,  # 将主窗口实例传递给 ScrollableMusicListFrame
         )
-        self.file_list_frame.grid(row=1, column=0, sticky="nsew", padx=10, pady=10)
+        self.file_list_frame.grid(row=2, column=0, sticky="nsew", padx=10, pady=10)
 
         # 音乐预设管理
         self.preset_label = customtkinter.CTkLabel(self.right_panel, text="Music Presets", font=customtkinter.CTkFont(size=14, weight="bold"))
-        self.preset_label.grid(row=2, column=0, padx=10, pady=10)
+        self.preset_label.grid(row=3, column=0, padx=10, pady=10)
         
         self.create_preset_button = customtkinter.CTkButton(self.right_panel, text="Create Preset", command=self.create_preset)
-        self.create_preset_button.grid(row=3, column=0, padx=10, pady=5)
+        self.create_preset_button.grid(row=4, column=0, padx=10, pady=5)
         
         self.save_preset_button = customtkinter.CTkButton(self.right_panel, text="Save Preset", command=self.save_preset)
-        self.save_preset_button.grid(row=4, column=0, padx=10, pady=5)
+        self.save_preset_button.grid(row=5, column=0, padx=10, pady=5)
+
+        # 场景切换：选择后在后台准备，切换时只替换音轨
+        self.scene_frame = customtkinter.CTkFrame(self.right_panel, fg_color="transparent")
+        self.scene_frame.grid(row=6, column=0, padx=10, pady=5)
+        self.scene_menu = customtkinter.CTkOptionMenu(self.scene_frame, values=[], width=140, command=self.prepare_scene)
+        self.scene_menu.grid(row=0, column=0, padx=(0, 5))
+        self.switch_scene_button = customtkinter.CTkButton(self.scene_frame, text="Switch", width=60,
+                                                           command=self.switch_scene)
+        self.switch_scene_button.grid(row=0, column=1)
+        self.scene_crossfade_check = customtkinter.CTkCheckBox(self.scene_frame, text="Crossfade")
+        self.scene_crossfade_check.select()
+        self.scene_crossfade_check.grid(row=1, column=0, sticky="w", pady=(5, 0))
+        self.scene_status_label = customtkinter.CTkLabel(self.scene_frame, text="", font=("Arial", 10))
+        self.scene_status_label.grid(row=2, column=0, columnspan=2, sticky="w")
 
         self.presets_dir = os.path.join(self.music_dir, "presets") 
         if not os.path.exists(self.presets_dir):   # 如果 presets 目录不存在，则创建
             os.makedirs(self.presets_dir)
-        self.load_recent_preset()    # 加载最近的预设文件
+        self.cache_dir = os.path.join(self.music_dir, ".cache")  # 各类缓存文件目录
+        self.pcm_cache.disk = DecodedStore(os.path.join(self.cache_dir, "pcm"))  # 解码一次，之后通过 mmap 读取
+        self.duration_cache = DurationCache(os.path.join(self.cache_dir, "durations.json"))
+        self.content_store = ContentStore(self.music_dir)  # 按内容哈希去重的音乐文件仓库
+        # 手动放入或删除的文件由后台扫描同步到音乐库
+        self.library_scanner = LibraryScanner(self.music_dir, os.path.join(self.cache_dir, "library_index.json"),
+                                              self.duration_cache)
+        self.scan_running = False
+        self.feature_cache = FeatureCache(os.path.join(self.cache_dir, "features.json"))
+        self.audio_analyzer = AudioAnalyzer(self.feature_cache)  # 多进程音频特征分析，用于建议标签
+        # 音乐库存储：首次运行时导入旧版 JSON 预设
+        self.library_store = LibraryStore(os.path.join(self.presets_dir, "library.db"))
+        # 后台批量导入；内容已在音乐库中的文件沿用原有记录
+        self.import_queue = ImportQueue(self.content_store, self.duration_cache,
+                                        find_existing=self.library_store.find_by_content_hash)
+        self.library_store.migrate_json_presets(self.presets_dir)
+        self.scene_preparer = ScenePreparer(self.library_store, self.content_store)  # 后台准备下一个场景
+
+        # 音乐全局变量
+        self.music_manager = MusicManager(self.file_list_frame)
+        self.current_music_preset = self.library_store.get_setting("current_preset", "recent")  # 当前的预设名
+        # 供控制端口在其他线程中查询；场景切换以其中的当前预设为准
+        self.library_snapshot = LibrarySnapshot(self.current_music_preset)
+        self.music_manager.add_observer(self.library_snapshot)
+        self.crossfade_slider.set(float(self.library_store.get_setting("crossfade_seconds", "3.0")))
+        self.fade_curve_menu.set(self.library_store.get_setting("fade_curve", "equal_power"))
+        self.loop_seam_menu.set(self.library_store.get_setting("loop_seam", "crossfade"))
+        self.crossfade_label.configure(text=f"Crossfade {self.crossfade_slider.get():.1f} s")
+        self.refresh_scene_menu()
         
         # 默认选中 Home Frame
         self.select_frame_by_name("home")
         
         # 绑定关闭事件
         self.protocol("WM_DELETE_WINDOW", self.on_close)
-        
-        # 音乐全局变量
-        self.music_manager = MusicManager(self.file_list_frame)
-        self.current_music_preset = "recent.json"  # 当前的预设文件名
+        # 音效板热键：子控件的按键事件也会传到主窗口
+        self.bind("<KeyPress>", self.on_hotkey)
+        self.profiler.checkpoint("build ui")
+
+        # 本机控制端口：命令在后台线程中直接交给混音引擎，界面更新通过 remote_queue 交回 Tk 线程
+        self.remote_queue = queue.Queue()
+        self.control_server = None
+        if control_port:
+            self.start_control_server(control_port)
+        self.after(50, self.poll_remote_queue)
+
+        # 窗口显示后再加载音乐库；音频和图标在后台线程中初始化
+        self.profiler.expect("library", "audio", "icons")
+        self.event_loop_monitor.start()
+        self.audio_thread = self.run_in_background(self.init_audio, self.on_audio_ready)
+        self.run_in_background(self.load_icon_images, self.apply_icons)
+        self.after(0, self.finish_startup)
+
+    ##################################启动##############################################
+    def run_in_background(self, target, on_done):
+        """在后台线程中运行 target，完成后在 Tk 线程中以其返回值调用 on_done"""
+        result = {}
+        thread = threading.Thread(target=lambda: result.update(value=target()), daemon=True)
+        thread.start()
+
+        def poll():
+            if thread.is_alive():
+                self.after(20, poll)
+            else:
+                on_done(result.get("value"))
+        self.after(20, poll)
+        return thread
+
+    def finish_startup(self):
+        """窗口显示后加载最近的预设"""
+        self.update_idletasks()
+        self.profiler.checkpoint("show window")
+        with self.profiler.phase("library"):
+            self.load_recent_preset()    # 加载最近的预设
+        self.profiler.done("library")
+        self.after(5000, self.start_library_scan)  # 启动完成后再扫描，避免与加载争抢磁盘
+
+    def init_audio(self):
+        """后台线程：初始化 pygame mixer 并启动混音引擎"""
+        with self.profiler.phase("audio"):
+            pygame.mixer.init(buffer=AUDIO_BUFFER_FRAMES)
+            mixer_engine = MixerEngine(pcm_cache=self.pcm_cache)
+            mixer_engine.start()
+            self.mixer_engine = mixer_engine
+        return mixer_engine
+
+    def on_audio_ready(self, mixer_engine):
+        if mixer_engine is not None:
+            mixer_engine.set_master_volume(self.volume_slider.get() / 100)
+            self.soundboard.set_volume(mixer_engine.master_volume)
+            mixer_engine.set_crossfade(self.crossfade_slider.get(), self.fade_curve_menu.get())
+            mixer_engine.loop_seam = self.loop_seam_menu.get()
+            mixer_engine.tap = RingBuffer()
+            self.visualizer.set_source(mixer_engine.tap, mixer_engine.frequency)
+            self.visualizer.start()
+            self.refresh_hotkeys()
+            self.update_mix_stats()
+        self.profiler.done("audio")
+
+    def ensure_audio(self):
+        """需要立即使用音频时等待后台初始化完成，返回混音引擎（初始化失败时为 None）"""
+        if self.mixer_engine is None and self.audio_thread.is_alive():
+            self.audio_thread.join()
+        return self.mixer_engine
+
+    def load_icon_images(self):
+        """后台线程：解码图标文件"""
+        with self.profiler.phase("icons"):
+            image_path = os.path.join(os.path.dirname(os.path.realpath(__file__)), "assets")
+            images = {}
+            for name in ("logo", "import", "play", "settings"):
+                image = Image.open(os.path.join(image_path, f"{name}.png"))
+                image.load()
+                images[name] = image
+        return images
+
+    def apply_icons(self, images):
+        """在 Tk 线程中创建 CTkImage 并设置到导航栏"""
+        if images:
+            self.logo_image = customtkinter.CTkImage(images["logo"], size=(26, 26))
+            self.import_image = customtkinter.CTkImage(images["import"], size=(20, 20))
+            self.play_image = customtkinter.CTkImage(images["play"], size=(20, 20))
+            self.settings_image = customtkinter.CTkImage(images["settings"], size=(20, 20))
+            self.navigation_frame_label.configure(image=self.logo_image)
+            self.home_button.configure(image=self.play_image)
+            self.import_button.configure(image=self.import_image)
+            self.settings_button.configure(image=self.settings_image)
+        self.profiler.done("icons")
     
     ##################################music_file管理##############################################    
     def delete_music_instance(self, music_name):
         """删除一个音乐文件"""
         self.music_manager.remove_music(music_name)
+        self.library_store.remove_music(music_name, self.current_music_preset)
 
-    def update_music_instance(self, music_name, new_tags=None, new_play_mode=None):
+    def update_music_instance(self, music_name, new_tags=None, new_play_mode=None, new_hotkey=None):
         """更新一个音乐文件"""
-        self.music_manager.update_music(music_name, new_tags=new_tags, new_play_mode=new_play_mode)
+        self.music_manager.update_music(music_name, new_tags=new_tags, new_play_mode=new_play_mode, new_hotkey=new_hotkey)
+        music = self.music_manager.get_music(music_name)
+        if music:
+            self.library_store.upsert_music(music)
     
     # self.music_manager.add_music(music)
     
     ##################################窗口开关时的函数##############################################    
     def on_close(self):
-        """在关闭软件时保存当前状态到 recent.json"""
-        self.save_preset()
+        """关闭软件；音乐库的修改已逐条写入数据库，这里只记录当前预设"""
+        if self.control_server is not None:
+            self.control_server.stop()
+        self.library_store.set_setting("current_preset", self.current_music_preset)
+        self.remember_scene_tracks(self.library_snapshot.preset)
+        self.import_queue.shutdown()
+        self.scene_preparer.shutdown()
+        self.audio_analyzer.shutdown()
+        self.feature_cache.save()
+        self.library_store.close()
+        if self.mixer_engine is not None:
+            self.mixer_engine.shutdown()
         self.destroy()
     
     ##################################import music##############################################
     def import_music(self):
-        # 选择音频文件
-        file_path = filedialog.askopenfilename(filetypes=[("音频文件", "*.mp3 *.wav *.ogg")])
-        if file_path:
+        # 选择音频文件：单个文件打开信息编辑窗口，多个文件在后台批量导入
+        file_paths = filedialog.askopenfilenames(filetypes=[("音频文件", "*.mp3 *.wav *.ogg")])
+        if len(file_paths) > 1:
+            self.start_batch_import([(path, []) for path in file_paths])
+        elif file_paths and self.ensure_audio() is not None:
+            file_path = file_paths[0]
             import_window = ScrollableMusicInfo(self, lambda *args: self.create_music_instance(file_path, *args), file_path)
 
+    def import_music_folder(self):
+        """导入整个文件夹（如音效包），子目录名作为默认标签"""
+        folder = filedialog.askdirectory()
+        if folder:
+            self.start_batch_import([(path, folder_tags(relative_dir)) for path, relative_dir in find_audio_files(folder)])
+
+    def start_batch_import(self, paths_with_tags):
+        """把文件交给后台导入队列，并开始轮询结果"""
+        if not paths_with_tags:
+            return
+        was_active = self.import_queue.active
+        self.import_queue.submit(paths_with_tags)
+        self.show_import_progress(was_active)
+
+    def show_import_progress(self, was_active):
+        """显示进度条；队列原本空闲时开始轮询结果"""
+        self.import_progress_frame.grid(row=6, column=0, padx=20, pady=5, sticky="ew")
+        if not was_active:
+            self.after(100, self.poll_import_queue)
+
+    def poll_import_queue(self):
+        """把已完成的导入分批加入 MusicManager 并刷新进度"""
+        imported, existing = self.import_queue.drain()
+        unique = {}
+        for source_path, music, edited in imported:
+            if music.name in unique:
+                continue  # 相同内容的文件会得到同一个名称，只保留第一个
+            previous = self.music_manager.get_music(music.name) or self.library_store.get_music(music.name)
+            if previous is not None and previous.content_hash == music.content_hash:
+                if not edited:
+                    existing.append(previous)  # 同一内容刚由前一批导入
+                    continue
+                # 信息窗口中的设置覆盖原记录，窗口中没有的增益和热键沿用原值
+                music.gain_db, music.hotkey = previous.gain_db, previous.hotkey
+            unique[music.name] = music
+            self.feature_cache.link(source_path, music.content_hash, music.absolute_path)  # 信息窗口中可能已分析过源文件
+        imported = list(unique.values())
+        for music in imported:
+            self.music_manager.add_music(music)
+        if imported:
+            self.library_store.upsert_many(imported, self.current_music_preset)
+            self.analyze_music(imported)
+        # 重复导入已有内容时只把原有记录加入当前预设，不覆盖其标签、播放模式、裁剪、增益和热键
+        existing = [music for music in {music.name: music for music in existing}.values()
+                    if self.music_manager.get_music(music.name) is None]
+        relinked = [music for music in existing if self.content_store.relink(music)]
+        if relinked:
+            self.library_store.upsert_many(relinked)  # 只有路径变化，其余字段与数据库中相同
+        for music in existing:
+            self.music_manager.add_music(music)
+        if existing:
+            self.library_store.add_to_preset(self.current_music_preset, [music.name for music in existing])
+
+        total = max(self.import_queue.total, 1)
+        self.import_progress_bar.set(self.import_queue.completed / total)
+        self.import_progress_label.configure(text=f"Importing {self.import_queue.completed}/{self.import_queue.total}")
+        if self.import_queue.active:
+            self.after(100, self.poll_import_queue)
+        else:
+            self.import_progress_frame.grid_forget()
+            for path, error in self.import_queue.failed:
+                print(f"Failed to import {path}: {error}")
+
+    def cancel_import(self):
+        self.import_queue.cancel()
+
     def create_music_instance(self, original_path, new_filename, tags, play_mode, start_time, end_time):
-        """创建新的音乐实例并添加到文件列表"""
-        new_path = os.path.join(self.music_dir, new_filename)
-        if not os.path.exists(new_path):
-            shutil.copy(original_path, new_path)
-
-        # 创建音乐实例
-        music = Music(
-            name=new_filename,
-            absolute_path=new_path,
-            tags=tags,
-            play_mode=play_mode,
-            start_time=start_time,
-            end_time=end_time
-        )
-        self.music_manager.add_music(music)
+        """按信息窗口中的设置在后台导入文件，完成后添加到文件列表"""
+        # 哈希和复制在导入队列中进行；相同内容只保存一份，new_filename 被其他内容占用时会自动编号
+        was_active = self.import_queue.active
+        self.import_queue.submit_edited(original_path, new_filename, tags, play_mode, start_time, end_time)
+        self.show_import_progress(was_active)
+
+    ##################################远程控制##############################################
+    def start_control_server(self, port):
+        commands = {
+            "play": self.remote_play,
+            "stop": self.remote_stop,
+            "volume": self.remote_volume,
+            "preset": self.remote_preset,
+            "random": self.remote_random,
+            "stats": self.remote_stats,
+            "ping": self.remote_ping,
+        }
+        self.control_server = ControlServer(
+            commands, port=port,
+            on_latency=lambda name, elapsed: instrumentation.registry.record(f"remote_{name}_to_audio", elapsed))
+        try:
+            self.control_server.start()
+        except OSError as e:
+            print(f"Control server disabled: cannot listen on port {port}: {e}")
+            self.control_server = None
+
+    def poll_remote_queue(self):
+        """在 Tk 线程中执行远程命令附带的界面更新"""
+        while True:
+            try:
+                update = self.remote_queue.get_nowait()
+            except queue.Empty:
+                break
+            update()
+        self.after(50, self.poll_remote_queue)
+
+    # 以下 remote_* 在控制端口的线程池中运行，不能直接访问 Tk 控件
+    def remote_engine(self):
+        if self.ensure_audio() is None:
+            raise CommandError("audio is not available")
+        return self.mixer_engine
+
+    @staticmethod
+    def remote_argument(command):
+        if not command.args:
+            raise CommandError(f"usage: {command.name} <name>")
+        return command.args.strip('"')
+
+    def remote_play(self, command):
+        engine = self.remote_engine()
+        name = self.remote_argument(command)
+        music = self.library_snapshot.get(name)
+        if music is None:
+            raise CommandError(f"music not found: {name}")
+        engine.play(music)
+        command.wait_for_audio(engine)
+        return {"music": name}
+
+    def remote_stop(self, command):
+        engine = self.remote_engine()
+        if command.args:
+            engine.stop(command.args.strip('"'))
+            self.soundboard.stop(command.args.strip('"'))
+        else:
+            engine.stop_all()
+            self.soundboard.stop_all()
+        return None
+
+    def remote_volume(self, command):
+        engine = self.remote_engine()
+        try:
+            volume = min(max(float(command.args), 0.0), 100.0)
+        except ValueError:
+            raise CommandError("usage: volume <0-100>")
+        engine.set_master_volume(volume / 100)
+        self.soundboard.set_volume(engine.master_volume)
+        self.remote_queue.put(lambda: self.volume_slider.set(volume))
+        return {"volume": volume}
+
+    def remote_preset(self, command):
+        """在后台准备场景并直接切换音轨；音乐列表随后在 Tk 线程中更新"""
+        engine = self.remote_engine()
+        name, crossfade = self.remote_argument(command), engine.crossfade_seconds
+        parts = name.rsplit(" ", 1)
+        if len(parts) == 2:
+            try:
+                name, crossfade = parts[0].strip('"'), float(parts[1])
+            except ValueError:
+                pass
+        if name not in self.library_store.list_presets():
+            raise CommandError(f"preset not found: {name}")
+        if name == self.library_snapshot.preset:
+            return {"preset": name, "unchanged": True}
+        future = self.scene_preparer.prepare(name, engine, self.scene_opening_names(name))
+        self.scene_preparer.take(name)
+        try:
+            scene = future.result(timeout=SCENE_PREPARE_TIMEOUT)
+        except TimeoutError:
+            future.cancel()
+            raise CommandError(f"preparing {name} took longer than {SCENE_PREPARE_TIMEOUT:.0f} s")
+
+        def switch(previous):
+            self.remember_scene_tracks(previous)
+            engine.switch_scene(scene.tracks, crossfade, engine.fade_curve)
+        if not self.library_snapshot.switch_preset(name, switch):
+            return {"preset": name, "unchanged": True}  # 界面在准备期间已切换到该场景
+        if scene.tracks:
+            command.wait_for_audio(engine)
+        self.remote_queue.put(lambda: self.adopt_scene(scene))
+        return {"preset": name, "tracks": [track.music.name for track in scene.tracks],
+                "prepare_ms": scene.prepare_time * 1000}
+
+    def remote_random(self, command):
+        """在匹配标签查询的音乐中随机播放一首"""
+        engine = self.remote_engine()
+        try:
+            node = tag_query.parse(command.args) if command.args else None
+        except tag_query.TagQueryError as e:
+            raise CommandError(f"invalid tag query: {e}")
+        candidates = [music for music in self.library_snapshot.all()
+                      if node is None or tag_query.matches(node, music.tags)]
+        if not candidates:
+            raise CommandError(f"no music matches: {command.args}")
+        music = random.choice(candidates)
+        engine.play(music)
+        command.wait_for_audio(engine)
+        return {"music": music.name, "candidates": len(candidates)}
+
+    def remote_stats(self, command):
+        engine = self.remote_engine()
+        operations = instrumentation.registry.snapshot()
+        return {"mixer": engine.stats.snapshot(),
+                "latency": {name: stats for name, stats in operations.items() if name.startswith("remote_")}}
+
+    def remote_ping(self, command):
+        return {"preset": self.library_snapshot.preset}
+
+    ##################################目录扫描##############################################
+    def start_library_scan(self):
+        """在后台扫描 music_dir，完成后把差异同步到音乐库；导入进行中时推迟"""
+        if self.scan_running or self.import_queue.active:
+            self.after(LIBRARY_SCAN_INTERVAL_MS, self.start_library_scan)
+            return
+        self.scan_running = True
+        self.run_in_background(self.library_scanner.scan, self.on_library_scanned)
+
+    def on_library_scanned(self, result):
+        self.scan_running = False
+        if result:
+            self.apply_library_changes(result)
+        self.after(LIBRARY_SCAN_INTERVAL_MS, self.start_library_scan)
+
+    def apply_library_changes(self, result):
+        """把扫描到的新增、删除、移动和内容变化同步到数据库和 MusicManager"""
+        by_path = {music.absolute_path: music for music in self.music_manager.get_all_music()}
+        known = self.library_store.find_by_paths(
+            [old_path for old_path, _ in result.moved] + result.removed +
+            [scanned.path for scanned in result.added + result.changed])
+
+        for old_path, scanned in result.moved:
+            self.library_store.relocate(old_path, scanned.path)
+            if old_path in by_path:
+                by_path[old_path].absolute_path = scanned.path
+
+        changed = []
+        for scanned in result.changed:
+            for _, old_hash in known.get(scanned.path, []):
+                self.pcm_cache.invalidate(scanned.path, old_hash)
+            self.pcm_cache.invalidate(scanned.path)
+            self.library_store.update_content(scanned.path, scanned.content_hash, scanned.duration,
+                                              scanned.previous_duration)
+            music = by_path.get(scanned.path)
+            if music is not None:
+                music.content_hash = scanned.content_hash
+                music.gain_db = None
+                if scanned.duration is not None:
+                    music.start_time, music.end_time = fit_trim(music.start_time, music.end_time, scanned.duration,
+                                                                scanned.previous_duration)
+                changed.append(music)
+
+        for path in result.removed:
+            for name, content_hash in known.get(path, []):
+                # 导入的文件在内容仓库中还有一份时改为指向仓库，否则从音乐库中删除
+                replacement = self.content_store.resolve(content_hash) if content_hash else None
+                if replacement is not None:
+                    self.library_store.relocate(path, replacement)
+                    if path in by_path:
+                        by_path[path].absolute_path = replacement
+                else:
+                    self.library_store.remove_music(name)
+                    if self.music_manager.get_music(name) is not None:
+                        self.music_manager.remove_music(name)
+
+        added = []
+        for scanned in result.added:
+            if scanned.path in known or scanned.path in by_path:
+                continue  # 已经在音乐库中（例如刚导入的文件）
+            name = os.path.relpath(scanned.path, self.music_dir).replace("\\", "/")
+            if self.music_manager.get_music(name) is not None or self.library_store.has_music(name):
+                print(f"Skipped {scanned.path}: a music named {name} already exists")
+                continue
+            added.append(Music(name=name, absolute_path=scanned.path, tags=folder_tags(scanned.relative_dir),
+                               play_mode=PlayMode.ONCE, start_time=0, end_time=scanned.duration,
+                               content_hash=scanned.content_hash))
+        for music in added:
+            self.music_manager.add_music(music)
+        if added:
+            self.library_store.upsert_many(added, self.current_music_preset)
+        self.analyze_music(changed + added)
+        self.refresh_hotkeys()
+        print(f"Library scan: {len(added)} added, {len(result.removed)} removed, {len(result.moved)} moved, "
+              f"{len(result.changed)} changed")
+
+    ##################################音频分析##############################################
+    def analyze_music(self, music_files):
+        """在后台分析尚未缓存特征的音乐，已缓存的直接应用归一化增益"""
+        was_active = self.audio_analyzer.active
+        changed = []
+        for music in music_files:
+            features = self.audio_analyzer.submit(music.absolute_path, music.content_hash)
+            if features is not None and self.apply_features(music, features):
+                changed.append(music)
+        if changed:
+            self.library_store.upsert_many(changed)
+        if self.audio_analyzer.active and not was_active:
+            self.after(500, self.poll_analysis)
+
+    def apply_features(self, music, features):
+        """根据分析结果更新 Music 的归一化增益，有变化时返回 True"""
+        gain_db = normalization_gain_db(features)
+        if music.gain_db == gain_db:
+            return False
+        music.gain_db = gain_db
+        return True
+
+    def analyze_file(self, path):
+        """分析尚未导入的文件（信息窗口），已有缓存时直接返回特征"""
+        was_active = self.audio_analyzer.active
+        features = self.audio_analyzer.submit(path)
+        if self.audio_analyzer.active and not was_active:
+            self.after(500, self.poll_analysis)
+        return features
+
+    def poll_analysis(self):
+        """取走分析结果并更新对应音乐的归一化增益，全部完成后特征缓存会被写入磁盘"""
+        active = self.audio_analyzer.active  # 在 drain 之前读取，保证最后一次 drain 能取到全部结果
+        results = self.audio_analyzer.drain()
+        if results:
+            by_key = {}
+            for music in self.music_manager.get_all_music():
+                by_key.setdefault(FeatureCache.make_key(music.absolute_path, music.content_hash), []).append(music)
+            changed = []
+            for path, content_hash, features in results:
+                for music in by_key.get(FeatureCache.make_key(path, content_hash), []) if features else []:
+                    if self.apply_features(music, features):
+                        changed.append(music)
+            if changed:
+                self.library_store.upsert_many(changed)
+        if active:
+            self.after(500, self.poll_analysis)
 
     def get_tag_color(self, tag):
         """固定字符串映射到唯一颜色"""
@@ -208,83 +744,300 @@ class LiveAudioPlayer(customtkinter.CTk):
             self.home_frame.grid(row=0, column=1, sticky="nsew")
         else:
             self.home_frame.grid_forget()
+        if name == "settings":
+            self.settings_frame.grid(row=0, column=1, sticky="nsew", padx=20, pady=20)
+            self.instrumentation_panel.start()
+        else:
+            self.settings_frame.grid_forget()
+            self.instrumentation_panel.stop()
 
     def home_button_event(self):
         self.select_frame_by_name("home")
 
     ##################################预设管理##############################################
-    def save_preset(self, preset_name="recent.json"):
-        """保存当前的音乐文件和相关配置到指定预设文件"""
+    @timed("save_preset")
+    def save_preset(self, preset_name=None):
+        """把当前的音乐列表整体保存到指定预设"""
         if preset_name is None:
             preset_name = self.current_music_preset  # 如果未指定，则保存到当前预设
-        preset_path = os.path.join(self.presets_dir, preset_name)
+        self.library_store.save_preset(preset_name, self.music_manager.get_all_music())
+        self.scene_preparer.discard(preset_name)  # 已准备的内容过期
+        self.refresh_scene_menu()
+        print(f"Preset saved to {preset_name}")
 
-        # 准备保存的内容
-        preset_data = {
-            "music_files": [music.to_dict() for music in self.music_files],  # 假设 Music 类有 to_dict 方法
-            "current_preset": preset_name,
-        }
+    @timed("load_preset")
+    def load_preset(self, preset_name):
+        """从数据库加载预设：整体读取后按名称与当前列表对比，只更新有变化的行"""
+        if preset_name not in self.library_store.list_presets():
+            print(f"Preset {preset_name} not found.")
+            return
 
-        # 保存到文件
-        with open(preset_path, "w", encoding="utf-8") as f:
-            json.dump(preset_data, f, indent=4)
-        print(f"Preset saved to {preset_path}")
+        self.current_music_preset = preset_name
+        self.library_snapshot.set_preset(preset_name)
+        music_files = self.library_store.load_preset(preset_name)
+        # 文件被移动或重命名时通过内容哈希重新定位
+        relinked = [music for music in music_files if self.content_store.relink(music)]
+        if relinked:
+            self.library_store.upsert_many(relinked)
+        self.adopt_music(music_files)
+        print(f"Preset loaded from {preset_name}")
 
-    def load_preset(self, preset_name):
-        """从指定的预设文件加载音乐文件和配置"""
-        preset_path = os.path.join(self.presets_dir, preset_name)
+    def adopt_music(self, music_files):
+        """把音乐列表整体换成预设的内容：按名称对比，列表中没有变化的行保持不动"""
+        self.music_manager.replace_all(music_files)
+        self.analyze_music(music_files)  # 已分析过且文件未变化的不会重新分析
+        self.refresh_hotkeys()  # 预加载新预设的热键音效
 
-        if not os.path.exists(preset_path):
-            print(f"Preset {preset_name} not found.")
+    ##################################场景切换##############################################
+    def refresh_scene_menu(self):
+        self.scene_menu.configure(values=self.library_store.list_presets())
+        self.scene_menu.set(self.current_music_preset)
+
+    def scene_opening_names(self, preset_name):
+        """上次离开该场景时正在播放的音乐，没有记录时返回 None"""
+        names = self.library_store.get_setting(f"scene_tracks:{preset_name}")
+        return json.loads(names) if names is not None else None
+
+    def remember_scene_tracks(self, preset_name):
+        """记录离开的场景正在播放的音乐，再次切换回来时恢复；在 LibrarySnapshot.switch_preset 的锁内调用"""
+        if self.mixer_engine is not None and preset_name is not None:
+            self.library_store.set_setting(f"scene_tracks:{preset_name}",
+                                           json.dumps(self.mixer_engine.track_names(), ensure_ascii=False))
+
+    def prepare_scene(self, preset_name):
+        """在后台读取预设并解码开场音乐，当前场景继续播放"""
+        if preset_name == self.current_music_preset or self.ensure_audio() is None:
+            return None
+        future = self.scene_preparer.prepare(preset_name, self.mixer_engine, self.scene_opening_names(preset_name))
+        self.scene_status_label.configure(text=f"Preparing {preset_name}…")
+
+        def poll():
+            if not future.done():
+                self.after(50, poll)
+            elif (not future.cancelled() and self.scene_menu.get() == preset_name
+                  and preset_name != self.current_music_preset):
+                try:
+                    scene = future.result()
+                except Exception as e:
+                    self.scene_status_label.configure(text=f"Failed to prepare {preset_name}: {e}")
+                    return
+                self.scene_status_label.configure(
+                    text=f"{preset_name} ready · {len(scene.music_files)} files · {len(scene.tracks)} tracks · "
+                         f"{scene.prepare_time * 1000:.0f} ms")
+        self.after(50, poll)
+        return future
+
+    def switch_scene(self):
+        """切换到选中的场景；尚未准备好时先等待准备完成"""
+        preset_name = self.scene_menu.get()
+        if preset_name == self.current_music_preset or self.ensure_audio() is None:
             return
+        started = time.perf_counter()
+        future = self.scene_preparer.take(preset_name)
+        if future is None or future.cancelled():
+            self.prepare_scene(preset_name)
+            future = self.scene_preparer.take(preset_name)
 
-        # 加载预设文件
-        with open(preset_path, "r", encoding="utf-8") as f:
-            preset_data = json.load(f)
+        def wait():
+            if not future.done():
+                self.after(10, wait)
+                return
+            try:
+                scene = future.result()
+            except Exception as e:
+                self.scene_status_label.configure(text=f"Failed to prepare {preset_name}: {e}")
+                return
+            self.apply_scene(scene, started)
+        wait()
 
-        # 恢复音乐文件和配置
-        self.music_files = [Music.from_dict(music) for music in preset_data["music_files"]]  # 假设 Music 类有 from_dict 方法
-        self.current_music_preset = preset_data["current_preset"]
+    def apply_scene(self, scene, started):
+        """交换音轨后再替换音乐列表，新场景先开始播放"""
+        crossfade = self.crossfade_slider.get() if self.scene_crossfade_check.get() else 0.0
+        curve = self.fade_curve_menu.get()
+        switches = self.mixer_engine.stats.switches
 
-        # 更新音乐列表显示
-        [self.music_files.append(music) for music in self.music_files]
-        print(f"Preset loaded from {preset_path}")
+        def switch(previous):
+            self.remember_scene_tracks(previous)
+            self.mixer_engine.switch_scene(scene.tracks, crossfade, curve)
+        if not self.library_snapshot.switch_preset(scene.preset_name, switch):
+            return  # 控制端口已经切换到该场景
+        swapped = time.perf_counter()
+        self.adopt_scene(scene)
+        status = f"Switched to {scene.preset_name} · swap {(swapped - started) * 1000:.1f} ms"
+        self.scene_status_label.configure(text=status)
 
-    def load_recent_preset(self):
-        """加载最近的预设文件（默认 recent.json）"""
-        recent_preset_path = os.path.join(self.presets_dir, "recent.json")
+        def report_latency(attempts=100):
+            """混音线程送出新场景的第一个块后显示从点击到出声的耗时"""
+            stats = self.mixer_engine.stats
+            if stats.switches > switches:
+                first_audio = (swapped - started) + stats.last_switch_time
+                self.scene_status_label.configure(text=f"{status} · first audio {first_audio * 1000:.1f} ms")
+            elif attempts > 0 and scene.preset_name == self.current_music_preset:
+                self.after(20, report_latency, attempts - 1)
+        if scene.tracks:
+            self.after(20, report_latency)
 
-        # 如果文件不存在，创建一个默认的 recent.json
-        if not os.path.exists(recent_preset_path):
-            with open(recent_preset_path, "w", encoding="utf-8") as f:
-                json.dump({"music_files": [], "current_preset": "recent.json"}, f, indent=4)
+    def adopt_scene(self, scene):
+        """音轨已经切换后，把当前预设和音乐列表换成新场景的内容；之后又切换到其他场景时跳过"""
+        if scene.preset_name != self.library_snapshot.preset:
+            return
+        self.current_music_preset = scene.preset_name
+        self.library_store.set_setting("current_preset", scene.preset_name)
+        self.scene_menu.set(scene.preset_name)
+        self.adopt_music(scene.music_files)  # ScenePreparer 已经重新定位过移动的文件
 
-        # 加载 recent.json
-        self.load_preset("recent.json")
+    def load_recent_preset(self):
+        """加载最近的预设（默认 recent）"""
+        if self.current_music_preset not in self.library_store.list_presets():
+            self.library_store.save_preset(self.current_music_preset, [])
+        self.load_preset(self.current_music_preset)
 
     def on_music_file_selected(self, file_name):
-        # 处理音乐文件双击事件
-        print(f"Selected music file: {file_name}")
+        # 处理音乐文件双击事件：未在播放则加入混音，否则停止
+        if self.ensure_audio() is None:
+            return
+        if self.mixer_engine.is_playing(file_name):
+            self.mixer_engine.stop(file_name)
+            return
+        music = self.music_manager.get_music(file_name)
+        if music is None:
+            return
+        if music.play_mode in (PlayMode.CROSSFADE, PlayMode.SEQUENCE):
+            # 从这一首开始按列表当前的显示顺序播放
+            names = [item["name"] for item in self.file_list_frame.visible_items]
+            musics = [self.music_manager.get_music(name) for name in names]
+            self.mixer_engine.play_sequence(musics, names.index(file_name) if file_name in names else 0)
+        else:
+            self.mixer_engine.play(music)
+
+    ##################################热键音效板##############################################
+    def refresh_hotkeys(self):
+        """按当前列表重建热键映射，并在后台把绑定的音效预加载到内存"""
+        if self.mixer_engine is not None:
+            self.soundboard.set_bindings(self.music_manager.get_all_music())
+
+    def assign_hotkey(self, music_name):
+        """为音乐设置热键，输入为空时解除绑定"""
+        dialog = customtkinter.CTkInputDialog(text="Hotkey (e.g. 1, q, F1; empty to clear):", title="Set Hotkey")
+        key = dialog.get_input()
+        if key is None:
+            return
+        key = key.strip()
+        for music in self.music_manager.get_all_music():
+            if key and music.hotkey == key and music.name != music_name:
+                self.update_music_instance(music.name, new_hotkey="")  # 一个按键只对应一首
+        self.update_music_instance(music_name, new_hotkey=key)
+        self.refresh_hotkeys()
+
+    def on_hotkey(self, event):
+        """按键触发音效；输入框中的按键不处理"""
+        started = time.perf_counter()
+        if event.widget.winfo_class() in ("Entry", "Text", "TEntry"):
+            return None
+        music_name = self.soundboard.music_for_key(event.keysym)
+        if music_name is None or self.ensure_audio() is None:
+            return None
+        music = self.music_manager.get_music(music_name)
+        if music is not None:
+            self.soundboard.trigger(music, started)
+        return "break"
 
     def settings_button_event(self):
-        messagebox.showinfo("设置", "设置功能待开发")
+        self.select_frame_by_name("settings")
+
+    ##################################运行时诊断##############################################
+    def collect_diagnostics(self):
+        """汇总事件循环延迟、混音统计、缓存和各操作耗时，供设置页显示和导出"""
+        snapshot = {"event_loop": self.event_loop_monitor.snapshot()}
+        if self.mixer_engine is not None:
+            snapshot["mixer"] = self.mixer_engine.stats.snapshot()
+        snapshot["pcm_cache"] = self.pcm_cache.stats()
+        snapshot["hotkeys"] = self.soundboard.latency_stats()
+        snapshot["operations"] = instrumentation.registry.snapshot()
+        return snapshot
+
+    def reset_diagnostics(self):
+        self.event_loop_monitor.reset()
+        instrumentation.registry.reset()
+        if self.mixer_engine is not None:
+            self.mixer_engine.stats.reset()
 
     def global_play(self):
-        print("播放所有音频")
+        """恢复所有暂停的音频；不会自动开始播放列表中的音乐"""
+        if self.mixer_engine is None:
+            return
+        self.mixer_engine.resume_all()
+        self.soundboard.resume_all()
 
     def global_pause(self):
-        print("暂停所有音频")
+        """暂停所有音频"""
+        if self.mixer_engine is not None:
+            self.mixer_engine.pause_all()
+            self.soundboard.pause_all()  # 热键音效不经过混音器，需要单独暂停
 
     def set_global_volume(self, volume):
-        pygame.mixer.music.set_volume(int(volume) / 100)
+        if self.mixer_engine is not None:
+            self.mixer_engine.set_master_volume(int(volume) / 100)
+            self.soundboard.set_volume(self.mixer_engine.master_volume)
+
+    def set_crossfade_seconds(self, seconds):
+        self.crossfade_label.configure(text=f"Crossfade {seconds:.1f} s")
+        self.library_store.set_setting("crossfade_seconds", str(seconds))
+        if self.mixer_engine is not None:
+            self.mixer_engine.set_crossfade(seconds=seconds)
+
+    def set_fade_curve(self, curve):
+        self.library_store.set_setting("fade_curve", curve)
+        if self.mixer_engine is not None:
+            self.mixer_engine.set_crossfade(curve=curve)
+
+    def set_loop_seam(self, seam):
+        """之后开始循环的音轨使用的接缝处理方式"""
+        self.library_store.set_setting("loop_seam", seam)
+        if self.mixer_engine is not None:
+            self.mixer_engine.loop_seam = seam
+
+    def update_mix_stats(self):
+        """定时刷新每个混音块的耗时"""
+        stats = self.mixer_engine.stats.snapshot()
+        cache = self.pcm_cache.stats()
+        self.mix_stats_label.configure(
+            text=f"Mix {stats['average_ms']:.2f}/{stats['budget_ms']:.1f} ms (max {stats['max_ms']:.2f}) · "
+                 f"{stats['tracks']} tracks · over budget {stats['over_budget']} · underruns {stats['underruns']}\n"
+                 f"PCM cache {cache['bytes'] / 2**20:.0f}/{cache['max_bytes'] / 2**20:.0f} MB + {cache['mapped_bytes'] / 2**20:.0f} MB mapped · "
+                 f"hits {cache['hits']} · misses {cache['misses']} · evictions {cache['evictions']}"
+        )
+        hotkeys = self.soundboard.latency_stats()
+        if hotkeys:
+            self.mix_stats_label.configure(
+                text=self.mix_stats_label.cget("text") +
+                f"\nHotkey → first buffer p50 {hotkeys['p50']:.2f} · p95 {hotkeys['p95']:.2f} · p99 {hotkeys['p99']:.2f} · "
+                f"max {hotkeys['max']:.2f} ms (+{hotkeys['output_ms']:.1f} ms output buffer) · "
+                f"{hotkeys['count']} triggers · {hotkeys['misses']} not preloaded"
+            )
+        if stats["switches"]:
+            self.mix_stats_label.configure(
+                text=self.mix_stats_label.cget("text") +
+                f"\nScene switch → first block queued {stats['last_switch_ms']:.1f} ms (max {stats['max_switch_ms']:.1f})"
+            )
+        self.after(500, self.update_mix_stats)
 
     def change_appearance_mode_event(self, new_appearance_mode):
         customtkinter.set_appearance_mode(new_appearance_mode)
 
     def create_preset(self):
-        # 创建一个音乐预设的逻辑
-        print("Creating a new preset")
+        """以当前音乐列表创建一个新预设并切换到它"""
+        preset_name = customtkinter.CTkInputDialog(text="Enter preset name:", title="Create Preset").get_input()
+        if preset_name and preset_name.strip():
+            self.current_music_preset = preset_name.strip()
+            self.library_snapshot.set_preset(self.current_music_preset)
+            self.save_preset(self.current_music_preset)  # 同时刷新场景菜单
 
 if __name__ == "__main__":
-    app = LiveAudioPlayer()
+    parser = argparse.ArgumentParser(description="LiveAudioPlayer")
+    parser.add_argument("--startup-profile", action="store_true", help="启动完成后输出各阶段耗时")
+    parser.add_argument("--control-port", type=int, default=DEFAULT_PORT, help="本机控制端口，0 表示不启用")
+    args = parser.parse_args()
+
+    app = LiveAudioPlayer(startup_profile=args.startup_profile, control_port=args.control_port)
     app.mainloop()
@@ -33,7 +33,7 @@ class ImportMusicWindow(customtkinter.CTkToplevel):
         # 播放模式选择
         self.play_mode_label = customtkinter.CTkLabel(self, text="Play Mode:")
         self.play_mode_label.pack(pady=(20, 5))
-        self.play_mode_option = customtkinter.CTkOptionMenu(self, values=[PlayMode.ONCE.value, PlayMode.LOOP.value], command=self.set_play_mode)
+        self.play_mode_option = customtkinter.CTkOptionMenu(self, values=[mode.value for mode in PlayMode], command=self.set_play_mode)
         self.play_mode_option.pack(pady=5)
         
         # 完成和取消按钮
@@ -1,31 +1,63 @@
 # ScrollableMusicListFrame.py
 
 import customtkinter
-from tkinter import HORIZONTAL
+from src import tag_query
+from src.instrumentation import timed
 from src.play_mode import PlayMode
 
-class ScrollableMusicListFrame(customtkinter.CTkScrollableFrame):
+ROW_HEIGHT = 32  # 每一行的固定高度（像素），用于计算可见行数
+
+
+class ScrollableMusicListFrame(customtkinter.CTkFrame):
+    """虚拟化的音乐列表：只为可见行创建控件，滚动时复用控件池"""
+
     def __init__(self, master, app, command=None, **kwargs):
         super().__init__(master, **kwargs)
         self.app = app  # 保存 LiveAudioPlayer 实例引用
         self.command = command
-        self.items = []  # 存储所有行的内容和控件
+        self.items = {}  # 名称 -> 行数据（不含控件），保持插入顺序
+        self.visible_items = []  # 通过筛选、按顺序显示的行
+        self.first_row = 0  # 可见区域第一行在 visible_items 中的下标
+        self.row_pool = []  # 复用的行控件
+        self.tag_filter_menu = None
+        self._menu_tags = []  # 标签筛选菜单当前的标签（已排序）
+        self._tag_counts = {}  # 标签 -> 列表中使用该标签的行数，菜单只显示使用中的标签
+        self._tags_dirty = False  # 出现新标签或有标签不再使用，需要更新菜单
+        self._rows_dirty = False  # 行数据变化，需要重新绑定可见行
+        self._removed_visible = False  # visible_items 中还有已移除的行，绘制前压缩一次
+        self._refresh_pending = None  # 合并刷新的 after_idle 任务
 
         # 筛选条件
-        self.selected_tags = []  # 选中的标签
+        self.tag_query = None  # 当前的布尔标签查询字符串
+        self.tag_query_node = None  # 解析后的查询语法树
         self.selected_play_mode = None  # 选中的播放模式
+        self.search_text = ""  # 搜索框中的文本
 
         # 设置 ScrollableMusicListFrame 自身的网格布局
-        self.grid_rowconfigure(0, weight=1)
+        self.grid_rowconfigure(1, weight=1)
         self.grid_columnconfigure(0, weight=1)
 
+        # 布尔标签查询输入框，例如 battle AND (forest OR cave) NOT vocal
+        self.query_entry = customtkinter.CTkEntry(self, placeholder_text="标签查询：A AND (B OR C) NOT D")
+        self.query_entry.grid(row=0, column=0, columnspan=2, padx=5, pady=(5, 0), sticky="ew")
+        self.query_entry.bind("<Return>", lambda e: self.apply_tag_query(self.query_entry.get()))
+        self.query_entry_border = self.query_entry.cget("border_color")
+
         # 创建 content_frame 作为内容容器
         self.content_frame = customtkinter.CTkFrame(self, fg_color="white")
-        self.content_frame.grid(row=0, column=0, sticky="nsew")
+        self.content_frame.grid(row=1, column=0, sticky="nsew")
+
+        # 滚动条只控制 first_row，不滚动真实控件
+        self.scrollbar = customtkinter.CTkScrollbar(self, command=self.on_scrollbar)
+        self.scrollbar.grid(row=1, column=1, sticky="ns")
 
         # 创建列标题和筛选按钮
         self.create_column_headers()
 
+        # 尺寸变化时重新计算控件池大小，滚轮事件改为移动 first_row
+        self.content_frame.bind("<Configure>", self.on_resize)
+        self.bind_scroll_events(self.content_frame)
+
     def create_column_headers(self):
         """创建顶部的列标题"""
         name_label = customtkinter.CTkLabel(
@@ -38,7 +70,7 @@ class ScrollableMusicListFrame(customtkinter.CTkScrollableFrame):
 
         self.play_mode_filter_menu = customtkinter.CTkOptionMenu(
             self.content_frame,
-            values=["所有方式", PlayMode.ONCE.value, PlayMode.LOOP.value],
+            values=["所有方式"] + [mode.value for mode in PlayMode],
             command=self.apply_play_mode_filter,
             font=("Arial", 10)
         )
@@ -50,31 +82,72 @@ class ScrollableMusicListFrame(customtkinter.CTkScrollableFrame):
         self.content_frame.grid_columnconfigure(2, weight=1)
 
     def apply_tag_filter(self, selected_tag):
-        """应用标签筛选条件"""
-        if selected_tag == "所有标签":
-            self.selected_tags = []  # 清空筛选条件，显示所有
-        else:
-            self.selected_tags = [selected_tag]
+        """应用标签筛选条件，单个标签等价于只含该标签的查询"""
+        query = "" if selected_tag == "所有标签" else tag_query.quote_tag(selected_tag)
+        self.query_entry.delete(0, "end")
+        self.query_entry.insert(0, query)
+        self.apply_tag_query(query)
+
+    def apply_tag_query(self, query):
+        """应用布尔标签查询，语法错误时标红输入框并保留原筛选"""
+        query = query.strip()
+        try:
+            node = tag_query.parse(query) if query else None
+        except tag_query.TagQueryError:
+            self.query_entry.configure(border_color="red")
+            return
+        self.query_entry.configure(border_color=self.query_entry_border)
+        self.tag_query = query or None
+        self.tag_query_node = node
         self.update_displayed_items()  # 更新显示的音乐列表
 
     def update_tag_filter_menu(self):
-        """动态更新标签筛选菜单"""
-        # 如果已有 tag_filter_menu，先销毁旧控件
-        if hasattr(self, 'tag_filter_menu') and self.tag_filter_menu is not None:
-            self.tag_filter_menu.destroy()
-
-        # 获取最新的标签列表
-        tag_options = ["所有标签"] + sorted(self.app.tag_library.keys())
+        """更新标签筛选菜单的选项；控件只创建一次，标签没有变化时不做任何事"""
+        tags = sorted(self._tag_counts)
+        if self.tag_filter_menu is not None and tags == self._menu_tags:
+            return
+        self._menu_tags = tags
+        tag_options = ["所有标签"] + tags
+        if self.tag_filter_menu is None:
+            self.tag_filter_menu = customtkinter.CTkOptionMenu(
+                self.content_frame,
+                values=tag_options,
+                command=self.apply_tag_filter,
+                font=("Arial", 10)
+            )
+            self.tag_filter_menu.grid(row=0, column=1, padx=5, pady=5, sticky="nsew")
+            self.tag_filter_menu.set("所有标签")  # 默认选项
+        else:
+            self.tag_filter_menu.configure(values=tag_options)
+            if self.tag_filter_menu.get() not in tag_options:
+                self.tag_filter_menu.set("所有标签")
+
+    def schedule_refresh(self, rows=True, tags=False):
+        """把同一轮事件循环中的多次修改合并为一次刷新：菜单最多重建一次，可见行最多重新绑定一次"""
+        self._rows_dirty = self._rows_dirty or rows
+        self._tags_dirty = self._tags_dirty or tags
+        if self._refresh_pending is None:
+            self._refresh_pending = self.after_idle(self.flush_refresh)
+
+    def flush_refresh(self):
+        self._refresh_pending = None
+        if self._removed_visible:
+            self._rows_dirty = True  # 压缩在 render_rows 中进行
+        if self._tags_dirty:
+            self._tags_dirty = False
+            self.update_tag_filter_menu()
+        if self._rows_dirty:
+            self._rows_dirty = False
+            self.render_rows()
+        else:
+            self.update_scrollbar()  # 列表长度可能变了
 
-        # 创建新的 tag_filter_menu
-        self.tag_filter_menu = customtkinter.CTkOptionMenu(
-            self.content_frame,
-            values=tag_options,
-            command=self.apply_tag_filter,
-            font=("Arial", 10)
-        )
-        self.tag_filter_menu.grid(row=0, column=1, padx=5, pady=5, sticky="nsew")
-        self.tag_filter_menu.set("所有标签")  # 重置默认选项
+    def apply_search(self, text):
+        """应用名称/标签搜索，文本未变化时不重新查询"""
+        if text.strip() == self.search_text:
+            return
+        self.search_text = text.strip()
+        self.update_displayed_items()
 
     def apply_play_mode_filter(self, selected_mode):
         """应用播放方式筛选条件"""
@@ -84,131 +157,277 @@ class ScrollableMusicListFrame(customtkinter.CTkScrollableFrame):
             self.selected_play_mode = selected_mode
         self.update_displayed_items()  # 更新显示的音乐列表
 
+    ##################################行数据##############################################
+    def matches_filter(self, item):
+        """检查一行是否匹配当前筛选条件"""
+        match_tags = self.tag_query_node is None or tag_query.matches(self.tag_query_node, item["tags"])
+        match_play_mode = not self.selected_play_mode or item["play_mode"].value == self.selected_play_mode
+        match_search = self.app.music_manager.search_index.matches(self.search_text, item["name"], item["tags"])
+        return match_tags and match_play_mode and match_search
+
+    def get_item(self, name):
+        """按名称获取行数据"""
+        return self.items.get(name)
+
+    def register_tags(self, tags):
+        """登记一行的标签（同时分配颜色），出现列表中原来没有的标签时返回 True"""
+        new_tag = False
+        for tag in tags:
+            self.app.get_tag_color(tag)  # 登记到标签库
+            count = self._tag_counts.get(tag, 0)
+            new_tag = new_tag or count == 0
+            self._tag_counts[tag] = count + 1
+        return new_tag
+
+    def unregister_tags(self, tags):
+        """注销一行的标签，有标签不再被任何行使用时返回 True"""
+        dropped = False
+        for tag in tags:
+            count = self._tag_counts.get(tag, 0) - 1
+            if count > 0:
+                self._tag_counts[tag] = count
+            else:
+                self._tag_counts.pop(tag, None)
+                dropped = True
+        return dropped
+
+    def item_changed(self, item, music):
+        """用 Music 的当前值更新行数据，有变化时返回 True；标签变化时返回前已更新标签计数"""
+        tags = list(music.tags or [])
+        if item["tags"] == tags and item["play_mode"] == music.play_mode and item["hotkey"] == music.hotkey:
+            return False
+        if item["tags"] != tags:
+            self._tags_dirty = self.unregister_tags(item["tags"]) or self._tags_dirty
+            self._tags_dirty = self.register_tags(tags) or self._tags_dirty
+        item["tags"] = tags
+        item["play_mode"] = music.play_mode
+        item["hotkey"] = music.hotkey
+        return True
+
+    @timed("add_item")
     def add_item(self, music):
-        item_name = music.name  # 音乐名称
-        tags = music.tags  # 标签列表
-        play_mode = music.play_mode  # 播放方式
-        
-        """添加音乐文件到显示列表并存储为item"""
-        row_idx = len(self.items) + 1
-
-        # 第一列：音乐名称
-        name_label = customtkinter.CTkLabel(self.content_frame, text=item_name, anchor="w", padx=5, pady=5)
-
-        # 第二列：标签
-        tags_frame = customtkinter.CTkFrame(self.content_frame, fg_color="transparent")
-        tag_labels = []
-        if tags:
-            for tag in tags:
-                tag_color = self.app.get_tag_color(tag)
-                tag_label = customtkinter.CTkLabel(tags_frame, text=tag, fg_color=tag_color, corner_radius=5, padx=5, pady=2)
-                tag_label.pack(side="left", padx=5)
-                tag_labels.append(tag_label)
-
-        # 第三列：播放方式
-        play_mode_label = customtkinter.CTkLabel(self.content_frame, text=play_mode.value, anchor="w", padx=5, pady=5)
-
-        # 存储控件和数据
+        """添加音乐文件到列表；控件和标签菜单的刷新合并到本轮事件处理结束后进行"""
         item = {
-            "name": item_name,
-            "tags": tags or [],
-            "play_mode": play_mode,
+            "name": music.name,
+            "tags": list(music.tags or []),
+            "play_mode": music.play_mode,
+            "hotkey": music.hotkey,
             "hidden": False,  # 初始未隐藏
-            "widgets": {
-                "row_idx": row_idx,
-                "name_label": name_label,
-                "tags_frame": tags_frame,
-                "tag_labels": tag_labels,
-                "play_mode_label": play_mode_label
-            }
         }
-        self.items.append(item)
-
-        # 显示在界面
-        self.show_item(item)
-
-        # 更新标签筛选菜单
-        self.update_tag_filter_menu()
+        new_tag = self.register_tags(item["tags"])
+        self.items[item["name"]] = item
+
+        if self.matches_filter(item):
+            self.visible_items.append(item)
+            # 追加在可见区域之后的行不需要重新绑定控件
+            in_view = len(self.visible_items) <= self.first_row + len(self.row_pool)
+            self.schedule_refresh(rows=in_view, tags=new_tag)
+        else:
+            item["hidden"] = True
+            self.schedule_refresh(rows=False, tags=new_tag)
 
     def update_item(self, music):
         """更新现有音乐文件的显示"""
-        for item in self.items:
-            if item["name"] == music.name:
-                # 更新标签内容
-                for tag_label in item["widgets"]["tag_labels"]:
-                    tag_label.destroy()  # 删除旧的标签
-                item["widgets"]["tag_labels"].clear()
-
-                for tag in music.tags:
-                    tag_color = self.app.get_tag_color(tag)
-                    tag_label = customtkinter.CTkLabel(
-                        item["widgets"]["tags_frame"], text=tag, fg_color=tag_color, corner_radius=5, padx=5, pady=2
-                    )
-                    tag_label.pack(side="left", padx=5)
-                    item["widgets"]["tag_labels"].append(tag_label)
-
-                # 更新播放方式
-                item["widgets"]["play_mode_label"].configure(text=music.play_mode.value)
-
-                # 更新其他属性
-                item["tags"] = music.tags
-                item["play_mode"] = music.play_mode
-                break
+        item = self.items.get(music.name)
+        if item is None or not self.item_changed(item, music):
+            return
+        if self.matches_filter(item) == item["hidden"]:
+            self.update_displayed_items()  # 可见性发生变化，重新查询
+        self.schedule_refresh()  # 标签变化已由 item_changed 标记
 
     def remove_item(self, item):
-        """从显示和内存中移除一行"""
-        widgets = item["widgets"]
-        widgets["name_label"].grid_forget()
-        widgets["tags_frame"].grid_forget()
-        widgets["play_mode_label"].grid_forget()
-        for tag_label in widgets["tag_labels"]:
-            tag_label.destroy()
-
-        self.items.remove(item)  # 从列表中删除
-
-    def show_item(self, item):
-        """显示行内容"""
-        widgets = item["widgets"]
-        if item["hidden"]:
-            return  # 跳过隐藏的项目
-
-        widgets["name_label"].grid(row=widgets["row_idx"], column=0, padx=5, pady=2, sticky="nsew")
-        widgets["tags_frame"].grid(row=widgets["row_idx"], column=1, padx=5, pady=2, sticky="nsew")
-        widgets["play_mode_label"].grid(row=widgets["row_idx"], column=2, padx=5, pady=2, sticky="nsew")
-
-    def hide_item(self, item):
-        """隐藏行内容"""
-        widgets = item["widgets"]
-        item["hidden"] = True
-        widgets["name_label"].grid_forget()
-        widgets["tags_frame"].grid_forget()
-        widgets["play_mode_label"].grid_forget()
-
+        """从列表中移除一行；可见行只做标记，在合并刷新时一次性从 visible_items 中压缩掉"""
+        del self.items[item["name"]]  # 从列表中删除
+        dropped = self.unregister_tags(item["tags"])
+        if not item["hidden"]:
+            item["hidden"] = True
+            self._removed_visible = True
+            self.schedule_refresh(tags=dropped)
+        elif dropped:
+            self.schedule_refresh(rows=False, tags=True)
+
+    @timed("update_displayed_items")
     def update_displayed_items(self):
-        """更新显示的音乐文件，基于筛选条件显示或隐藏项目"""
-        current_row_idx = 1  # 从第1行开始（第0行是表头）
-
-        for item in self.items:
-            # 检查是否匹配当前筛选条件
-            match_tags = not self.selected_tags or any(tag in self.selected_tags for tag in item["tags"])
-            match_play_mode = not self.selected_play_mode or item["play_mode"].value == self.selected_play_mode
-
-            if match_tags and match_play_mode:
-                # 显示项目并更新行索引
-                item["hidden"] = False
-                item["widgets"]["row_idx"] = current_row_idx
-                self.show_item(item)
-                current_row_idx += 1
-            else:
-                # 隐藏项目
-                item["hidden"] = True
-                self.hide_item(item)
-
+        """通过 MusicManager 的索引查询匹配的行；控件只在绑定的行或可见性变化时更新（见 bind_row）"""
+        play_mode = PlayMode(self.selected_play_mode) if self.selected_play_mode else None
+        results = self.app.music_manager.filter(self.tag_query, play_mode, self.search_text)
+        visible_items = [self.items[music.name] for music in results if music.name in self.items]
+        self.set_visible_items(visible_items)
+
+    def set_visible_items(self, visible_items):
+        for item in self.visible_items:
+            item["hidden"] = True
+        for item in visible_items:
+            item["hidden"] = False
+        self.visible_items = visible_items
+        self._removed_visible = False
+        self.render_rows()
+
+    def compact_visible_items(self):
+        """去掉 remove_item 标记的行，连续移除多行时只扫描一次 visible_items"""
+        self._removed_visible = False
+        self.visible_items = [item for item in self.visible_items if not item["hidden"]]
+
+    @timed("set_items")
     def set_items(self, music_files):
-        """根据 music_files 更新 items 和界面显示"""
-        self.items = []  # 清空当前存储的项目
-        self.clear_displayed_items()  # 清空界面显示
+        """按名称与现有行对比：保留未变化的行，只新增、删除或更新有变化的行，然后重新绑定一次可见区域
 
+        标签计数按新列表重新统计，不再使用的标签从筛选菜单中移除。
+        """
+        items = {}
         for music in music_files:
-            self.add_item(music)  # 添加到 items 并更新显示
+            item = self.items.get(music.name)
+            if item is None:
+                item = {"name": music.name, "tags": list(music.tags or []), "play_mode": music.play_mode,
+                        "hotkey": music.hotkey, "hidden": False}
+            else:
+                self.item_changed(item, music)
+            items[music.name] = item
+        self.items = items
+        self._tag_counts = {}
+        for item in items.values():
+            self.register_tags(item["tags"])
+        self._tags_dirty = False
+        self.set_visible_items([item for item in items.values() if self.matches_filter(item)])
+        self.update_tag_filter_menu()
+
+    ##################################MusicManager 观察者##############################################
+    def on_music_added(self, music):
+        self.add_item(music)
+
+    def on_music_removed(self, music_name):
+        item = self.get_item(music_name)
+        if item:
+            self.remove_item(item)
+
+    def on_music_updated(self, music):
+        self.update_item(music)
+
+    def on_replaced(self, music_files):
+        self.set_items(music_files)
+
+    def on_cleared(self):
+        self.set_items([])
+
+    ##################################控件池##############################################
+    def create_row(self):
+        """创建一组可复用的行控件"""
+        row = {
+            "name": None,  # 当前绑定的音乐名称
+            "name_label": customtkinter.CTkLabel(self.content_frame, text="", anchor="w", padx=5, pady=5,
+                                                 height=ROW_HEIGHT - 4),
+            "tags_frame": customtkinter.CTkFrame(self.content_frame, fg_color="transparent", height=ROW_HEIGHT - 4),
+            "tag_labels": [],
+            "play_mode_label": customtkinter.CTkLabel(self.content_frame, text="", anchor="w", padx=5, pady=5,
+                                                      height=ROW_HEIGHT - 4),
+            "gridded": False,
+            "signature": None,  # 当前显示的内容，用于跳过没有变化的行
+        }
+        row["name_label"].bind("<Double-Button-1>", lambda e, r=row: r["name"] and self.app.on_music_file_selected(r["name"]))
+        row["name_label"].bind("<Button-3>", lambda e, r=row: r["name"] and self.app.assign_hotkey(r["name"]))  # 右键设置热键
+        for widget in (row["name_label"], row["tags_frame"], row["play_mode_label"]):
+            self.bind_scroll_events(widget)
+        return row
+
+    def bind_row(self, row, item):
+        """把一行控件绑定到一条数据，复用已有的标签控件；绑定的内容没有变化时不修改控件"""
+        signature = (item["name"], tuple(item["tags"]), item["play_mode"], item["hotkey"])
+        if row["signature"] == signature:
+            return
+        row["signature"] = signature
+        row["name"] = item["name"]
+        row["name_label"].configure(text=f"[{item['hotkey']}] {item['name']}" if item["hotkey"] else item["name"])
+        row["play_mode_label"].configure(text=item["play_mode"].value)
+
+        tag_labels = row["tag_labels"]
+        while len(tag_labels) < len(item["tags"]):
+            tag_label = customtkinter.CTkLabel(row["tags_frame"], text="", corner_radius=5, padx=5, pady=2)
+            self.bind_scroll_events(tag_label)
+            tag_labels.append(tag_label)
+        for index, tag_label in enumerate(tag_labels):
+            if index < len(item["tags"]):
+                tag = item["tags"][index]
+                tag_label.configure(text=tag, fg_color=self.app.get_tag_color(tag))
+                tag_label.pack(side="left", padx=5)
+            else:
+                tag_label.pack_forget()
 
+    def show_row(self, row, row_idx):
+        """显示行内容"""
+        if row["gridded"]:
+            return
+        row["name_label"].grid(row=row_idx, column=0, padx=5, pady=2, sticky="nsew")
+        row["tags_frame"].grid(row=row_idx, column=1, padx=5, pady=2, sticky="nsew")
+        row["play_mode_label"].grid(row=row_idx, column=2, padx=5, pady=2, sticky="nsew")
+        row["gridded"] = True
+
+    def hide_row(self, row):
+        """隐藏行内容"""
+        row["name"] = None
+        row["signature"] = None
+        if not row["gridded"]:
+            return
+        row["name_label"].grid_forget()
+        row["tags_frame"].grid_forget()
+        row["play_mode_label"].grid_forget()
+        row["gridded"] = False
+
+    @timed("render_rows")
+    def render_rows(self):
+        """把可见区域内的数据绑定到控件池"""
+        if self._removed_visible:
+            self.compact_visible_items()
+        self.first_row = min(self.first_row, max(len(self.visible_items) - len(self.row_pool), 0))
+        for offset, row in enumerate(self.row_pool):
+            index = self.first_row + offset
+            if index < len(self.visible_items):
+                self.bind_row(row, self.visible_items[index])
+                self.show_row(row, offset + 1)  # 第0行是表头
+            else:
+                self.hide_row(row)
+        self.update_scrollbar()
+
+    def on_resize(self, event):
+        """根据可用高度调整控件池大小，池大小与列表长度无关"""
+        header_height = self.tag_filter_menu.winfo_height() + 10
+        pool_size = max((event.height - header_height) // ROW_HEIGHT, 1)
+        while len(self.row_pool) < pool_size:
+            self.row_pool.append(self.create_row())
+        while len(self.row_pool) > pool_size:
+            row = self.row_pool.pop()
+            self.hide_row(row)
+            for widget in (row["name_label"], row["tags_frame"], row["play_mode_label"]):
+                widget.destroy()
+        self.render_rows()
+
+    ##################################滚动##############################################
+    def bind_scroll_events(self, widget):
+        widget.bind("<MouseWheel>", lambda e: self.scroll_rows(-1 if e.delta > 0 else 1))
+        widget.bind("<Button-4>", lambda e: self.scroll_rows(-1))
+        widget.bind("<Button-5>", lambda e: self.scroll_rows(1))
+
+    def scroll_rows(self, delta):
+        self.scroll_to(self.first_row + delta)
+
+    def scroll_to(self, first_row):
+        """滚动到指定行，只重新绑定控件池中的行"""
+        max_first = max(len(self.visible_items) - len(self.row_pool), 0)
+        first_row = min(max(int(first_row), 0), max_first)
+        if first_row != self.first_row:
+            self.first_row = first_row
+            self.render_rows()
+
+    def on_scrollbar(self, action, value, unit=None):
+        """处理滚动条的 moveto/scroll 命令"""
+        if action == "moveto":
+            self.scroll_to(float(value) * len(self.visible_items))
+        elif action == "scroll":
+            step = len(self.row_pool) if unit == "pages" else 1
+            self.scroll_rows(int(value) * step)
+
+    def update_scrollbar(self):
+        total = len(self.visible_items)
+        if total == 0:
+            self.scrollbar.set(0, 1)
+        else:
+            self.scrollbar.set(self.first_row / total, min((self.first_row + len(self.row_pool)) / total, 1))
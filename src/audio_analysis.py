@@ -0,0 +1,314 @@
+# audio_analysis.py
+
+import json
+import multiprocessing
+import os
+import queue
+import threading
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
+ANALYSIS_VERSION = 1  # 算法变化时递增，旧的缓存条目会被重新分析
+ANALYSIS_FREQUENCY = 22050  # 分析用的采样率，特征与播放格式无关
+ENVELOPE_RATE = 10  # RMS 包络每秒的点数
+ENVELOPE_MAX_POINTS = 600
+ONSET_HOP = 256  # 起音检测的帧移（约 86 帧/秒）
+SPECTRUM_SIZE = 2048
+SPECTRUM_FRAMES = 256  # 计算频谱质心时最多取的帧数
+SILENCE_DB = -70.0
+ONSET_THRESHOLD_DB = 6.0  # 能量在一帧内上升超过该值视为一次起音
+TARGET_LOUDNESS_DB = -18.0  # 归一化的目标响度，与 ReplayGain 的参考电平相当
+MAX_BOOST_DB = 12.0
+PEAK_HEADROOM_DB = 1.0
+
+
+def _to_db(power):
+    return 10 * np.log10(np.maximum(power, 1e-12))
+
+
+def _block_power(mono, hop):
+    """每 hop 个采样的平均功率"""
+    count = len(mono) // hop
+    if count == 0:
+        return np.zeros(0, dtype=np.float32)
+    blocks = mono[:count * hop].reshape(count, hop)
+    return np.einsum("ij,ij->i", blocks, blocks) / hop
+
+
+def loudness(power):
+    """门限响度（dBFS）：先去掉静音块，再去掉比平均值低 10 dB 以上的块，近似 EBU R128 的门限方式"""
+    power = power[_to_db(power) > SILENCE_DB]
+    if len(power) == 0:
+        return SILENCE_DB
+    relative_gate = _to_db(np.mean(power)) - 10
+    gated = power[_to_db(power) > relative_gate]
+    return float(_to_db(np.mean(gated)))
+
+
+def rms_envelope(mono, frequency):
+    """以 ENVELOPE_RATE 点/秒计算的 RMS 包络，超长音频按功率平均降采样"""
+    power = _block_power(mono, max(frequency // ENVELOPE_RATE, 1))
+    if len(power) > ENVELOPE_MAX_POINTS:
+        step = -(-len(power) // ENVELOPE_MAX_POINTS)
+        padded = np.pad(power, (0, step * ENVELOPE_MAX_POINTS - len(power)), mode="edge")
+        power = padded.reshape(ENVELOPE_MAX_POINTS, step).mean(axis=1)
+    return np.sqrt(power)
+
+
+def onset_strength(mono):
+    """逐帧 dB 能量的正向差分，打击乐的起音处数值较大"""
+    db = _to_db(_block_power(mono, ONSET_HOP))
+    return np.maximum(np.diff(db), 0) if len(db) > 1 else np.zeros(0)
+
+
+def onset_rate(onset, frequency):
+    """每秒的起音次数（超过阈值的局部极大值）"""
+    if len(onset) < 3:
+        return 0.0
+    peaks = (onset[1:-1] > ONSET_THRESHOLD_DB) & (onset[1:-1] >= onset[:-2]) & (onset[1:-1] > onset[2:])
+    return float(np.count_nonzero(peaks) / (len(onset) * ONSET_HOP / frequency))
+
+
+def estimate_tempo(onset, frequency, min_bpm=60, max_bpm=180):
+    """用起音强度的自相关估计速度（BPM），返回 (bpm, 置信度)；周期性不明显时 bpm 为 None"""
+    frame_rate = frequency / ONSET_HOP
+    min_lag = int(60 * frame_rate / max_bpm)
+    max_lag = int(60 * frame_rate / min_bpm) + 1
+    if len(onset) < 2 * max_lag:
+        return None, 0.0
+    centered = onset - onset.mean()
+    spectrum = np.fft.rfft(centered, 2 * len(centered))
+    autocorr = np.fft.irfft(spectrum * np.conj(spectrum))[:len(centered)]
+    if autocorr[0] <= 0:
+        return None, 0.0
+    lags = np.arange(min_lag, max_lag)
+    # 以 120 BPM 为中心的对数高斯先验，减少倍频/半频误判
+    bpms = 60 * frame_rate / lags
+    prior = np.exp(-0.5 * (np.log2(bpms / 120) / 0.8) ** 2)
+    lag = lags[np.argmax(autocorr[lags] * prior)]
+    confidence = float(autocorr[lag] / autocorr[0])
+    if confidence < 0.1:
+        return None, confidence
+    return float(60 * frame_rate / lag), confidence
+
+
+def spectral_centroid(mono, frequency):
+    """在均匀分布的若干帧上批量 FFT，返回按能量加权的平均频谱质心（Hz）"""
+    if len(mono) < SPECTRUM_SIZE:
+        return 0.0
+    starts = np.linspace(0, len(mono) - SPECTRUM_SIZE, min(SPECTRUM_FRAMES, len(mono) // SPECTRUM_SIZE)).astype(np.int64)
+    frames = mono[starts[:, np.newaxis] + np.arange(SPECTRUM_SIZE)] * np.hanning(SPECTRUM_SIZE).astype(np.float32)
+    magnitudes = np.abs(np.fft.rfft(frames, axis=1))
+    totals = magnitudes.sum(axis=1)
+    voiced = totals > 1e-6
+    if not voiced.any():
+        return 0.0
+    bins = np.fft.rfftfreq(SPECTRUM_SIZE, 1 / frequency)
+    centroids = magnitudes[voiced] @ bins / totals[voiced]
+    return float(np.average(centroids, weights=totals[voiced]))
+
+
+def analyze_samples(samples, frequency):
+    """计算 (帧数, 声道数) int16 PCM 的特征"""
+    mono = samples.astype(np.float32).mean(axis=1) / 32768.0
+    onset = onset_strength(mono)
+    rate = onset_rate(onset, frequency)
+    # 没有明显起音的持续音色（如铺底）自相关也很高，不估计速度
+    tempo, tempo_confidence = estimate_tempo(onset, frequency) if rate >= 0.25 else (None, 0.0)
+    envelope = rms_envelope(mono, frequency)
+    envelope_db = _to_db(envelope ** 2)
+    voiced_db = envelope_db[envelope_db > SILENCE_DB]
+    return {
+        "version": ANALYSIS_VERSION,
+        "duration": len(mono) / frequency,
+        "loudness_db": loudness(_block_power(mono, max(frequency // ENVELOPE_RATE, 1))),
+        "peak_db": float(_to_db(np.max(np.abs(mono)) ** 2)) if len(mono) else SILENCE_DB,
+        "dynamic_range_db": float(np.percentile(voiced_db, 95) - np.percentile(voiced_db, 10)) if len(voiced_db) else 0.0,
+        "rms_envelope": [round(float(value), 5) for value in envelope],
+        "tempo_bpm": tempo,
+        "tempo_confidence": tempo_confidence,
+        "spectral_centroid_hz": spectral_centroid(mono, frequency),
+        "onset_rate": rate,
+    }
+
+
+def normalization_gain_db(features, target_db=TARGET_LOUDNESS_DB):
+    """ReplayGain 式的归一化增益：把响度拉到 target_db，提升量受峰值余量和 MAX_BOOST_DB 限制"""
+    if features["loudness_db"] <= SILENCE_DB:
+        return 0.0
+    gain = target_db - features["loudness_db"]
+    if gain > 0:
+        gain = max(0.0, min(gain, MAX_BOOST_DB, -PEAK_HEADROOM_DB - features["peak_db"]))
+    return round(float(gain), 2)
+
+
+def suggest_tags(features):
+    """根据特征给出建议标签；阈值为经验值"""
+    tags = []
+    loud = features["loudness_db"]
+    centroid = features["spectral_centroid_hz"]
+    onsets = features["onset_rate"]
+    if onsets >= 0.5 and features["dynamic_range_db"] > 6:
+        tags.append("percussive")
+    if loud > -14 or (loud > -20 and (centroid > 3000 or onsets >= 3)):
+        tags.append("intense")
+    elif loud < -24 or (centroid < 1500 and onsets < 0.25):
+        tags.append("calm")
+    return tags
+
+
+##################################工作进程##############################################
+def _init_worker():
+    """工作进程只需要解码，不需要声卡"""
+    os.environ["SDL_AUDIODRIVER"] = "dummy"
+    import pygame
+    pygame.mixer.init(frequency=ANALYSIS_FREQUENCY, size=-16, channels=2)
+
+
+def _analyze_path(path):
+    """在工作进程中解码到内存并分析；分析用的采样率与播放不同，不写入磁盘解码缓存"""
+    from src.audio_decode import decode_file
+    return analyze_samples(decode_file(path), ANALYSIS_FREQUENCY)
+
+
+class FeatureCache:
+    """持久化的特征缓存，以内容哈希为键（没有哈希时使用绝对路径），文件大小或修改时间变化时失效"""
+
+    def __init__(self, cache_path):
+        self.cache_path = cache_path
+        self._entries = {}  # 键 -> {"size", "mtime_ns", "features"}
+        self._lock = threading.Lock()
+        self.load()
+
+    def load(self):
+        if os.path.exists(self.cache_path):
+            try:
+                with open(self.cache_path, "r", encoding="utf-8") as f:
+                    self._entries = json.load(f)
+            except (OSError, ValueError):
+                self._entries = {}
+
+    def save(self):
+        """原子地写入缓存文件"""
+        os.makedirs(os.path.dirname(self.cache_path), exist_ok=True)
+        tmp_path = self.cache_path + ".tmp"
+        with self._lock:
+            with open(tmp_path, "w", encoding="utf-8") as f:
+                json.dump(self._entries, f)
+            os.replace(tmp_path, self.cache_path)
+
+    @staticmethod
+    def make_key(path, content_hash=None):
+        return content_hash or os.path.abspath(path)
+
+    def get(self, path, content_hash=None):
+        """返回仍然有效的特征，文件已变化或从未分析时返回 None"""
+        try:
+            stat = os.stat(path)
+        except OSError:
+            return None
+        with self._lock:
+            entry = self._entries.get(self.make_key(path, content_hash))
+        if (entry and entry["size"] == stat.st_size and entry["mtime_ns"] == stat.st_mtime_ns
+                and entry["features"].get("version") == ANALYSIS_VERSION):
+            return entry["features"]
+        return None
+
+    def put(self, path, content_hash, features, stat):
+        with self._lock:
+            self._entries[self.make_key(path, content_hash)] = {
+                "size": stat.st_size, "mtime_ns": stat.st_mtime_ns, "features": features,
+            }
+
+    def link(self, source_path, content_hash, path):
+        """导入后把按源路径缓存的特征转存到内容哈希下，避免重复分析"""
+        features = self.get(source_path)
+        if features is not None and content_hash:
+            self.put(path, content_hash, features, os.stat(path))
+
+
+class AudioAnalyzer:
+    """在进程池中分析音频特征，结果写入 FeatureCache，完成的结果由 Tk 线程分批取走"""
+
+    def __init__(self, feature_cache, max_workers=None):
+        self.feature_cache = feature_cache
+        self.max_workers = max_workers or os.cpu_count() or 1
+        self._executor = None  # 第一次提交时才启动进程池
+        self._results = queue.Queue()  # (路径, 内容哈希, 特征或 None)
+        self._pending = set()  # 正在分析的缓存键
+        self._failed = set()  # 分析失败的缓存键，本次运行内不再重试
+        self._lock = threading.Lock()
+        self._unsaved = 0
+
+    @property
+    def active(self):
+        return bool(self._pending)
+
+    def _ensure_executor(self):
+        if self._executor is None:
+            # 统一使用 spawn，避免在已有 Tk 和音频线程的进程中 fork
+            self._executor = ProcessPoolExecutor(max_workers=self.max_workers,
+                                                 mp_context=multiprocessing.get_context("spawn"),
+                                                 initializer=_init_worker)
+        return self._executor
+
+    def get(self, path, content_hash=None):
+        return self.feature_cache.get(path, content_hash)
+
+    def submit(self, path, content_hash=None):
+        """提交一个文件；已有有效缓存时直接返回特征，否则返回 None 并在后台分析"""
+        features = self.feature_cache.get(path, content_hash)
+        if features is not None:
+            return features
+        key = FeatureCache.make_key(path, content_hash)
+        with self._lock:
+            if key in self._pending or key in self._failed:
+                return None
+            self._pending.add(key)
+        try:
+            stat = os.stat(path)
+        except OSError:
+            with self._lock:
+                self._pending.discard(key)
+            return None
+        future = self._ensure_executor().submit(_analyze_path, path)
+        future.add_done_callback(lambda done: self._on_done(done, path, content_hash, key, stat))
+        return None
+
+    def has_failed(self, path, content_hash=None):
+        with self._lock:
+            return FeatureCache.make_key(path, content_hash) in self._failed
+
+    def _on_done(self, future, path, content_hash, key, stat):
+        try:
+            features = future.result()
+        except Exception as e:
+            print(f"Failed to analyze {path}: {e}")
+            features = None
+        if features is not None:
+            self.feature_cache.put(path, content_hash, features, stat)
+        else:
+            with self._lock:
+                self._failed.add(key)
+        self._results.put((path, content_hash, features))
+        with self._lock:
+            self._pending.discard(key)  # 先放入结果再移出，active 为 False 时所有结果都已可取
+
+    def drain(self, max_items=200):
+        """取出最多 max_items 个完成的结果（在 Tk 线程中调用）；全部完成时统一保存缓存"""
+        results = []
+        while len(results) < max_items:
+            try:
+                results.append(self._results.get_nowait())
+            except queue.Empty:
+                break
+        self._unsaved += len(results)
+        if self._unsaved and (not self.active or self._unsaved >= 500):
+            self.feature_cache.save()
+            self._unsaved = 0
+        return results
+
+    def shutdown(self):
+        if self._executor is not None:
+            self._executor.shutdown(wait=True, cancel_futures=True)  # 只等待正在分析的文件
@@ -0,0 +1,44 @@
+# audio_decode.py
+
+import numpy as np
+import pygame
+
+
+def mixer_format():
+    """返回当前 mixer 的 (采样率, 声道数)"""
+    frequency, _, channels = pygame.mixer.get_init()
+    return frequency, channels
+
+
+def decode_file(path):
+    """将整个音频文件解码为 mixer 格式的 int16 PCM，形状为 (帧数, 声道数)"""
+    samples = pygame.sndarray.array(pygame.mixer.Sound(path))
+    if samples.ndim == 1:
+        samples = samples[:, np.newaxis]
+    return samples
+
+
+def segment_bounds(total_frames, frequency, start_time=0, end_time=None):
+    """把以秒为单位的片段转换为帧下标区间"""
+    start = min(max(int(round((start_time or 0) * frequency)), 0), total_frames)
+    end = total_frames if end_time is None else min(int(round(end_time * frequency)), total_frames)
+    return start, max(start, end)
+
+
+def decode_segment(path, start_time=0, end_time=None):
+    """解码音频文件中 start_time..end_time 的片段"""
+    samples = decode_file(path)
+    frequency, _ = mixer_format()
+    start, end = segment_bounds(len(samples), frequency, start_time, end_time)
+    if start == 0 and end == len(samples):
+        return samples
+    # 复制片段，避免视图让整首歌的缓冲区一直驻留在内存中
+    return samples[start:end].copy()
+
+
+def make_sound(samples):
+    """把 (帧数, 声道数) 的 PCM 转换为 pygame Sound，单声道 mixer 需要一维数组"""
+    _, channels = mixer_format()
+    if channels == 1:
+        samples = samples[:, 0]
+    return pygame.sndarray.make_sound(samples)
@@ -0,0 +1,227 @@
+# audio_probe.py
+
+import json
+import mmap
+import os
+import struct
+import threading
+
+# MPEG 音频帧头查找表
+_MP3_BITRATES = {
+    (1, 1): (0, 32, 64, 96, 128, 160, 192, 224, 256, 288, 320, 352, 384, 416, 448),
+    (1, 2): (0, 32, 48, 56, 64, 80, 96, 112, 128, 160, 192, 224, 256, 320, 384),
+    (1, 3): (0, 32, 40, 48, 56, 64, 80, 96, 112, 128, 160, 192, 224, 256, 320),
+    (2, 1): (0, 32, 48, 56, 64, 80, 96, 112, 128, 144, 160, 176, 192, 224, 256),
+    (2, 2): (0, 8, 16, 24, 32, 40, 48, 56, 64, 80, 96, 112, 128, 144, 160),
+    (2, 3): (0, 8, 16, 24, 32, 40, 48, 56, 64, 80, 96, 112, 128, 144, 160),
+}
+_MP3_SAMPLE_RATES = {
+    3: (44100, 48000, 32000),  # MPEG1
+    2: (22050, 24000, 16000),  # MPEG2
+    0: (11025, 12000, 8000),  # MPEG2.5
+}
+
+
+def _parse_mp3_header(header):
+    """解析 4 字节的 MPEG 帧头，返回 (帧长度, 每帧采样数, 采样率, 是否单声道)，无效时返回 None"""
+    if header >> 21 != 0x7FF:
+        return None
+    version_bits = (header >> 19) & 0x3
+    layer_bits = (header >> 17) & 0x3
+    bitrate_index = (header >> 12) & 0xF
+    sample_rate_index = (header >> 10) & 0x3
+    if version_bits == 1 or layer_bits == 0 or bitrate_index in (0, 15) or sample_rate_index == 3:
+        return None
+
+    version = 1 if version_bits == 3 else 2
+    layer = 4 - layer_bits
+    bitrate = _MP3_BITRATES[(version, layer)][bitrate_index] * 1000
+    sample_rate = _MP3_SAMPLE_RATES[version_bits][sample_rate_index]
+    padding = (header >> 9) & 0x1
+    mono = ((header >> 6) & 0x3) == 3
+
+    if layer == 1:
+        samples_per_frame = 384
+        frame_length = (12 * bitrate // sample_rate + padding) * 4
+    elif layer == 3 and version == 2:
+        samples_per_frame = 576
+        frame_length = 72 * bitrate // sample_rate + padding
+    else:
+        samples_per_frame = 1152
+        frame_length = 144 * bitrate // sample_rate + padding
+    return frame_length, samples_per_frame, sample_rate, mono
+
+
+def _skip_id3v2(data):
+    """返回跳过 ID3v2 标签后的偏移"""
+    offset = 0
+    while data[offset:offset + 3] == b"ID3" and len(data) >= offset + 10:
+        size = 0
+        for byte in data[offset + 6:offset + 10]:
+            size = (size << 7) | (byte & 0x7F)  # synchsafe 整数
+        footer = 10 if data[offset + 5] & 0x10 else 0
+        offset += 10 + size + footer
+    return offset
+
+
+def probe_mp3(path):
+    """读取 Xing/Info/VBRI 头获取总帧数，没有时逐帧扫描帧头"""
+    with open(path, "rb") as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as data:
+        size = len(data)
+        offset = _skip_id3v2(data)
+
+        # 定位第一个有效帧
+        first = None
+        while offset + 4 <= size:
+            first = _parse_mp3_header(struct.unpack(">I", data[offset:offset + 4])[0])
+            if first:
+                break
+            offset += 1
+        if not first:
+            return None
+        frame_length, samples_per_frame, sample_rate, mono = first
+
+        # VBR 头中记录了总帧数
+        version_bits = (struct.unpack(">I", data[offset:offset + 4])[0] >> 19) & 0x3
+        if version_bits == 3:
+            xing_offset = offset + (21 if mono else 36)
+        else:
+            xing_offset = offset + (13 if mono else 21)
+        if data[xing_offset:xing_offset + 4] in (b"Xing", b"Info"):
+            flags = struct.unpack(">I", data[xing_offset + 4:xing_offset + 8])[0]
+            if flags & 0x1:
+                frames = struct.unpack(">I", data[xing_offset + 8:xing_offset + 12])[0]
+                return frames * samples_per_frame / sample_rate
+        vbri_offset = offset + 36
+        if data[vbri_offset:vbri_offset + 4] == b"VBRI":
+            frames = struct.unpack(">I", data[vbri_offset + 14:vbri_offset + 18])[0]
+            return frames * samples_per_frame / sample_rate
+
+        # 逐帧扫描帧头，只读取每帧的前 4 个字节
+        total_samples = 0
+        while offset + 4 <= size:
+            parsed = _parse_mp3_header(struct.unpack(">I", data[offset:offset + 4])[0])
+            if not parsed or parsed[0] <= 0:
+                break
+            frame_length, samples_per_frame, sample_rate, _ = parsed
+            total_samples += samples_per_frame
+            offset += frame_length
+        return total_samples / sample_rate
+
+
+def probe_wav(path):
+    """读取 RIFF 的 fmt 和 data 块头计算时长"""
+    with open(path, "rb") as f:
+        riff = f.read(12)
+        if riff[:4] != b"RIFF" or riff[8:12] != b"WAVE":
+            return None
+        byte_rate = None
+        while True:
+            chunk = f.read(8)
+            if len(chunk) < 8:
+                return None
+            chunk_id, chunk_size = struct.unpack("<4sI", chunk)
+            if chunk_id == b"fmt ":
+                fmt = f.read(chunk_size)
+                byte_rate = struct.unpack("<I", fmt[8:12])[0]
+                chunk_size = 0
+            elif chunk_id == b"data":
+                if not byte_rate:
+                    return None
+                # 写入中断的文件 data 块大小可能不准确，以实际文件大小为上限
+                data_size = min(chunk_size, os.path.getsize(path) - f.tell())
+                return data_size / byte_rate
+            f.seek(chunk_size + (chunk_size & 1), os.SEEK_CUR)
+
+
+def probe_ogg(path):
+    """读取 Vorbis/Opus 标识头的采样率和最后一页的 granule position"""
+    with open(path, "rb") as f:
+        head = f.read(4096)
+        if head[:4] != b"OggS":
+            return None
+        page_header_size = 27 + head[26]
+        packet = head[page_header_size:]
+        if packet[:7] == b"\x01vorbis":
+            sample_rate = struct.unpack("<I", packet[12:16])[0]
+            pre_skip = 0
+        elif packet[:8] == b"OpusHead":
+            sample_rate = 48000  # Opus 的 granule 始终以 48kHz 计
+            pre_skip = struct.unpack("<H", packet[10:12])[0]
+        else:
+            return None
+
+        size = os.fstat(f.fileno()).st_size
+        f.seek(max(0, size - 65536))
+        tail = f.read()
+        last_page = tail.rfind(b"OggS")
+        if last_page < 0 or last_page + 14 > len(tail):
+            return None
+        granule = struct.unpack("<q", tail[last_page + 6:last_page + 14])[0]
+        return max(granule - pre_skip, 0) / sample_rate
+
+
+_PROBES = {
+    ".mp3": probe_mp3,
+    ".wav": probe_wav,
+    ".ogg": probe_ogg,
+    ".opus": probe_ogg,
+}
+
+
+def probe_duration(path):
+    """只读取文件头/帧头获取时长（秒）；无法识别时退回到完整解码"""
+    probe = _PROBES.get(os.path.splitext(path)[1].lower())
+    duration = None
+    if probe:
+        try:
+            duration = probe(path)
+        except (OSError, ValueError, struct.error):
+            duration = None
+    if duration is None:
+        import pygame
+        duration = pygame.mixer.Sound(path).get_length()
+    return duration
+
+
+class DurationCache:
+    """持久化的时长缓存，以路径、文件大小和修改时间为键"""
+
+    def __init__(self, cache_path):
+        self.cache_path = cache_path
+        self._entries = {}  # 绝对路径 -> {"size", "mtime_ns", "duration"}
+        self._lock = threading.Lock()
+        self.load()
+
+    def load(self):
+        if os.path.exists(self.cache_path):
+            try:
+                with open(self.cache_path, "r", encoding="utf-8") as f:
+                    self._entries = json.load(f)
+            except (OSError, ValueError):
+                self._entries = {}  # 缓存损坏时直接重建
+
+    def save(self):
+        """原子地写入缓存文件"""
+        os.makedirs(os.path.dirname(self.cache_path), exist_ok=True)
+        tmp_path = self.cache_path + ".tmp"
+        with self._lock:
+            with open(tmp_path, "w", encoding="utf-8") as f:
+                json.dump(self._entries, f, ensure_ascii=False)
+            os.replace(tmp_path, self.cache_path)
+
+    def get_duration(self, path, save=True):
+        """获取时长，文件未变化时直接返回缓存值；批量探测时可传 save=False 并在最后调用 save"""
+        key = os.path.abspath(path)
+        stat = os.stat(key)
+        with self._lock:
+            entry = self._entries.get(key)
+        if entry and entry["size"] == stat.st_size and entry["mtime_ns"] == stat.st_mtime_ns:
+            return entry["duration"]
+
+        duration = probe_duration(key)
+        with self._lock:
+            self._entries[key] = {"size": stat.st_size, "mtime_ns": stat.st_mtime_ns, "duration": duration}
+        if save:
+            self.save()
+        return duration
@@ -0,0 +1,150 @@
+# content_store.py
+
+import hashlib
+import json
+import os
+import threading
+
+HASH_CHUNK_SIZE = 1024 * 1024
+
+
+class CopyCancelled(Exception):
+    """哈希或复制过程被取消"""
+
+
+def hash_file(path, should_cancel=None, chunk_size=HASH_CHUNK_SIZE):
+    """流式计算文件内容的 SHA-256，不会把整个文件读入内存"""
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        while True:
+            if should_cancel and should_cancel():
+                raise CopyCancelled()
+            chunk = f.read(chunk_size)
+            if not chunk:
+                break
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+class ContentStore:
+    """music_dir 的内容寻址存储：每份内容只保存一次，可读的文件名通过硬链接指向它"""
+
+    def __init__(self, music_dir):
+        self.music_dir = music_dir
+        self.objects_dir = os.path.join(music_dir, ".objects")
+        self.index_path = os.path.join(self.objects_dir, "index.json")
+        self._index = {}  # 哈希 -> {"object": 对象文件名, "size": 字节数, "paths": [指向该内容的路径]}
+        self._by_path = {}  # 路径 -> 哈希
+        self._lock = threading.RLock()
+        self.load()
+
+    def load(self):
+        if os.path.exists(self.index_path):
+            try:
+                with open(self.index_path, "r", encoding="utf-8") as f:
+                    self._index = json.load(f)
+            except (OSError, ValueError):
+                self._index = {}
+        self._by_path = {path: content_hash for content_hash, entry in self._index.items() for path in entry["paths"]}
+
+    def save(self):
+        """原子地写入索引文件"""
+        with self._lock:
+            os.makedirs(self.objects_dir, exist_ok=True)
+            tmp_path = self.index_path + ".tmp"
+            with open(tmp_path, "w", encoding="utf-8") as f:
+                json.dump(self._index, f, ensure_ascii=False)
+            os.replace(tmp_path, self.index_path)
+
+    def object_path(self, content_hash, extension):
+        return os.path.join(self.objects_dir, content_hash[:2], content_hash + extension.lower())
+
+    def _store_object(self, source_path, object_path, should_cancel=None):
+        """复制一份新内容到对象目录；临时文件名按线程区分，同一内容被并发导入时后写入的替换先写入的"""
+        os.makedirs(os.path.dirname(object_path), exist_ok=True)
+        tmp_path = f"{object_path}.{threading.get_ident()}.part"
+        try:
+            with open(source_path, "rb") as source, open(tmp_path, "wb") as target:
+                while True:
+                    if should_cancel and should_cancel():
+                        raise CopyCancelled()
+                    chunk = source.read(HASH_CHUNK_SIZE)
+                    if not chunk:
+                        break
+                    target.write(chunk)
+            os.replace(tmp_path, object_path)
+        finally:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+
+    def _link(self, object_path, named_path):
+        """为对象创建可读文件名的硬链接；文件系统不支持时直接使用对象路径"""
+        try:
+            os.link(object_path, named_path)
+            return named_path
+        except OSError:
+            return object_path
+
+    def add(self, source_path, name, should_cancel=None, content_hash=None):
+        """把 source_path 存入仓库并以 name 链接到 music_dir，返回 (内容哈希, 路径, 实际文件名)
+
+        相同内容只保存一份；name 已被其他内容占用时追加编号。已经算过哈希时可通过 content_hash 传入。
+        复制在锁外进行，多个导入线程可以同时复制，只有选择文件名和更新索引时持有锁。
+        """
+        if content_hash is None:
+            content_hash = hash_file(source_path, should_cancel)
+        base, extension = os.path.splitext(name)
+        object_path = self.object_path(content_hash, extension)
+        if not os.path.exists(object_path):
+            self._store_object(source_path, object_path, should_cancel)
+
+        with self._lock:
+            index = 0
+            while True:
+                candidate = name if index == 0 else f"{base} ({index}){extension}"
+                named_path = os.path.join(self.music_dir, candidate)
+                if not os.path.exists(named_path):
+                    path = self._link(object_path, named_path)
+                    break
+                if os.path.samefile(named_path, object_path) or self.lookup_path(named_path) == content_hash:
+                    path = named_path  # 同名同内容，直接复用
+                    break
+                index += 1
+
+            entry = self._index.setdefault(content_hash, {
+                "object": os.path.relpath(object_path, self.objects_dir),
+                "size": os.path.getsize(object_path),
+                "paths": [],
+            })
+            if path not in entry["paths"]:
+                entry["paths"].append(path)
+            self._by_path[path] = content_hash
+        self.save()
+        return content_hash, path, candidate
+
+    def lookup_path(self, path):
+        """返回索引中记录该路径的内容哈希"""
+        with self._lock:
+            return self._by_path.get(path)
+
+    def resolve(self, content_hash):
+        """返回一个仍然存在、内容为 content_hash 的路径，找不到时返回 None"""
+        with self._lock:
+            entry = self._index.get(content_hash)
+            if entry is None:
+                return None
+            for path in entry["paths"]:
+                if os.path.exists(path):
+                    return path
+            object_path = os.path.join(self.objects_dir, entry["object"])
+            return object_path if os.path.exists(object_path) else None
+
+    def relink(self, music):
+        """absolute_path 失效时通过内容哈希重新定位文件，无需扫描目录；路径有变化时返回 True"""
+        if not music.content_hash or os.path.exists(music.absolute_path):
+            return False
+        path = self.resolve(music.content_hash)
+        if path is None:
+            return False
+        music.absolute_path = path
+        return True
@@ -0,0 +1,250 @@
+# control_server.py
+"""本机远程控制端口（Stream Deck、OBS 脚本等）
+
+文本行协议：每行一条命令，命令名与参数以空格分隔，每条命令回复一行 JSON：
+
+    play <音乐名称>          stop [音乐名称]        volume <0~100>
+    preset <预设名> [淡化秒数]  random <标签查询>      stats        ping
+
+回复形如 {"ok": true, ...} 或 {"ok": false, "error": "..."}；会发出声音的命令附带
+latency_ms，即从收到命令到第一个包含该音频的混音块送入声道的耗时。
+
+命令行客户端：
+
+    python -m src.control_server play "tavern.mp3"
+    python -m src.control_server --port 7878 random "battle AND NOT vocal"
+"""
+
+import argparse
+import asyncio
+import json
+import socket
+import sys
+import threading
+import time
+from concurrent.futures import Future
+
+DEFAULT_PORT = 7878
+AUDIO_TIMEOUT = 2.0  # 等待音频送入声道的最长时间（秒）
+
+
+class CommandError(Exception):
+    """命令参数错误或目标不存在，作为错误信息回复给客户端"""
+
+
+class Command:
+    """一条正在执行的命令"""
+
+    def __init__(self, name, args, started):
+        self.name = name
+        self.args = args  # 命令名之后的原始文本
+        self.started = started  # 收到命令的时刻（perf_counter）
+        self.audible = None  # 等待音频送入声道的 Future
+
+    def wait_for_audio(self, mixer_engine):
+        """命令执行后调用：回复前等待下一个混音块送入声道，并报告延迟"""
+        self.audible = Future()
+        mixer_engine.notify_when_audible(self.started, self._on_audible)
+
+    def _on_audible(self, elapsed):
+        if not self.audible.done():
+            self.audible.set_result(elapsed)
+
+
+class LibrarySnapshot:
+    """MusicManager 的线程安全副本：作为观察者在 Tk 线程中更新，供控制端口在其他线程中查询
+
+    同时记录当前预设（混音器正在播放的场景）。界面和控制端口都通过 switch_preset 切换场景，
+    比较、记录离开的场景和交换音轨在同一把锁内完成，两边同时切换时不会把音轨记到错误的预设下。
+    """
+
+    def __init__(self, preset=None):
+        self._music_files = {}
+        self._preset = preset
+        self._lock = threading.Lock()
+        self._switch_lock = threading.Lock()  # 只用于场景切换，不阻塞音乐查询
+
+    @property
+    def preset(self):
+        with self._lock:
+            return self._preset
+
+    def set_preset(self, preset):
+        """不交换音轨、只改变当前预设（加载或新建预设）"""
+        with self._switch_lock, self._lock:
+            self._preset = preset
+
+    def switch_preset(self, preset, switch):
+        """切换到 preset：与当前预设相同时返回 False；否则调用 switch(离开的预设)，成功后更新当前预设并返回 True"""
+        with self._switch_lock:
+            previous = self.preset
+            if previous == preset:
+                return False
+            switch(previous)
+            with self._lock:
+                self._preset = preset
+            return True
+
+    def on_music_added(self, music):
+        with self._lock:
+            self._music_files[music.name] = music
+
+    def on_music_removed(self, music_name):
+        with self._lock:
+            self._music_files.pop(music_name, None)
+
+    def on_music_updated(self, music):
+        self.on_music_added(music)
+
+    def on_replaced(self, music_files):
+        music_files = {music.name: music for music in music_files}
+        with self._lock:
+            self._music_files = music_files
+
+    def on_cleared(self):
+        with self._lock:
+            self._music_files.clear()
+
+    def get(self, music_name):
+        with self._lock:
+            return self._music_files.get(music_name)
+
+    def all(self):
+        with self._lock:
+            return list(self._music_files.values())
+
+
+class ControlServer:
+    """在独立线程的 asyncio 事件循环中监听本机端口，命令在线程池中执行，不经过 Tk 事件循环"""
+
+    def __init__(self, commands, host="127.0.0.1", port=DEFAULT_PORT, on_latency=None):
+        self.commands = commands  # 命令名 -> callable(Command)，返回 dict 或 None，出错时抛出 CommandError
+        self.host = host
+        self.port = port  # 为 0 时由系统分配，start() 后更新为实际端口
+        self.on_latency = on_latency  # 可选的回调 (命令名, 耗时秒数)
+        self._loop = None
+        self._server = None
+        self._thread = None
+
+    def start(self):
+        """启动监听线程；端口无法绑定时抛出 OSError"""
+        ready = threading.Event()
+        errors = []
+
+        def run():
+            self._loop = asyncio.new_event_loop()
+            asyncio.set_event_loop(self._loop)
+            try:
+                self._server = self._loop.run_until_complete(asyncio.start_server(self._handle, self.host, self.port))
+            except OSError as e:
+                errors.append(e)
+                ready.set()
+                self._loop.close()
+                return
+            self.port = self._server.sockets[0].getsockname()[1]
+            ready.set()
+            self._loop.run_forever()
+            self._server.close()
+            self._loop.run_until_complete(self._server.wait_closed())
+            self._loop.close()
+
+        self._thread = threading.Thread(target=run, name="ControlServer", daemon=True)
+        self._thread.start()
+        ready.wait()
+        if errors:
+            self._thread = None
+            raise errors[0]
+
+    def stop(self):
+        if self._thread is not None:
+            self._loop.call_soon_threadsafe(self._loop.stop)
+            self._thread.join(timeout=1)
+            self._thread = None
+
+    async def _handle(self, reader, writer):
+        try:
+            while True:
+                line = await reader.readline()
+                if not line:
+                    break
+                started = time.perf_counter()
+                text = line.decode("utf-8", errors="replace").strip()
+                if not text:
+                    continue
+                response = await self.execute(text, started)
+                writer.write((json.dumps(response, ensure_ascii=False) + "\n").encode("utf-8"))
+                await writer.drain()
+        except (ConnectionError, asyncio.IncompleteReadError):
+            pass
+        finally:
+            writer.close()
+
+    async def execute(self, text, started):
+        name, _, args = text.partition(" ")
+        name = name.lower()
+        handler = self.commands.get(name)
+        if handler is None:
+            return {"ok": False, "error": f"unknown command: {name}", "commands": sorted(self.commands)}
+        command = Command(name, args.strip(), started)
+        try:
+            # 解码等耗时操作放到线程池中，一个客户端的慢命令不会阻塞其他连接
+            result = await asyncio.get_running_loop().run_in_executor(None, handler, command)
+        except CommandError as e:
+            return {"ok": False, "error": str(e)}
+        except Exception as e:
+            return {"ok": False, "error": f"{type(e).__name__}: {e}"}
+        response = {"ok": True}
+        response.update(result or {})
+        if command.audible is not None:
+            try:
+                elapsed = await asyncio.wait_for(asyncio.wrap_future(command.audible), AUDIO_TIMEOUT)
+            except asyncio.TimeoutError:
+                response["latency_ms"] = None  # 没有音频输出（例如音轨为空或已暂停）
+            else:
+                response["latency_ms"] = elapsed * 1000
+                if self.on_latency is not None:
+                    self.on_latency(name, elapsed)
+        return response
+
+
+class ControlClient:
+    """控制端口的同步客户端，用于脚本和测试"""
+
+    def __init__(self, host="127.0.0.1", port=DEFAULT_PORT, timeout=5.0):
+        self._socket = socket.create_connection((host, port), timeout=timeout)
+        self._file = self._socket.makefile("rwb")
+
+    def send(self, line):
+        """发送一条命令并返回解析后的回复"""
+        self._file.write((line.strip() + "\n").encode("utf-8"))
+        self._file.flush()
+        reply = self._file.readline()
+        if not reply:
+            raise ConnectionError("control server closed the connection")
+        return json.loads(reply)
+
+    def close(self):
+        self._file.close()
+        self._socket.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Send a command to a running LiveAudioPlayer")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=DEFAULT_PORT)
+    parser.add_argument("command", nargs="+", help="e.g. play tavern.mp3 / volume 40 / random battle")
+    args = parser.parse_args()
+    with ControlClient(args.host, args.port) as client:
+        response = client.send(" ".join(args.command))
+    print(json.dumps(response, ensure_ascii=False, indent=2))
+    sys.exit(0 if response.get("ok") else 1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,246 @@
+# decoded_store.py
+
+import hashlib
+import json
+import os
+import threading
+import time
+
+import numpy as np
+
+from src.audio_decode import decode_file, mixer_format
+
+
+class DecodedStore:
+    """磁盘上的解码缓存：每个音频文件只解码一次，原始 PCM 通过 mmap 读取
+
+    每个条目是一对文件：<键>_<采样率>x<声道数>.pcm 保存原始样本，同名 .json 保存形状、类型和源文件信息。
+    键为内容哈希（没有哈希时为路径的哈希），同一内容在不同采样率下分别缓存。读取时返回只读的
+    np.memmap，数据由操作系统页缓存共享，不复制到 Python 内存中。条目自成一体，不需要中心索引，
+    因此多个进程也可以同时读写。超过容量时按最近使用时间（.json 的修改时间）淘汰。
+    """
+
+    def __init__(self, cache_dir, max_bytes=4 * 1024 * 1024 * 1024, max_maps=256):
+        self.cache_dir = cache_dir
+        self.max_bytes = max_bytes  # 磁盘容量上限（字节），None 表示不淘汰
+        self.max_maps = max_maps  # 同时保持打开的映射数
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._maps = {}  # 条目文件名 -> np.memmap
+        self._lock = threading.Lock()
+        self._total_bytes = None  # 目录总大小的估计，首次需要时扫描
+        os.makedirs(cache_dir, exist_ok=True)
+
+    @staticmethod
+    def make_key(path, content_hash=None):
+        if content_hash:
+            return content_hash
+        return "p" + hashlib.sha1(os.path.abspath(path).encode("utf-8")).hexdigest()
+
+    def _entry_path(self, path, content_hash, frequency, channels):
+        name = f"{self.make_key(path, content_hash)}_{frequency}x{channels}"
+        return os.path.join(self.cache_dir, name)
+
+    ##################################读取##############################################
+    def load(self, path, content_hash=None, frequency=None, channels=None):
+        """返回缓存的整首 PCM（只读 memmap），不存在或源文件已变化时返回 None"""
+        if frequency is None:
+            frequency, channels = mixer_format()
+        samples = self._open(self._entry_path(path, content_hash, frequency, channels), path, content_hash)
+        if samples is None:
+            self.misses += 1
+        else:
+            self.hits += 1
+        return samples
+
+    def _open(self, entry, path, content_hash):
+        meta = self._read_meta(entry)
+        if meta is None or not self._matches_source(meta, path, content_hash):
+            if meta is not None:
+                self._remove(entry)
+            return None
+        with self._lock:
+            samples = self._maps.get(entry)
+        if samples is None:
+            try:
+                samples = np.memmap(entry + ".pcm", dtype=np.dtype(meta["dtype"]), mode="r",
+                                    shape=(meta["frames"], meta["channels"]))
+            except (OSError, ValueError):
+                self._remove(entry)
+                return None
+            with self._lock:
+                if len(self._maps) >= self.max_maps:
+                    self._maps.pop(next(iter(self._maps)))  # 仍在使用的视图会保持映射有效
+                self._maps[entry] = samples
+        self._touch(entry)
+        return samples
+
+    def get(self, path, content_hash=None):
+        """读取缓存，未命中时解码并写入磁盘；返回只读 memmap，无法写入缓存时返回内存中的解码结果"""
+        frequency, channels = mixer_format()
+        samples = self.load(path, content_hash, frequency, channels)
+        if samples is not None:
+            return samples
+        decoded = decode_file(path)
+        if self.store(path, decoded, content_hash, frequency):
+            samples = self._open(self._entry_path(path, content_hash, frequency, decoded.shape[1]), path, content_hash)
+        return decoded if samples is None else samples
+
+    ##################################写入##############################################
+    def store(self, path, samples, content_hash=None, frequency=None):
+        """把解码后的 (帧数, 声道数) 样本写入缓存，成功时返回 True
+
+        先写临时文件再替换，读取方不会看到写了一半的文件。
+        """
+        if frequency is None:
+            frequency, _ = mixer_format()
+        samples = np.ascontiguousarray(samples)
+        entry = self._entry_path(path, content_hash, frequency, samples.shape[1])
+        stat = os.stat(path)
+        meta = {
+            "frames": samples.shape[0],
+            "channels": samples.shape[1],
+            "dtype": samples.dtype.str,
+            "frequency": frequency,
+            "source": os.path.abspath(path),
+            "source_size": stat.st_size,
+            "source_mtime_ns": stat.st_mtime_ns,
+        }
+        suffix = f".{os.getpid()}.{threading.get_ident()}.tmp"
+        try:
+            if os.path.exists(entry + ".json"):
+                os.remove(entry + ".json")  # 先让旧条目失效，避免新样本配上旧的形状
+            samples.tofile(entry + ".pcm" + suffix)
+            os.replace(entry + ".pcm" + suffix, entry + ".pcm")
+            with open(entry + ".json" + suffix, "w", encoding="utf-8") as f:
+                json.dump(meta, f)
+            os.replace(entry + ".json" + suffix, entry + ".json")
+        except OSError as e:
+            # 旧条目正被映射时 Windows 不允许替换，下次再写
+            print(f"Failed to write decoded cache for {path}: {e}")
+            for tmp in (entry + ".pcm" + suffix, entry + ".json" + suffix):
+                self._remove_file(tmp)
+            return False
+        with self._lock:
+            self._maps.pop(entry, None)
+            if self._total_bytes is not None:
+                self._total_bytes += samples.nbytes
+        self.trim()
+        return True
+
+    ##################################失效与淘汰##############################################
+    def _read_meta(self, entry):
+        try:
+            with open(entry + ".json", "r", encoding="utf-8") as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return None
+
+    @staticmethod
+    def _matches_source(meta, path, content_hash):
+        """内容哈希相同即内容相同（文件可能被重新链接到别处），否则用大小和修改时间判断源文件是否变化"""
+        try:
+            stat = os.stat(path)
+        except OSError:
+            return False
+        if stat.st_size != meta["source_size"]:
+            return False
+        return bool(content_hash) or stat.st_mtime_ns == meta["source_mtime_ns"]
+
+    def _touch(self, entry):
+        """更新最近使用时间，淘汰时据此排序"""
+        try:
+            os.utime(entry + ".json")
+        except OSError:
+            pass
+
+    def _remove(self, entry):
+        with self._lock:
+            self._maps.pop(entry, None)
+        removed = 0
+        for suffix in (".json", ".pcm"):
+            try:
+                size = os.path.getsize(entry + suffix)
+                os.remove(entry + suffix)
+            except OSError:
+                continue  # 不存在，或仍被映射（Windows），下次淘汰时再试
+            if suffix == ".pcm":
+                removed += size
+        with self._lock:
+            if self._total_bytes is not None:
+                self._total_bytes -= removed
+        return removed
+
+    def invalidate(self, path, content_hash=None):
+        """删除某个文件在所有采样率下的缓存"""
+        prefix = self.make_key(path, content_hash) + "_"
+        for name in os.listdir(self.cache_dir):
+            if name.startswith(prefix) and name.endswith(".json"):
+                self._remove(os.path.join(self.cache_dir, name[:-len(".json")]))
+
+    def _scan(self):
+        """返回 [(最近使用时间, 条目, 字节数)] 和总字节数"""
+        entries = []
+        total = 0
+        with os.scandir(self.cache_dir) as it:
+            for item in it:
+                if item.name.endswith(".tmp") and time.time() - item.stat().st_mtime > 3600:
+                    self._remove_file(item.path)  # 写入中断留下的临时文件
+                if not item.name.endswith(".pcm"):
+                    continue
+                entry = item.path[:-len(".pcm")]
+                size = item.stat().st_size
+                try:
+                    used = os.stat(entry + ".json").st_mtime
+                except OSError:
+                    used = 0.0  # 没有元数据的条目（写入中断）最先淘汰
+                entries.append((used, entry, size))
+                total += size
+        return entries, total
+
+    @staticmethod
+    def _remove_file(path):
+        try:
+            os.remove(path)
+        except OSError:
+            pass
+
+    @staticmethod
+    def _mtime(path):
+        try:
+            return os.path.getmtime(path)
+        except OSError:
+            return 0.0
+
+    def trim(self):
+        """超出容量时淘汰最久未使用的条目"""
+        if self.max_bytes is None:
+            return
+        if self._total_bytes is not None and self._total_bytes <= self.max_bytes:
+            return
+        entries, total = self._scan()
+        if total > self.max_bytes:
+            now = time.time()
+            for used, entry, size in sorted(entries):
+                if total <= self.max_bytes:
+                    break
+                if used == 0.0 and now - self._mtime(entry + ".pcm") < 60:
+                    continue  # 可能是其他进程正在写入
+                removed = self._remove(entry)
+                if removed:
+                    total -= removed
+                    self.evictions += 1
+        with self._lock:
+            self._total_bytes = total
+
+    def stats(self):
+        with self._lock:
+            return {
+                "disk_bytes": self._total_bytes,
+                "disk_max_bytes": self.max_bytes,
+                "disk_hits": self.hits,
+                "disk_misses": self.misses,
+                "disk_evictions": self.evictions,
+                "mapped": len(self._maps),
+            }
@@ -0,0 +1,130 @@
+# import_queue.py
+
+import os
+import queue
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from src.content_store import CopyCancelled, hash_file
+from src.music import Music
+from src.play_mode import PlayMode
+
+AUDIO_EXTENSIONS = (".mp3", ".wav", ".ogg")
+
+
+def find_audio_files(folder):
+    """递归查找文件夹中的音频文件，返回 (路径, 相对所在目录) 列表"""
+    found = []
+    for root, _, files in os.walk(folder):
+        for file_name in sorted(files):
+            if file_name.lower().endswith(AUDIO_EXTENSIONS):
+                found.append((os.path.join(root, file_name), os.path.relpath(root, folder)))
+    return found
+
+
+def folder_tags(relative_dir):
+    """把音效包的子目录名作为默认标签，例如 forest/birds -> ["forest", "birds"]"""
+    if relative_dir in ("", "."):
+        return []
+    return [part for part in relative_dir.replace("\\", "/").split("/") if part]
+
+
+class ImportQueue:
+    """在线程池中把文件存入内容仓库、探测时长并提取元数据，完成的 Music 由 Tk 线程分批取走
+
+    内容已在音乐库中的文件不会重新导入，而是返回原有的 Music，保留其标签、播放模式、裁剪、增益和热键。
+    """
+
+    def __init__(self, content_store, duration_cache, find_existing=None, max_workers=4):
+        self.content_store = content_store
+        self.duration_cache = duration_cache
+        self.find_existing = find_existing  # 可选的 callable(内容哈希)，返回音乐库中已有的 Music 或 None
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="ImportWorker")
+        self._results = queue.Queue()  # ("imported", (源路径, Music, 是否来自信息窗口))、("existing", Music)、("failed", (路径, 错误)) 或 ("cancelled", None)
+        self._cancel_event = threading.Event()
+        self._futures = []
+        self.total = 0
+        self.completed = 0
+        self.failed = []  # (路径, 错误信息)
+
+    @property
+    def active(self):
+        return self.completed < self.total
+
+    def _submit(self, source_path, tags, settings=None):
+        if not self.active:
+            self.total = self.completed = 0
+            self.failed = []
+            self._futures = []
+            self._cancel_event.clear()
+        self._futures.append(self._executor.submit(self._import_one, source_path, tags, settings))
+        self.total += 1
+
+    def submit(self, paths_with_tags):
+        """提交 (源路径, 标签列表) 列表"""
+        for path, tags in paths_with_tags:
+            self._submit(path, tags)
+
+    def submit_edited(self, source_path, name, tags, play_mode, start_time, end_time):
+        """提交在信息窗口中编辑过的单个文件，完成后按窗口中的名称和设置创建 Music（即使内容已在音乐库中）"""
+        self._submit(source_path, tags, {"name": name, "play_mode": play_mode, "start_time": start_time,
+                                         "end_time": end_time})
+
+    def cancel(self):
+        """取消尚未开始的任务，正在哈希或复制的文件会在下一个分块处中止"""
+        self._cancel_event.set()
+        for future in self._futures:
+            if future.cancel():
+                self._results.put(("cancelled", None))
+
+    def drain(self, max_items=200):
+        """取出最多 max_items 个结果（在 Tk 线程中调用），返回 (新导入的 (源路径, Music, 是否来自信息窗口) 列表, 音乐库中已有的 Music 列表)"""
+        imported = []
+        existing = []
+        for _ in range(max_items):
+            try:
+                kind, result = self._results.get_nowait()
+            except queue.Empty:
+                break
+            self.completed += 1
+            if kind == "imported":
+                imported.append(result)
+            elif kind == "existing":
+                existing.append(result)
+            elif kind == "failed":
+                self.failed.append(result)
+        if not self.active:
+            self.duration_cache.save()  # 整批结束后统一写入时长缓存
+        return imported, existing
+
+    def shutdown(self):
+        self.cancel()
+        self._executor.shutdown(wait=False)
+
+    ##################################工作线程##############################################
+    def _import_one(self, source_path, tags, settings):
+        try:
+            if self._cancel_event.is_set():
+                raise CopyCancelled()
+            content_hash = hash_file(source_path, self._cancel_event.is_set)
+            if settings is None and self.find_existing is not None:
+                existing = self.find_existing(content_hash)
+                if existing is not None:
+                    self._results.put(("existing", existing))
+                    return
+            name = os.path.basename(source_path) if settings is None else settings["name"]
+            content_hash, target_path, name = self.content_store.add(
+                source_path, name, should_cancel=self._cancel_event.is_set, content_hash=content_hash)
+            if settings is None:
+                music = Music(name=name, absolute_path=target_path, tags=list(tags), play_mode=PlayMode.ONCE,
+                              start_time=0, end_time=self.duration_cache.get_duration(target_path, save=False),
+                              content_hash=content_hash)
+            else:
+                music = Music(name=name, absolute_path=target_path, tags=list(tags), play_mode=settings["play_mode"],
+                              start_time=settings["start_time"], end_time=settings["end_time"],
+                              content_hash=content_hash)
+            self._results.put(("imported", (source_path, music, settings is not None)))
+        except CopyCancelled:
+            self._results.put(("cancelled", None))
+        except Exception as e:
+            self._results.put(("failed", (source_path, str(e))))
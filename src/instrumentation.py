@@ -0,0 +1,131 @@
+# instrumentation.py
+
+import functools
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+
+import numpy as np
+
+
+class OperationStats:
+    """一个操作的调用次数和耗时分布（保留最近的若干次用于计算百分位数）"""
+
+    def __init__(self, history=512):
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+        self.recent = deque(maxlen=history)
+
+    def record(self, elapsed):
+        self.count += 1
+        self.total += elapsed
+        self.max = max(self.max, elapsed)
+        self.recent.append(elapsed)
+
+    def snapshot(self):
+        """返回以毫秒为单位的统计快照"""
+        recent = np.array(self.recent) * 1000 if self.recent else np.zeros(1)
+        p50, p95, p99 = np.percentile(recent, [50, 95, 99])
+        return {
+            "count": self.count,
+            "total_ms": self.total * 1000,
+            "mean_ms": self.total / self.count * 1000 if self.count else 0.0,
+            "p50_ms": float(p50),
+            "p95_ms": float(p95),
+            "p99_ms": float(p99),
+            "max_ms": self.max * 1000,
+        }
+
+
+class Instrumentation:
+    """运行时操作耗时的登记表，可在任意线程中记录"""
+
+    def __init__(self):
+        self.operations = {}  # 操作名 -> OperationStats
+        self._lock = threading.Lock()
+
+    def record(self, name, elapsed):
+        with self._lock:
+            stats = self.operations.get(name)
+            if stats is None:
+                stats = self.operations[name] = OperationStats()
+            stats.record(elapsed)
+
+    @contextmanager
+    def measure(self, name):
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.record(name, time.perf_counter() - started)
+
+    def snapshot(self):
+        with self._lock:
+            return {name: stats.snapshot() for name, stats in sorted(self.operations.items())}
+
+    def reset(self):
+        with self._lock:
+            self.operations.clear()
+
+
+registry = Instrumentation()  # 全局登记表，@timed 装饰的函数记录到这里
+
+
+def timed(name):
+    """装饰器：把函数每次调用的耗时记录到全局登记表"""
+    def decorator(function):
+        @functools.wraps(function)
+        def wrapper(*args, **kwargs):
+            started = time.perf_counter()
+            try:
+                return function(*args, **kwargs)
+            finally:
+                registry.record(name, time.perf_counter() - started)
+        return wrapper
+    return decorator
+
+
+class EventLoopMonitor:
+    """用周期性的 after() 心跳测量 Tk 事件循环的延迟：实际触发时间比预期晚多少"""
+
+    def __init__(self, widget, interval_ms=100, stall_ms=100):
+        self.widget = widget
+        self.interval = interval_ms / 1000
+        self.stall = stall_ms / 1000  # 超过该延迟记为一次卡顿
+        self.lags = OperationStats(history=600)  # 约最近一分钟
+        self.stalls = 0
+        self._expected = None
+        self._running = False
+
+    def start(self):
+        if not self._running:
+            self._running = True
+            self._expected = time.perf_counter() + self.interval
+            self.widget.after(int(self.interval * 1000), self._beat)
+
+    def stop(self):
+        self._running = False
+
+    def _beat(self):
+        if not self._running:
+            return
+        now = time.perf_counter()
+        lag = max(now - self._expected, 0.0)
+        self.lags.record(lag)
+        if lag >= self.stall:
+            self.stalls += 1
+        self._expected = now + self.interval
+        self.widget.after(int(self.interval * 1000), self._beat)
+
+    def snapshot(self):
+        snapshot = self.lags.snapshot()
+        snapshot["stalls"] = self.stalls
+        snapshot["stall_threshold_ms"] = self.stall * 1000
+        snapshot["interval_ms"] = self.interval * 1000
+        return snapshot
+
+    def reset(self):
+        self.lags = OperationStats(history=600)
+        self.stalls = 0
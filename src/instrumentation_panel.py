@@ -0,0 +1,100 @@
+# instrumentation_panel.py
+
+import json
+import time
+from tkinter import filedialog
+
+import customtkinter
+
+
+class InstrumentationPanel(customtkinter.CTkFrame):
+    """设置页中的运行时诊断面板：显示时每秒刷新一次，可导出为 JSON"""
+
+    def __init__(self, master, collect, reset=None, refresh_ms=1000, **kwargs):
+        super().__init__(master, **kwargs)
+        self.collect = collect  # 返回诊断快照（可序列化为 JSON 的 dict）的函数
+        self.reset_callback = reset
+        self.refresh_ms = refresh_ms
+        self._running = False
+
+        self.grid_columnconfigure(0, weight=1)
+        self.grid_rowconfigure(1, weight=1)
+        self.title_label = customtkinter.CTkLabel(self, text="Diagnostics", font=customtkinter.CTkFont(size=14, weight="bold"))
+        self.title_label.grid(row=0, column=0, sticky="w", padx=10, pady=(10, 5))
+        self.export_button = customtkinter.CTkButton(self, text="Export JSON", width=100, command=self.export_json)
+        self.export_button.grid(row=0, column=1, padx=5, pady=(10, 5))
+        self.reset_button = customtkinter.CTkButton(self, text="Reset", width=60, command=self.reset)
+        self.reset_button.grid(row=0, column=2, padx=(5, 10), pady=(10, 5))
+
+        self.textbox = customtkinter.CTkTextbox(self, font=("Courier", 12), wrap="none")
+        self.textbox.grid(row=1, column=0, columnspan=3, sticky="nsew", padx=10, pady=(0, 10))
+
+    def start(self):
+        if not self._running:
+            self._running = True
+            self.refresh()
+
+    def stop(self):
+        self._running = False
+
+    def refresh(self):
+        """重新采集并显示；面板隐藏后停止刷新"""
+        if not self._running or not self.winfo_exists():
+            return
+        self.show(self.collect())
+        self.after(self.refresh_ms, self.refresh)
+
+    def show(self, snapshot):
+        self.textbox.configure(state="normal")
+        self.textbox.delete("1.0", "end")
+        self.textbox.insert("1.0", self.format(snapshot))
+        self.textbox.configure(state="disabled")
+
+    @staticmethod
+    def format(snapshot):
+        """把快照格式化为便于阅读的文本"""
+        lines = []
+        loop = snapshot.get("event_loop")
+        if loop:
+            lines.append("Event loop lag (heartbeat every {:.0f} ms)".format(loop["interval_ms"]))
+            lines.append(f"  p50 {loop['p50_ms']:7.2f}  p95 {loop['p95_ms']:7.2f}  p99 {loop['p99_ms']:7.2f}  "
+                         f"max {loop['max_ms']:7.2f} ms  ·  stalls ≥{loop['stall_threshold_ms']:.0f} ms: {loop['stalls']}")
+        mixer = snapshot.get("mixer")
+        if mixer:
+            lines.append("Mixer")
+            lines.append(f"  block {mixer['average_ms']:.2f}/{mixer['budget_ms']:.1f} ms (max {mixer['max_ms']:.2f})  ·  "
+                         f"over budget {mixer['over_budget']}  ·  underruns {mixer['underruns']}  ·  "
+                         f"tracks {mixer['tracks']} (max {mixer['max_tracks']})")
+        cache = snapshot.get("pcm_cache")
+        if cache:
+            lines.append("PCM cache")
+            lines.append("  " + "  ·  ".join(f"{key} {value:.2f}" if isinstance(value, float) else f"{key} {value}"
+                                         for key, value in cache.items()))
+        hotkeys = snapshot.get("hotkeys")
+        if hotkeys:
+            lines.append("Hotkeys")
+            lines.append(f"  p50 {hotkeys['p50']:.2f}  p95 {hotkeys['p95']:.2f}  p99 {hotkeys['p99']:.2f}  "
+                         f"max {hotkeys['max']:.2f} ms  ·  {hotkeys['count']} triggers  ·  {hotkeys['misses']} not preloaded")
+        operations = snapshot.get("operations")
+        if operations:
+            lines.append("Operations" + " " * 16 + "count    mean     p95     max   total (ms)")
+            for name, stats in operations.items():
+                lines.append(f"  {name:<24}{stats['count']:>5} {stats['mean_ms']:7.2f} {stats['p95_ms']:7.2f} "
+                             f"{stats['max_ms']:7.2f} {stats['total_ms']:9.1f}")
+        return "\n".join(lines)
+
+    def export_json(self):
+        path = filedialog.asksaveasfilename(defaultextension=".json", filetypes=[("JSON", "*.json")],
+                                            initialfile=time.strftime("diagnostics-%Y%m%d-%H%M%S.json"))
+        if not path:
+            return
+        snapshot = self.collect()
+        snapshot["timestamp"] = time.strftime("%Y-%m-%dT%H:%M:%S")
+        with open(path, "w", encoding="utf-8") as f:
+            json.dump(snapshot, f, ensure_ascii=False, indent=2)
+
+    def reset(self):
+        if self.reset_callback is not None:
+            self.reset_callback()
+        if self._running:
+            self.show(self.collect())
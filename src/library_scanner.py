@@ -0,0 +1,157 @@
+# library_scanner.py
+
+import json
+import os
+import threading
+
+from src.content_store import hash_file
+from src.import_queue import AUDIO_EXTENSIONS
+
+SKIPPED_DIRS = {".objects", ".cache", "presets"}  # 内容仓库、缓存和预设目录不属于音乐文件
+
+
+class ScannedFile:
+    """扫描到的一个音频文件"""
+
+    def __init__(self, path, relative_dir, content_hash, duration, previous_duration=None):
+        self.path = path
+        self.relative_dir = relative_dir  # 相对 music_dir 的所在目录，用作默认标签
+        self.content_hash = content_hash
+        self.duration = duration
+        self.previous_duration = previous_duration  # 内容变化前的时长，只对 changed 有意义
+
+
+class ScanResult:
+    """一次扫描与上次索引的差异"""
+
+    def __init__(self):
+        self.added = []  # ScannedFile
+        self.changed = []  # 路径不变、内容变化的 ScannedFile
+        self.moved = []  # (旧路径, ScannedFile)
+        self.removed = []  # 路径
+        self.unchanged = 0
+        self.hashed = 0  # 本次需要重新哈希的文件数
+
+    def __bool__(self):
+        return bool(self.added or self.changed or self.moved or self.removed)
+
+
+class LibraryScanner:
+    """增量扫描 music_dir：用 os.scandir 遍历，与持久化的 (路径, 大小, 修改时间, inode) 索引比较
+
+    大小、修改时间和 inode 都没变的文件只需一次 stat；只有新增或变化的文件才重新哈希和探测时长。
+    重命名或移动的文件按 inode（或内容哈希）识别为移动，而不是删除后新增。
+    """
+
+    def __init__(self, music_dir, index_path, duration_cache):
+        self.music_dir = music_dir
+        self.index_path = index_path
+        self.duration_cache = duration_cache
+        self._index = {}  # 路径 -> {"size", "mtime_ns", "inode", "hash", "duration"}
+        self._lock = threading.Lock()  # 同一时间只运行一次扫描
+        self.load()
+
+    def load(self):
+        if os.path.exists(self.index_path):
+            try:
+                with open(self.index_path, "r", encoding="utf-8") as f:
+                    self._index = json.load(f)
+            except (OSError, ValueError):
+                self._index = {}  # 索引损坏时重新扫描
+
+    def save(self):
+        """原子地写入索引文件"""
+        os.makedirs(os.path.dirname(self.index_path), exist_ok=True)
+        tmp_path = self.index_path + ".tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(self._index, f, ensure_ascii=False)
+        os.replace(tmp_path, self.index_path)
+
+    def walk(self):
+        """遍历 music_dir 中的音频文件，返回 {路径: (相对目录, stat)}；DirEntry 的 stat 在 Windows 上不需要额外的系统调用"""
+        found = {}
+        pending = [(self.music_dir, "")]
+        while pending:
+            directory, relative_dir = pending.pop()
+            try:
+                with os.scandir(directory) as it:
+                    for entry in it:
+                        if entry.is_dir(follow_symlinks=False):
+                            if entry.name not in SKIPPED_DIRS and not entry.name.startswith("."):
+                                pending.append((entry.path, os.path.join(relative_dir, entry.name)))
+                        elif entry.name.lower().endswith(AUDIO_EXTENSIONS) and entry.is_file():
+                            found[entry.path] = (relative_dir, entry.stat())
+            except OSError as e:
+                print(f"Failed to scan {directory}: {e}")
+        return found
+
+    @staticmethod
+    def _inode(stat):
+        return stat.st_ino or None  # 不支持 inode 的文件系统上为 0
+
+    def scan(self):
+        """扫描一次并更新索引，返回 ScanResult；music_dir 不可访问时返回 None（不把所有文件当作已删除）"""
+        if not os.path.isdir(self.music_dir):
+            return None
+        with self._lock:
+            found = self.walk()
+            result = ScanResult()
+            index = {}
+            new_paths = []
+            for path, (relative_dir, stat) in found.items():
+                entry = self._index.get(path)
+                if (entry is not None and entry["size"] == stat.st_size and entry["mtime_ns"] == stat.st_mtime_ns
+                        and entry["inode"] == self._inode(stat)):
+                    index[path] = entry
+                    result.unchanged += 1
+                else:
+                    new_paths.append(path)
+
+            # 消失的路径：先按 inode 匹配新路径（重命名不改变 inode 和修改时间），剩下的再按内容哈希匹配
+            gone = {path: entry for path, entry in self._index.items() if path not in found}
+            gone_by_inode = {(entry["inode"], entry["size"], entry["mtime_ns"]): path
+                             for path, entry in gone.items() if entry["inode"]}
+            for path in new_paths:
+                relative_dir, stat = found[path]
+                old_path = gone_by_inode.pop((self._inode(stat), stat.st_size, stat.st_mtime_ns), None)
+                if old_path is not None:
+                    entry = dict(gone.pop(old_path))
+                else:
+                    try:
+                        entry = {"hash": hash_file(path), "duration": self.duration_cache.get_duration(path, save=False)}
+                    except Exception as e:
+                        print(f"Failed to scan {path}: {e}")
+                        continue
+                    result.hashed += 1
+                entry.update(size=stat.st_size, mtime_ns=stat.st_mtime_ns, inode=self._inode(stat))
+                index[path] = entry
+                scanned = ScannedFile(path, relative_dir, entry["hash"], entry["duration"])
+                if old_path is not None:
+                    result.moved.append((old_path, scanned))
+                elif path in self._index:
+                    if self._index[path]["hash"] != entry["hash"]:
+                        scanned.previous_duration = self._index[path]["duration"]
+                        result.changed.append(scanned)
+                else:
+                    result.added.append(scanned)
+
+            gone_by_hash = {}
+            for path, entry in gone.items():
+                gone_by_hash.setdefault(entry["hash"], []).append(path)
+            added = []
+            for scanned in result.added:
+                candidates = gone_by_hash.get(scanned.content_hash)
+                if candidates:
+                    old_path = candidates.pop()
+                    del gone[old_path]
+                    result.moved.append((old_path, scanned))
+                else:
+                    added.append(scanned)
+            result.added = added
+            result.removed = list(gone)
+
+            self._index = index
+            if result or result.hashed:
+                self.save()
+                self.duration_cache.save()
+            return result
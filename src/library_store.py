@@ -0,0 +1,322 @@
+# library_store.py
+
+import glob
+import json
+import os
+import sqlite3
+import threading
+import time
+
+from src.music import Music
+from src.play_mode import PlayMode
+
+# 按顺序执行的结构迁移，PRAGMA user_version 记录已执行到第几个
+_MIGRATIONS = [
+    """
+    CREATE TABLE music (
+        name TEXT PRIMARY KEY,
+        absolute_path TEXT NOT NULL,
+        play_mode TEXT NOT NULL,
+        start_time REAL NOT NULL DEFAULT 0,
+        end_time REAL
+    );
+    CREATE TABLE music_tags (
+        music_name TEXT NOT NULL REFERENCES music(name) ON DELETE CASCADE,
+        tag TEXT NOT NULL,
+        position INTEGER NOT NULL,
+        PRIMARY KEY (music_name, tag)
+    );
+    CREATE INDEX music_tags_by_tag ON music_tags(tag);
+    CREATE TABLE presets (
+        name TEXT PRIMARY KEY,
+        updated_at REAL NOT NULL
+    );
+    CREATE TABLE preset_music (
+        preset TEXT NOT NULL REFERENCES presets(name) ON DELETE CASCADE,
+        music_name TEXT NOT NULL REFERENCES music(name) ON DELETE CASCADE,
+        position INTEGER NOT NULL,
+        PRIMARY KEY (preset, music_name)
+    );
+    CREATE INDEX preset_music_by_position ON preset_music(preset, position);
+    CREATE TABLE settings (
+        key TEXT PRIMARY KEY,
+        value TEXT
+    );
+    """,
+    """
+    ALTER TABLE music ADD COLUMN content_hash TEXT;
+    CREATE INDEX music_by_content_hash ON music(content_hash);
+    """,
+    """
+    ALTER TABLE music ADD COLUMN gain_db REAL;
+    """,
+    """
+    ALTER TABLE music ADD COLUMN hotkey TEXT;
+    """,
+]
+
+
+FULL_TRIM_TOLERANCE = 0.05  # 终点与时长相差不超过该秒数时视为没有裁剪结尾
+
+
+def fit_trim(start_time, end_time, duration, previous_duration=None):
+    """文件内容变化后调整裁剪范围，返回 (起点, 终点)
+
+    原来播放到文件结尾（或旧时长未知且没有终点）时终点改为新时长，否则把终点限制在新时长之内；
+    起点超出新时长时回到开头。
+    """
+    whole_file = end_time is None or (previous_duration is not None
+                                      and end_time >= previous_duration - FULL_TRIM_TOLERANCE)
+    end_time = duration if whole_file else min(end_time, duration)
+    start_time = start_time if start_time < end_time else 0
+    return start_time, end_time
+
+
+class LibraryStore:
+    """基于 SQLite 的音乐库存储：Music 记录、标签和预设，所有写入都在事务中完成"""
+
+    def __init__(self, db_path):
+        self.db_path = db_path
+        self._lock = threading.RLock()  # 后台线程也可能读取预设
+        self.connection = sqlite3.connect(db_path, check_same_thread=False)
+        self.connection.execute("PRAGMA journal_mode=WAL")
+        self.connection.execute("PRAGMA synchronous=NORMAL")
+        self.connection.execute("PRAGMA foreign_keys=ON")
+        self.migrate()
+
+    def migrate(self):
+        """把数据库结构升级到最新版本"""
+        with self._lock:
+            version = self.connection.execute("PRAGMA user_version").fetchone()[0]
+            for index in range(version, len(_MIGRATIONS)):
+                with self.connection:
+                    self.connection.executescript(_MIGRATIONS[index])
+                    self.connection.execute(f"PRAGMA user_version = {index + 1}")
+
+    def close(self):
+        with self._lock:
+            self.connection.close()
+
+    ##################################设置##############################################
+    def get_setting(self, key, default=None):
+        with self._lock:
+            row = self.connection.execute("SELECT value FROM settings WHERE key = ?", (key,)).fetchone()
+        return row[0] if row else default
+
+    def set_setting(self, key, value):
+        with self._lock, self.connection:
+            self.connection.execute(
+                "INSERT INTO settings (key, value) VALUES (?, ?) ON CONFLICT(key) DO UPDATE SET value = excluded.value",
+                (key, value),
+            )
+
+    ##################################音乐记录##############################################
+    def _upsert_music(self, music):
+        self.connection.execute(
+            """INSERT INTO music (name, absolute_path, play_mode, start_time, end_time, content_hash, gain_db, hotkey)
+               VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+               ON CONFLICT(name) DO UPDATE SET absolute_path = excluded.absolute_path, play_mode = excluded.play_mode,
+               start_time = excluded.start_time, end_time = excluded.end_time, content_hash = excluded.content_hash,
+               gain_db = excluded.gain_db, hotkey = excluded.hotkey""",
+            (music.name, music.absolute_path, music.play_mode.value, music.start_time, music.end_time, music.content_hash,
+             music.gain_db, music.hotkey),
+        )
+        self.connection.execute("DELETE FROM music_tags WHERE music_name = ?", (music.name,))
+        self.connection.executemany(
+            "INSERT OR IGNORE INTO music_tags (music_name, tag, position) VALUES (?, ?, ?)",
+            [(music.name, tag, position) for position, tag in enumerate(music.tags)],
+        )
+
+    def _ensure_preset(self, preset):
+        self.connection.execute(
+            "INSERT INTO presets (name, updated_at) VALUES (?, ?) ON CONFLICT(name) DO UPDATE SET updated_at = excluded.updated_at",
+            (preset, time.time()),
+        )
+
+    def _append_to_preset(self, preset, music_name):
+        self.connection.execute(
+            """INSERT OR IGNORE INTO preset_music (preset, music_name, position)
+               SELECT ?, ?, COALESCE(MAX(position) + 1, 0) FROM preset_music WHERE preset = ?""",
+            (preset, music_name, preset),
+        )
+
+    def upsert_music(self, music, preset=None):
+        """新增或更新一条音乐记录；指定 preset 时追加到该预设末尾"""
+        self.upsert_many([music], preset)
+
+    def upsert_many(self, music_files, preset=None):
+        """在一个事务中批量新增或更新音乐记录"""
+        with self._lock, self.connection:
+            if preset is not None:
+                self._ensure_preset(preset)
+            for music in music_files:
+                self._upsert_music(music)
+                if preset is not None:
+                    self._append_to_preset(preset, music.name)
+
+    def add_to_preset(self, preset, music_names):
+        """把已有的音乐记录追加到预设末尾，不改动记录本身"""
+        with self._lock, self.connection:
+            self._ensure_preset(preset)
+            for music_name in music_names:
+                self._append_to_preset(preset, music_name)
+
+    def remove_music(self, music_name, preset=None):
+        """从预设中移除音乐；不再属于任何预设的记录会被删除"""
+        with self._lock, self.connection:
+            if preset is None:
+                self.connection.execute("DELETE FROM music WHERE name = ?", (music_name,))
+                return
+            self.connection.execute("DELETE FROM preset_music WHERE preset = ? AND music_name = ?", (preset, music_name))
+            self.connection.execute(
+                "DELETE FROM music WHERE name = ? AND NOT EXISTS (SELECT 1 FROM preset_music WHERE music_name = ?)",
+                (music_name, music_name),
+            )
+
+    def has_music(self, music_name):
+        with self._lock:
+            return self.connection.execute("SELECT 1 FROM music WHERE name = ?", (music_name,)).fetchone() is not None
+
+    def _find_one(self, where, params):
+        """返回满足条件的第一条音乐记录（含标签），没有时返回 None"""
+        with self._lock:
+            row = self.connection.execute(
+                f"""SELECT name, absolute_path, play_mode, start_time, end_time, content_hash, gain_db, hotkey
+                    FROM music WHERE {where} ORDER BY name LIMIT 1""",
+                params,
+            ).fetchone()
+            if row is None:
+                return None
+            tags = [tag for (tag,) in self.connection.execute(
+                "SELECT tag FROM music_tags WHERE music_name = ? ORDER BY position", (row[0],))]
+        name, absolute_path, play_mode, start_time, end_time, content_hash, gain_db, hotkey = row
+        return Music(name=name, absolute_path=absolute_path, tags=tags, play_mode=PlayMode(play_mode),
+                     start_time=start_time, end_time=end_time, content_hash=content_hash, gain_db=gain_db, hotkey=hotkey)
+
+    def get_music(self, music_name):
+        return self._find_one("name = ?", (music_name,))
+
+    def find_by_content_hash(self, content_hash):
+        """返回内容为 content_hash 的一条音乐记录，没有时返回 None；可在后台线程中调用"""
+        return self._find_one("content_hash = ?", (content_hash,))
+
+    def find_by_paths(self, paths):
+        """返回 {路径: [(名称, 内容哈希)]}，只包含音乐库中有记录的路径"""
+        found = {}
+        paths = list(paths)
+        with self._lock:
+            for start in range(0, len(paths), 500):  # SQLite 对参数个数有上限
+                chunk = paths[start:start + 500]
+                rows = self.connection.execute(
+                    f"SELECT absolute_path, name, content_hash FROM music WHERE absolute_path IN ({','.join('?' * len(chunk))})",
+                    chunk,
+                )
+                for path, name, content_hash in rows:
+                    found.setdefault(path, []).append((name, content_hash))
+        return found
+
+    def relocate(self, old_path, new_path):
+        """文件被移动后更新所有指向 old_path 的记录"""
+        with self._lock, self.connection:
+            self.connection.execute("UPDATE music SET absolute_path = ? WHERE absolute_path = ?", (new_path, old_path))
+
+    def update_content(self, path, content_hash, duration=None, previous_duration=None):
+        """文件内容变化后更新哈希，并清除基于旧内容的响度归一化增益；给出新时长时按 fit_trim 调整裁剪范围"""
+        with self._lock, self.connection:
+            self.connection.execute("UPDATE music SET content_hash = ?, gain_db = NULL WHERE absolute_path = ?",
+                                    (content_hash, path))
+            if duration is None:
+                return
+            rows = self.connection.execute(
+                "SELECT name, start_time, end_time FROM music WHERE absolute_path = ?", (path,)).fetchall()
+            self.connection.executemany(
+                "UPDATE music SET start_time = ?, end_time = ? WHERE name = ?",
+                [fit_trim(start_time, end_time, duration, previous_duration) + (name,)
+                 for name, start_time, end_time in rows],
+            )
+
+    ##################################预设##############################################
+    def list_presets(self):
+        with self._lock:
+            return [row[0] for row in self.connection.execute("SELECT name FROM presets ORDER BY name")]
+
+    def save_preset(self, preset, music_files):
+        """用 music_files 整体替换一个预设的内容"""
+        with self._lock, self.connection:
+            self._ensure_preset(preset)
+            self.connection.execute("DELETE FROM preset_music WHERE preset = ?", (preset,))
+            for position, music in enumerate(music_files):
+                self._upsert_music(music)
+                self.connection.execute(
+                    "INSERT OR IGNORE INTO preset_music (preset, music_name, position) VALUES (?, ?, ?)",
+                    (preset, music.name, position),
+                )
+
+    def count_preset(self, preset):
+        with self._lock:
+            return self.connection.execute("SELECT COUNT(*) FROM preset_music WHERE preset = ?", (preset,)).fetchone()[0]
+
+    def _load_rows(self, preset, limit, offset=0, after_position=None):
+        """读取预设中的一段音乐，返回 (Music 列表, 最后一条的位置)"""
+        position_filter = "" if after_position is None else "AND p.position > ?"
+        params = [preset] + ([] if after_position is None else [after_position]) + [limit, offset]
+        with self._lock:
+            rows = self.connection.execute(
+                f"""SELECT m.name, m.absolute_path, m.play_mode, m.start_time, m.end_time, m.content_hash, m.gain_db,
+                           m.hotkey, p.position
+                    FROM preset_music p JOIN music m ON m.name = p.music_name
+                    WHERE p.preset = ? {position_filter} ORDER BY p.position LIMIT ? OFFSET ?""",
+                params,
+            ).fetchall()
+            tags = {}
+            names = [row[0] for row in rows]
+            for start in range(0, len(names), 500):  # SQLite 对参数个数有上限，整个预设一次读取时分段查询
+                chunk = names[start:start + 500]
+                tag_rows = self.connection.execute(
+                    f"""SELECT music_name, tag FROM music_tags WHERE music_name IN ({",".join("?" * len(chunk))})
+                        ORDER BY music_name, position""",
+                    chunk,
+                )
+                for music_name, tag in tag_rows:
+                    tags.setdefault(music_name, []).append(tag)
+        musics = [
+            Music(name=name, absolute_path=absolute_path, tags=tags.get(name, []), play_mode=PlayMode(play_mode),
+                  start_time=start_time, end_time=end_time, content_hash=content_hash, gain_db=gain_db, hotkey=hotkey)
+            for name, absolute_path, play_mode, start_time, end_time, content_hash, gain_db, hotkey, _ in rows
+        ]
+        return musics, rows[-1][-1] if rows else after_position
+
+    def load_preset(self, preset, limit=-1, offset=0):
+        """按顺序读取预设中的一段音乐，limit 为 -1 时读取到末尾"""
+        return self._load_rows(preset, limit, offset)[0]
+
+    def iter_preset(self, preset, first_batch=100, batch_size=500):
+        """分批读取预设，首批只包含第一屏需要的数据；按位置续读，不随批次增多而变慢"""
+        last_position = None
+        limit = first_batch
+        while True:
+            batch, last_position = self._load_rows(preset, limit, after_position=last_position)
+            if not batch:
+                return
+            yield batch
+            limit = batch_size
+
+    ##################################JSON 迁移##############################################
+    def migrate_json_presets(self, presets_dir):
+        """一次性导入旧版 Music.to_dict 格式的 JSON 预设，预设名为文件名主体"""
+        if self.get_setting("json_presets_migrated"):
+            return []
+        migrated = []
+        for path in sorted(glob.glob(os.path.join(presets_dir, "*.json"))):
+            try:
+                with open(path, "r", encoding="utf-8") as f:
+                    preset_data = json.load(f)
+                music_files = [Music.from_dict(music) for music in preset_data.get("music_files", [])]
+            except (OSError, ValueError, KeyError) as e:
+                print(f"Skipping preset {path}: {e}")
+                continue
+            preset = os.path.splitext(os.path.basename(path))[0]
+            self.save_preset(preset, music_files)
+            migrated.append(preset)
+        self.set_setting("json_presets_migrated", "1")
+        return migrated
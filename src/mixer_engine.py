@@ -0,0 +1,512 @@
+# mixer_engine.py
+
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+import pygame
+
+from src.audio_decode import decode_segment, make_sound, mixer_format
+from src.play_mode import PlayMode
+
+# 淡入曲线：输入 0~1 的进度，返回 0~1 的增益；淡出使用 curve(1 - t)
+FADE_CURVES = {
+    "linear": lambda t: t,
+    "equal_power": lambda t: np.sin(t * (np.pi / 2)),  # 两条曲线的功率和恒定，交叉处没有音量凹陷
+    "s_curve": lambda t: t * t * (3 - 2 * t),
+}
+
+
+class MixStats:
+    """记录每个混音块的耗时，用于评估能承载多少并发音轨"""
+
+    def __init__(self, block_duration):
+        self.block_duration = block_duration  # 每块对应的音频时长（秒），即混音的时间预算
+        self.reset()
+
+    def reset(self):
+        self.blocks = 0
+        self.last_time = 0.0
+        self.total_time = 0.0
+        self.max_time = 0.0
+        self.over_budget = 0  # 超出时间预算的块数
+        self.last_track_count = 0
+        self.max_track_count = 0
+        self.underruns = 0  # 输出声道在下一块送达前就已播完的次数（会听到断音）
+        self.switches = 0
+        self.last_switch_time = 0.0  # 最近一次场景切换到新场景的第一个块送入声道的耗时
+        self.max_switch_time = 0.0
+
+    def record_underrun(self):
+        self.underruns += 1
+
+    def record_switch(self, elapsed):
+        self.switches += 1
+        self.last_switch_time = elapsed
+        self.max_switch_time = max(self.max_switch_time, elapsed)
+
+    def record(self, elapsed, track_count):
+        """记录一个混音块的耗时和参与混音的音轨数"""
+        self.blocks += 1
+        self.last_time = elapsed
+        self.total_time += elapsed
+        self.max_time = max(self.max_time, elapsed)
+        if elapsed > self.block_duration:
+            self.over_budget += 1
+        self.last_track_count = track_count
+        self.max_track_count = max(self.max_track_count, track_count)
+
+    def snapshot(self):
+        """返回以毫秒为单位的统计快照"""
+        average = self.total_time / self.blocks if self.blocks else 0.0
+        return {
+            "blocks": self.blocks,
+            "budget_ms": self.block_duration * 1000,
+            "last_ms": self.last_time * 1000,
+            "average_ms": average * 1000,
+            "max_ms": self.max_time * 1000,
+            "load": average / self.block_duration if self.block_duration else 0.0,
+            "over_budget": self.over_budget,
+            "tracks": self.last_track_count,
+            "max_tracks": self.max_track_count,
+            "underruns": self.underruns,
+            "switches": self.switches,
+            "last_switch_ms": self.last_switch_time * 1000,
+            "max_switch_ms": self.max_switch_time * 1000,
+        }
+
+
+def loop_crossfade_seam(samples, frames, curve="equal_power"):
+    """预先计算循环接缝：把片段末尾 frames 帧淡出并叠加到开头 frames 帧的淡入上
+
+    返回 (循环终点, 接缝)。第二遍起每次回到开头时先播放接缝再接 samples[frames:loop_end]，
+    接缝只在开始循环时计算一次，循环过程中不再分配内存。
+    """
+    frames = min(frames, len(samples) // 2)
+    if frames <= 0:
+        return len(samples), None
+    loop_end = len(samples) - frames
+    t = (np.arange(frames, dtype=np.float32) / frames)[:, np.newaxis]
+    fade = FADE_CURVES[curve]
+    seam = samples[:frames] * fade(t) + samples[loop_end:] * fade(1 - t)
+    return loop_end, np.clip(seam, -32768, 32767).astype(np.int16)
+
+
+def _to_mono(frames):
+    frames = frames.astype(np.float32)
+    return frames.mean(axis=1) if frames.ndim == 2 else frames
+
+
+def snap_loop_end(samples, window):
+    """在末尾 window 帧内寻找与起点电平和斜率最接近的位置作为循环终点，避免接缝处的跳变"""
+    length = len(samples)
+    window = min(window, length // 2)
+    if window < 2:
+        return length
+    # 只转换用到的开头 2 帧和末尾 window + 1 帧，不在界面线程中处理整首（也不会把 memmap 整个读入内存）
+    head = _to_mono(samples[:2])
+    tail = _to_mono(samples[length - window - 1:])
+    start_level = head[0]
+    start_rising = head[1] >= head[0]
+    # 候选终点 e：下一帧回到 head[0]，所以比较 tail 中 e 处的电平与 head[0]（终点本身不播放）
+    levels = tail[1:]
+    rising = tail[1:] >= tail[:-1]
+    cost = np.abs(levels - start_level) + np.where(rising == start_rising, 0, 65536)
+    return length - window + int(np.argmin(cost))
+
+
+class MixerTrack:
+    """混音器中的一条音轨"""
+
+    def __init__(self, music, samples, gain=1.0, delay=0):
+        self.music = music
+        self.samples = samples  # int16 PCM，形状为 (帧数, 声道数)
+        self.position = 0  # 下一次读取的帧下标
+        self.played = 0  # 已输出的总帧数，淡入淡出以此计时（循环时 position 会回绕）
+        self.gain = gain  # 音轨增益
+        self.delay = delay  # 在下一个混音块中延后多少帧开始，用于采样级精确的衔接
+        self.paused = False
+        self.finished = False
+        self.fade_in = None  # (帧数, 曲线)
+        self.fade_out = None  # (起始帧, 帧数, 曲线)，以 played 计
+        self.sequence = None  # 所属的 PlaybackSequence
+        self.handed_off = False  # 是否已经启动了下一首
+        self.loop_end = None  # 循环终点（帧），None 表示不循环
+        self.seam = None  # 预先计算的循环接缝
+        self.loops = 0  # 已完成的循环次数
+
+    def set_loop(self, loop_end, seam=None):
+        """循环播放 samples[:loop_end]；有接缝时第二遍起开头的 len(seam) 帧从接缝读取"""
+        self.loop_end = max(int(loop_end), 1)
+        self.seam = seam
+
+    @property
+    def looping(self):
+        return self.loop_end is not None
+
+    @property
+    def remaining(self):
+        if self.looping:
+            return self.fade_out[0] + self.fade_out[1] - self.played if self.fade_out else sys.maxsize
+        end = len(self.samples)
+        if self.fade_out is not None:
+            end = min(end, self.position + self.fade_out[0] + self.fade_out[1] - self.played)
+        return end - self.position
+
+    def start_fade_in(self, frames, curve="equal_power"):
+        self.fade_in = (frames, FADE_CURVES[curve])
+
+    def start_fade_out(self, start, frames, curve="equal_power"):
+        """从第 start 帧（以 played 计）开始在 frames 帧内淡出，淡出结束后音轨结束"""
+        self.fade_out = (start, frames, FADE_CURVES[curve])
+
+    def _envelope(self, frames):
+        """当前块的增益：没有淡入淡出时为标量，否则为逐帧增益"""
+        start, end = self.played, self.played + frames
+        in_fade_in = self.fade_in is not None and start < self.fade_in[0]
+        in_fade_out = self.fade_out is not None and end > self.fade_out[0]
+        if not in_fade_in and not in_fade_out:
+            return np.float32(self.gain)
+        # 帧下标相对淡化起点用 float64 计算：played 超过 2^24 后 float32 无法区分相邻帧，淡化会变成阶梯
+        offsets = np.arange(frames, dtype=np.float64)
+        envelope = np.full(frames, self.gain, dtype=np.float32)
+        if in_fade_in:
+            length, curve = self.fade_in
+            envelope *= curve(np.clip((offsets + start) / length, 0, 1)).astype(np.float32)
+        if in_fade_out:
+            fade_start, length, curve = self.fade_out
+            envelope *= curve(np.clip(1 - (offsets + (start - fade_start)) / max(length, 1), 0, 1)).astype(np.float32)
+        return envelope[:, np.newaxis]
+
+    def _next_run(self, max_frames):
+        """返回下一段连续可读的 (源数组, 起始帧, 帧数)，循环时在终点回绕到开头"""
+        if not self.looping:
+            return self.samples, self.position, max_frames
+        if self.position >= self.loop_end:
+            self.position = 0
+            self.loops += 1
+        if self.loops > 0 and self.seam is not None and self.position < len(self.seam):
+            return self.seam, self.position, min(max_frames, len(self.seam) - self.position)
+        return self.samples, self.position, min(max_frames, self.loop_end - self.position)
+
+    def mix_into(self, out):
+        """把下一块样本乘以增益后累加到 out 中，返回写入的帧数"""
+        offset = min(self.delay, len(out))
+        self.delay -= offset
+        total = min(len(out) - offset, self.remaining)
+        if total > 0:
+            envelope = self._envelope(total)
+            written = 0
+            while written < total:
+                source, start, frames = self._next_run(total - written)
+                gain = envelope if envelope.ndim == 0 else envelope[written:written + frames]
+                out[offset + written:offset + written + frames] += source[start:start + frames] * gain
+                self.position = start + frames
+                written += frames
+            self.played += total
+        if self.remaining <= 0:
+            self.finished = True
+        return total
+
+
+class PlaybackSequence:
+    """按顺序播放的音乐列表：提前在后台解码下一首，由混音线程在采样级精确的位置接上"""
+
+    def __init__(self, musics, loader, executor, crossfade_seconds=3.0, curve="equal_power"):
+        self.musics = musics
+        self.index = 0
+        self.loader = loader  # Music -> PCM
+        self.executor = executor
+        self.crossfade_seconds = crossfade_seconds
+        self.curve = curve
+        self._next = None  # 下一首的 (Music, Future)
+
+    def prefetch(self):
+        """在后台解码下一首"""
+        if self.index + 1 < len(self.musics):
+            music = self.musics[self.index + 1]
+            self._next = (music, self.executor.submit(self.loader, music))
+        else:
+            self._next = None
+
+    def take_next(self):
+        """下一首已解码时返回 (Music, PCM) 并前进，否则返回 None"""
+        if self._next is None or not self._next[1].done():
+            return None
+        music, future = self._next
+        self.index += 1
+        try:
+            samples = future.result()
+        except Exception as e:
+            print(f"Failed to decode {music.name}: {e}")
+            samples = None
+        self.prefetch()
+        if samples is None:
+            return self.take_next()  # 跳过无法解码的音乐
+        return music, samples
+
+    @property
+    def has_next(self):
+        return self._next is not None
+
+
+class MixerEngine:
+    """把所有活动音轨按固定大小的块求和后输出到一个保留的 pygame 声道"""
+
+    def __init__(self, block_size=1024, channel_id=0, pcm_cache=None):
+        self.frequency, self.channels = mixer_format()
+        self.pcm_cache = pcm_cache  # 可选的 PCMCache，重复播放时直接从内存读取
+        self.block_size = block_size  # 每个混音块的帧数
+        self.block_duration = block_size / self.frequency
+        self.master_volume = 1.0
+        self.paused = False
+        self.crossfade_seconds = 3.0  # CROSSFADE 模式的淡化时长
+        self.fade_curve = "equal_power"
+        self.loop_seam = "crossfade"  # LOOP 接缝处理："crossfade"、"zero_crossing" 或 "none"
+        self.loop_seam_seconds = 0.01
+        self._prefetcher = ThreadPoolExecutor(max_workers=1, thread_name_prefix="MixerPrefetch")
+
+        self.tracks = {}  # 音乐名称 -> MixerTrack
+        self.tap = None  # 可选的 RingBuffer，每个混音块写入一份供可视化读取
+        self.stats = MixStats(self.block_duration)
+        self._latency_waiters = []  # (开始时刻, 回调)，由之后的第一个混音块取走
+        self._block_waiters = []  # 最近混合的块送入声道后要通知的回调
+        self._lock = threading.Lock()
+        self._stop_event = threading.Event()
+        self._thread = None
+
+        # 保留一个声道专供混音输出，避免被其他 Sound.play 抢占
+        pygame.mixer.set_reserved(channel_id + 1)
+        self.channel = pygame.mixer.Channel(channel_id)
+
+    ##################################音轨控制##############################################
+    def load(self, music):
+        """解码音乐片段（有 PCM 缓存时从缓存读取）"""
+        if self.pcm_cache is not None:
+            return self.pcm_cache.get(music)
+        return decode_segment(music.absolute_path, music.start_time, music.end_time)
+
+    def make_track(self, music, samples, gain=1.0, delay=0):
+        """创建音轨，LOOP 模式的音乐在这里准备好循环接缝"""
+        track = MixerTrack(music, samples, gain * music.normalization_gain, delay)
+        if music.play_mode == PlayMode.LOOP and len(samples) > 0:
+            seam_frames = int(self.loop_seam_seconds * self.frequency)
+            if self.loop_seam == "crossfade":
+                track.set_loop(*loop_crossfade_seam(samples, seam_frames, self.fade_curve))
+            elif self.loop_seam == "zero_crossing":
+                track.set_loop(snap_loop_end(samples, seam_frames))
+            else:
+                track.set_loop(len(samples))
+        return track
+
+    def play(self, music, gain=1.0):
+        """解码音乐片段并加入混音，同名音轨会从头开始；gain 会乘上音乐的响度归一化增益"""
+        track = self.make_track(music, self.load(music), gain)
+        with self._lock:
+            self.tracks[music.name] = track
+        return track
+
+    def play_sequence(self, musics, start_index=0):
+        """从 musics[start_index] 开始顺序播放；CROSSFADE 的音乐与下一首交叉淡化，其余无缝衔接"""
+        musics = list(musics)[start_index:]
+        if not musics:
+            return None
+        sequence = PlaybackSequence(musics, self.load, self._prefetcher, self.crossfade_seconds, self.fade_curve)
+        track = self.make_track(musics[0], self.load(musics[0]))
+        track.sequence = sequence
+        sequence.prefetch()
+        with self._lock:
+            self.tracks[musics[0].name] = track
+        return track
+
+    def switch_scene(self, tracks, crossfade_seconds=0.0, curve=None):
+        """原子地切换到新场景的音轨：其余音轨淡出（crossfade_seconds 为 0 时立即停止），新音轨淡入
+
+        两个场景都有的音乐继续播放，不会从头开始。tracks 应已解码（见 ScenePreparer），这里只替换音轨表。
+        """
+        curve = curve or self.fade_curve
+        frames = int(crossfade_seconds * self.frequency)
+        started = time.perf_counter()
+        incoming = {track.music.name: track for track in tracks}
+        with self._lock:
+            for name, track in list(self.tracks.items()):
+                if name in incoming and not track.paused:
+                    del incoming[name]
+                elif frames > 0 and not track.paused:
+                    track.sequence = None  # 淡出的列表音轨不再接下一首
+                    track.start_fade_out(track.played, frames, curve)
+                else:
+                    del self.tracks[name]
+            for name, track in incoming.items():
+                if frames > 0:
+                    track.start_fade_in(frames, curve)
+                self.tracks[name] = track
+            # 只有新加入的音轨才计算切换延迟
+            if incoming:
+                self._latency_waiters.append((started, self.stats.record_switch))
+
+    def notify_when_audible(self, started, callback):
+        """下一个混音块送入输出声道后，以从 started 起的耗时（秒）调用 callback（在混音线程中调用）"""
+        with self._lock:
+            self._latency_waiters.append((started, callback))
+
+    def stop(self, music_name):
+        """停止并移除一条音轨"""
+        with self._lock:
+            self.tracks.pop(music_name, None)
+
+    def stop_all(self):
+        with self._lock:
+            self.tracks.clear()
+
+    def pause(self, music_name):
+        with self._lock:
+            track = self.tracks.get(music_name)
+            if track:
+                track.paused = True
+
+    def resume(self, music_name):
+        with self._lock:
+            track = self.tracks.get(music_name)
+            if track:
+                track.paused = False
+
+    def set_gain(self, music_name, gain):
+        """设置单条音轨的增益"""
+        with self._lock:
+            track = self.tracks.get(music_name)
+            if track:
+                track.gain = gain
+
+    def is_playing(self, music_name):
+        with self._lock:
+            return music_name in self.tracks
+
+    def track_names(self):
+        """正在混音的音乐名称（不含正在淡出的音轨）"""
+        with self._lock:
+            return [name for name, track in self.tracks.items() if track.fade_out is None]
+
+    def has_tracks(self):
+        with self._lock:
+            return bool(self.tracks)
+
+    ##################################全局控制##############################################
+    def pause_all(self):
+        """暂停整个输出流，音轨保持当前位置"""
+        self.paused = True
+        self.channel.pause()
+
+    def resume_all(self):
+        self.paused = False
+        self.channel.unpause()
+
+    def set_master_volume(self, volume):
+        """设置总音量（0~1）"""
+        self.master_volume = min(max(volume, 0.0), 1.0)
+
+    def set_crossfade(self, seconds=None, curve=None):
+        """设置之后开始的列表播放使用的淡化时长和曲线"""
+        if seconds is not None:
+            self.crossfade_seconds = max(float(seconds), 0.0)
+        if curve is not None:
+            if curve not in FADE_CURVES:
+                raise ValueError(f"Unknown fade curve: {curve}")
+            self.fade_curve = curve
+
+    ##################################混音##############################################
+    def _advance_sequence(self, track):
+        """音轨即将在本块内结束（或进入交叉淡化）时启动下一首，返回新音轨"""
+        sequence = track.sequence
+        if sequence is None or track.handed_off or not sequence.has_next or track.looping:
+            return None  # 循环的音轨不会结束，列表停在这里
+        overlap = 0
+        if track.music.play_mode == PlayMode.CROSSFADE:
+            overlap = min(int(sequence.crossfade_seconds * self.frequency), track.remaining)
+        start = track.remaining - overlap  # 下一首在本音轨之后多少帧开始
+        if start >= self.block_size:
+            return None
+        taken = sequence.take_next()
+        if taken is None:
+            return None  # 下一首还没解码完，下一个块再试
+        music, samples = taken
+        overlap = min(overlap, len(samples))
+        start = track.remaining - overlap
+        following = self.make_track(music, samples, delay=track.delay + max(start, 0))
+        following.sequence = sequence
+        if overlap > 0:
+            track.start_fade_out(track.played + start, overlap, sequence.curve)
+            following.start_fade_in(overlap, sequence.curve)
+        track.handed_off = True
+        track.sequence = None
+        self.tracks[music.name] = following
+        return following
+
+    def mix_block(self):
+        """混合一个块并返回形状为 (帧数, 声道数) 的 int16 数组"""
+        started = time.perf_counter()
+        mix = np.zeros((self.block_size, self.channels), dtype=np.float32)
+        with self._lock:
+            self._block_waiters, self._latency_waiters = self._latency_waiters, []
+            active = [track for track in self.tracks.values() if not track.paused]
+            for track in list(active):
+                following = self._advance_sequence(track)
+                if following is not None:
+                    active.append(following)
+            for track in active:
+                track.mix_into(mix)
+            # 下一首还没解码完的列表音轨暂时保留，等解码完成后再衔接
+            for name in [name for name, track in self.tracks.items()
+                         if track.finished and (track.sequence is None or not track.sequence.has_next)]:
+                del self.tracks[name]
+
+        mix *= self.master_volume
+        np.clip(mix, -32768, 32767, out=mix)
+        block = mix.astype(np.int16)
+        if self.tap is not None:
+            self.tap.write(mix)  # 只做一次复制，分析和绘制都在界面线程中进行
+        self.stats.record(time.perf_counter() - started, len(active))
+        return block
+
+    def _run(self):
+        """混音线程：输出声道的队列空出时补充下一个块"""
+        streaming = False  # 是否处于连续输出中；此时声道空闲说明下一块没有及时送达
+        while not self._stop_event.is_set():
+            if self.paused or not self.has_tracks():
+                streaming = False
+                time.sleep(self.block_duration / 4)
+                continue
+            if self.channel.get_queue() is not None:
+                time.sleep(self.block_duration / 4)
+                continue
+            sound = make_sound(self.mix_block())
+            if self.channel.get_busy():
+                self.channel.queue(sound)
+            else:
+                if streaming:
+                    self.stats.record_underrun()
+                self.channel.play(sound)
+            streaming = True
+            if self._block_waiters:
+                now = time.perf_counter()
+                for started, callback in self._block_waiters:
+                    callback(now - started)
+                self._block_waiters = []
+
+    def start(self):
+        """启动混音线程"""
+        if self._thread is None:
+            self._stop_event.clear()
+            self._thread = threading.Thread(target=self._run, name="MixerEngine", daemon=True)
+            self._thread.start()
+
+    def shutdown(self):
+        """停止混音线程并清空输出"""
+        self._stop_event.set()
+        if self._thread is not None:
+            self._thread.join(timeout=1)
+            self._thread = None
+        self._prefetcher.shutdown(wait=False, cancel_futures=True)
+        self.channel.stop()
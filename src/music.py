@@ -1,59 +1,233 @@
 # music.py
 
+from collections import OrderedDict
+
+from src import tag_query
 from src.play_mode import PlayMode
-from src.ScrollableMusicListFrame import ScrollableMusicListFrame
+from src.search_index import SearchIndex
 
 class MusicManager:
-    """管理音乐文件的增删改和同步显示"""
+    """管理音乐文件的增删改，并维护按名称、标签和播放方式的位集索引
+
+    不依赖界面：显示组件（如 ScrollableMusicListFrame）作为观察者注册，观察者需实现
+    on_music_added(music)、on_music_removed(name)、on_music_updated(music)、on_replaced(music_files) 和 on_cleared()。
+    """
+
+    def __init__(self, file_list_frame=None, query_cache_size=64):
+        self._music_files = {}  # 名称 -> Music，保持插入顺序
+        self._order = {}  # 名称 -> 插入序号，用于让查询结果保持列表顺序
+        self._next_order = 0
+        self._slots = {}  # 名称 -> 位下标
+        self._slot_names = []  # 位下标 -> 名称，空闲位为 None
+        self._free_slots = []
+        self._all_bits = 0  # 所有音乐的位掩码
+        self._tag_bits = {}  # 标签 -> 含有该标签的音乐位掩码
+        self._play_mode_bits = {}  # PlayMode -> 该播放方式的音乐位掩码
+        self._version = 0  # 每次修改递增，使查询缓存失效
+        self._query_cache = OrderedDict()  # 查询字符串 -> (版本, 位掩码)
+        self._query_cache_size = query_cache_size
+        self.search_index = SearchIndex()  # 名称和标签的子串搜索索引
+        self._observers = []
+        if file_list_frame is not None:
+            self.add_observer(file_list_frame)
+
+    def add_observer(self, observer):
+        self._observers.append(observer)
+
+    def remove_observer(self, observer):
+        self._observers.remove(observer)
+
+    ##################################位集索引##############################################
+    def _allocate_slot(self, name):
+        slot = self._free_slots.pop() if self._free_slots else len(self._slot_names)
+        if slot == len(self._slot_names):
+            self._slot_names.append(name)
+        else:
+            self._slot_names[slot] = name
+        self._slots[name] = slot
+        return slot
 
-    def __init__(self, file_list_frame:ScrollableMusicListFrame):
-        self._music_files = []  # 内部存储的音乐文件列表
-        self.file_list_frame = file_list_frame  # 与显示组件关联
+    def _release_slot(self, name):
+        slot = self._slots.pop(name)
+        self._slot_names[slot] = None
+        self._free_slots.append(slot)
 
+    def _index(self, music):
+        bit = 1 << self._slots[music.name]
+        for tag in music.tags:
+            self._tag_bits[tag] = self._tag_bits.get(tag, 0) | bit
+        self._play_mode_bits[music.play_mode] = self._play_mode_bits.get(music.play_mode, 0) | bit
+        self.search_index.add(music.name, music.tags)
+        self._version += 1
+
+    def _unindex(self, music):
+        bit = 1 << self._slots[music.name]
+        for tag in music.tags:
+            bits = self._tag_bits.get(tag, 0) & ~bit
+            if bits:
+                self._tag_bits[tag] = bits
+            else:
+                self._tag_bits.pop(tag, None)
+        self._play_mode_bits[music.play_mode] = self._play_mode_bits.get(music.play_mode, 0) & ~bit
+        self.search_index.remove(music.name)
+        self._version += 1
+
+    def _music_from_bits(self, bits):
+        """按插入顺序返回位掩码中的音乐"""
+        names = []
+        binary = bin(bits)[:1:-1]  # 低位在前
+        slot = binary.find("1")
+        while slot >= 0:
+            names.append(self._slot_names[slot])
+            slot = binary.find("1", slot + 1)
+        return [self._music_files[name] for name in sorted(names, key=self._order.__getitem__)]
+
+    ##################################增删改##############################################
     def add_music(self, music):
-        """添加一个音乐文件"""
-        self._music_files.append(music)
-        self.file_list_frame.add_item(music)
+        """添加一个音乐文件，同名文件会被替换"""
+        if music.name in self._music_files:
+            self.remove_music(music.name)
+        self._music_files[music.name] = music
+        self._order[music.name] = self._next_order
+        self._next_order += 1
+        self._all_bits |= 1 << self._allocate_slot(music.name)
+        self._index(music)
+        for observer in self._observers:
+            observer.on_music_added(music)
 
     def remove_music(self, music_name):
         """移除一个音乐文件"""
-        self._music_files = [music for music in self._music_files if music.name != music_name]
-        # 查找对应的显示项并移除
-        item_to_remove = next((item for item in self.file_list_frame.items if item["name"] == music_name), None)
-        if item_to_remove:
-            self.file_list_frame.remove_item(item_to_remove)
-
-    def update_music(self, music_name, new_tags=None, new_play_mode=None):
-        """更新一个音乐文件的属性"""
-        for music in self._music_files:
-            if music.name == music_name:
-                if new_tags:
-                    music.tags = new_tags
-                if new_play_mode:
-                    music.play_mode = new_play_mode
-                # 同步更新显示内容
-                self.file_list_frame.update_item(music)
-                break
+        music = self._music_files.pop(music_name, None)
+        if music is None:
+            return
+        del self._order[music_name]
+        self._unindex(music)
+        self._all_bits &= ~(1 << self._slots[music_name])
+        self._release_slot(music_name)
+        for observer in self._observers:
+            observer.on_music_removed(music_name)
+
+    def update_music(self, music_name, new_tags=None, new_play_mode=None, new_hotkey=None):
+        """更新一个音乐文件的属性；new_hotkey 为空字符串时解除热键"""
+        music = self._music_files.get(music_name)
+        if music is None:
+            return
+        self._unindex(music)
+        if new_tags:
+            music.tags = new_tags
+        if new_play_mode:
+            music.play_mode = new_play_mode
+        if new_hotkey is not None:
+            music.hotkey = new_hotkey or None
+        self._index(music)
+        # 同步更新显示内容
+        for observer in self._observers:
+            observer.on_music_updated(music)
+
+    ##################################查询##############################################
+    def get_music(self, music_name):
+        """按名称获取音乐文件，不存在时返回 None"""
+        return self._music_files.get(music_name)
 
     def get_all_music(self):
         """获取所有音乐文件"""
-        return self._music_files
+        return list(self._music_files.values())
+
+    def get_tags(self):
+        """获取当前使用中的所有标签"""
+        return list(self._tag_bits)
+
+    def find_by_tag(self, tag):
+        return self._music_from_bits(self._tag_bits.get(tag, 0))
+
+    def find_by_play_mode(self, play_mode):
+        return self._music_from_bits(self._play_mode_bits.get(play_mode, 0))
+
+    def query_bits(self, query):
+        """计算布尔标签查询（如 battle AND (forest OR cave) NOT vocal）的位掩码，结果按查询字符串缓存"""
+        key = " ".join(query.split())
+        cached = self._query_cache.get(key)
+        if cached is not None and cached[0] == self._version:
+            self._query_cache.move_to_end(key)
+            return cached[1]
+        bits = tag_query.evaluate(tag_query.parse(key), lambda tag: self._tag_bits.get(tag, 0), self._all_bits)
+        self._query_cache[key] = (self._version, bits)
+        self._query_cache.move_to_end(key)
+        if len(self._query_cache) > self._query_cache_size:
+            self._query_cache.popitem(last=False)
+        return bits
+
+    def search(self, text):
+        """返回名称或标签包含 text 的音乐名称集合，text 为空时返回 None"""
+        return self.search_index.search(text)
+
+    def filter(self, query=None, play_mode=None, search=None):
+        """返回满足标签查询、播放方式为 play_mode 且名称或标签包含 search 的音乐，条件为空表示不限制"""
+        names = self.search(search) if search else None
+        if not query and play_mode is None:
+            if names is None:
+                return self.get_all_music()
+            return [self._music_files[name] for name in sorted(names, key=self._order.__getitem__)]
+        bits = self.query_bits(query) if query else self._all_bits
+        if play_mode is not None:
+            bits &= self._play_mode_bits.get(play_mode, 0)
+        results = self._music_from_bits(bits)
+        return results if names is None else [music for music in results if music.name in names]
+
+    def _reset(self):
+        self._music_files.clear()
+        self._order.clear()
+        self._slots.clear()
+        self._slot_names.clear()
+        self._free_slots.clear()
+        self._all_bits = 0
+        self._tag_bits.clear()
+        self._play_mode_bits.clear()
+        self._version += 1
+        self._query_cache.clear()
+        self.search_index.clear()
+
+    def replace_all(self, music_files):
+        """用 music_files 整体替换音乐列表（加载预设或切换场景），同名文件只保留最后一个
+
+        索引只重建一次，观察者收到一次 on_replaced，由观察者按名称对比保留没有变化的行。
+        """
+        music_files = list({music.name: music for music in music_files}.values())
+        self._reset()
+        for music in music_files:
+            self._music_files[music.name] = music
+            self._order[music.name] = self._next_order
+            self._next_order += 1
+            self._all_bits |= 1 << self._allocate_slot(music.name)
+            self._index(music)
+        for observer in self._observers:
+            observer.on_replaced(music_files)
 
     def clear(self):
         """清空所有音乐文件"""
-        self._music_files.clear()
-        self.file_list_frame.set_items([])
+        self._reset()
+        for observer in self._observers:
+            observer.on_cleared()
 
 
 
 class Music:
-    def __init__(self, name, absolute_path, tags=None, play_mode=PlayMode.ONCE, start_time=0, end_time=None):
+    def __init__(self, name, absolute_path, tags=None, play_mode=PlayMode.ONCE, start_time=0, end_time=None,
+                 content_hash=None, gain_db=None, hotkey=None):
         self.name = name  # 音乐名称
         self.absolute_path = absolute_path  # 音乐的绝对路径
         self.tags = tags if tags else []  # 音乐标签列表
         self.play_mode = play_mode  # 播放方式
         self.start_time = start_time  # 播放片段的起始时间（秒）
         self.end_time = end_time  # 播放片段的结束时间（秒）
+        self.content_hash = content_hash  # 文件内容的 SHA-256，用于去重和文件移动后重新定位
+        self.gain_db = gain_db  # 响度归一化增益（dB），分析完成前为 None
+        self.hotkey = hotkey  # 音效板热键（Tk keysym），None 表示未绑定
+
+    @property
+    def normalization_gain(self):
+        """播放时乘到每个样本上的线性增益"""
+        return 1.0 if self.gain_db is None else 10 ** (self.gain_db / 20)
 
     def create_item(self):
         # 返回一个可以插入 `ScrollableMusicListFrame` 的条目信息
@@ -75,6 +249,9 @@ class Music:
             "play_mode": self.play_mode.value,  # 假设 play_mode 是 PlayMode 枚举
             "start_time": self.start_time,
             "end_time": self.end_time,
+            "content_hash": self.content_hash,
+            "gain_db": self.gain_db,
+            "hotkey": self.hotkey,
         }
 
     @classmethod
@@ -87,4 +264,7 @@ class Music:
             play_mode=PlayMode(data["play_mode"]),  # 假设 PlayMode 枚举支持从字符串创建
             start_time=data["start_time"],
             end_time=data["end_time"],
+            content_hash=data.get("content_hash"),  # 旧版预设中没有该字段
+            gain_db=data.get("gain_db"),
+            hotkey=data.get("hotkey"),
         )
@@ -1,41 +1,71 @@
 # music_range_slider.py
 
+import threading
 import customtkinter
 import pygame
+from src.audio_decode import decode_file, make_sound, mixer_format, segment_bounds
+from src.audio_probe import probe_duration
+from src.waveform import load_or_build
+
+PREVIEW_SECONDS = 5  # 拖动滑块后试听的最长时长
 
 class MusicRangeSlider(customtkinter.CTkFrame):
-    def __init__(self, master, audio_path, on_update_callback=None, **kwargs):
+    def __init__(self, master, audio_path, on_update_callback=None, duration_cache=None, peaks_dir=None, **kwargs):
         super().__init__(master, **kwargs)
         
         # 初始化 Pygame 音乐播放器
         pygame.mixer.init()
         self.audio_path = audio_path
         self.on_update_callback = on_update_callback
+        self.preview_channel = None  # 试听使用的声道
+        self.preview_start = None  # 等待解码完成后试听的起点（秒）
+        self.decode_thread = None
         
-        # 加载音乐并获取总长度
-        pygame.mixer.music.load(self.audio_path)
-        self.total_duration = pygame.mixer.Sound(self.audio_path).get_length()
+        # 只读取文件头获取总长度，整首解码在后台线程中进行（构建波形或第一次试听时）
+        self.frequency, _ = mixer_format()
+        if duration_cache is not None:
+            self.total_duration = duration_cache.get_duration(self.audio_path)
+        else:
+            self.total_duration = probe_duration(self.audio_path)
 
         # 使用 grid 布局放置标签和滑块
         self.grid_columnconfigure(1, weight=1)  # 使滑块扩展以占满可用空间
 
+        # 初始化开始和结束时间
+        self.start_time = 0
+        self.end_time = self.total_duration
+
+        # 波形概览：峰值金字塔在后台线程构建，完成前显示空白
+        self.peaks_dir = peaks_dir
+        self.pyramid = None
+        self._samples = None  # 只在内存中解码的源文件 PCM，窗口关闭后随控件释放
+        self._decode_lock = threading.Lock()
+        self.view_start = 0  # 当前缩放视图的起止时间（秒）
+        self.view_end = self.total_duration
+        self.waveform_canvas = customtkinter.CTkCanvas(self, height=80, highlightthickness=0, bg="#2b2b2b")
+        self.waveform_canvas.grid(row=0, column=1, pady=(10, 0), sticky="ew")
+        self.waveform_canvas.bind("<Configure>", lambda e: self.draw_waveform())
+        self.waveform_canvas.bind("<MouseWheel>", self.on_waveform_zoom)
+        self.waveform_canvas.bind("<Button-4>", lambda e: self.zoom_waveform(e.x, 0.8))
+        self.waveform_canvas.bind("<Button-5>", lambda e: self.zoom_waveform(e.x, 1.25))
+        if self.peaks_dir:
+            self.pyramid_thread = threading.Thread(target=self.build_pyramid, daemon=True)
+            self.pyramid_thread.start()
+            self.after(100, self.poll_pyramid)
+
         # 创建开始标签和滑块
         self.start_label = customtkinter.CTkLabel(self, text="Start")
-        self.start_label.grid(row=0, column=0, padx=5, pady=10, sticky="w")
+        self.start_label.grid(row=1, column=0, padx=5, pady=10, sticky="w")
         self.start_slider = customtkinter.CTkSlider(self, from_=0, to=self.total_duration, command=self.on_start_slider_change)
         self.start_slider.set(0)
-        self.start_slider.grid(row=0, column=1, pady=10, sticky="ew")
+        self.start_slider.grid(row=1, column=1, pady=10, sticky="ew")
 
         # 创建结束标签和滑块
         self.end_label = customtkinter.CTkLabel(self, text="End")
-        self.end_label.grid(row=1, column=0, padx=5, pady=10, sticky="w")
+        self.end_label.grid(row=2, column=0, padx=5, pady=10, sticky="w")
         self.end_slider = customtkinter.CTkSlider(self, from_=0, to=self.total_duration, command=self.on_end_slider_change)
         self.end_slider.set(self.total_duration)
-        self.end_slider.grid(row=1, column=1, pady=10, sticky="ew")
-
-        # 初始化开始和结束时间
-        self.start_time = 0
-        self.end_time = self.total_duration
+        self.end_slider.grid(row=2, column=1, pady=10, sticky="ew")
 
         # 创建 tooltip 标签，但默认隐藏
         self.tooltip = customtkinter.CTkLabel(self, text="", fg_color="gray", text_color="white", corner_radius=5)
@@ -50,6 +80,62 @@ class MusicRangeSlider(customtkinter.CTkFrame):
         # 标记拖动状态
         self.is_dragging = False
 
+    def load_samples(self):
+        """后台线程：把尚未导入的源文件解码到内存；不经过 PCM 缓存，取消导入时不会在磁盘缓存中留下条目"""
+        with self._decode_lock:
+            if self._samples is None:
+                self._samples = decode_file(self.audio_path)
+            return self._samples
+
+    def build_pyramid(self):
+        """后台线程：读取或构建波形峰值旁路文件"""
+        try:
+            self.pyramid = load_or_build(self.audio_path, self.peaks_dir, self.frequency, self.load_samples)
+        except (OSError, ValueError, pygame.error) as e:
+            print(f"Waveform unavailable for {self.audio_path}: {e}")
+
+    def poll_pyramid(self):
+        """在 Tk 线程中等待金字塔构建完成后绘制；窗口已关闭时停止轮询"""
+        if not self.winfo_exists():
+            return
+        if self.pyramid_thread.is_alive():
+            self.after(100, self.poll_pyramid)
+        else:
+            self.draw_waveform()
+
+    def draw_waveform(self):
+        """按画布宽度绘制当前视图的波形，并把起止范围之外的部分调暗"""
+        canvas = self.waveform_canvas
+        canvas.delete("all")
+        width, height = canvas.winfo_width(), canvas.winfo_height()
+        if self.pyramid is None or width <= 1:
+            return
+
+        view_length = max(self.view_end - self.view_start, 1e-6)
+        mins, maxs = self.pyramid.peaks(self.view_start, self.view_end, width)
+        middle = height / 2
+        for x, (low, high) in enumerate(zip(mins, maxs)):
+            canvas.create_line(x, middle - high * middle, x, middle - low * middle + 1, fill="#3b8ed0")
+
+        start_x = (self.start_time - self.view_start) / view_length * width
+        end_x = (self.end_time - self.view_start) / view_length * width
+        if start_x > 0:
+            canvas.create_rectangle(0, 0, start_x, height, fill="black", stipple="gray50", width=0)
+        if end_x < width:
+            canvas.create_rectangle(end_x, 0, width, height, fill="black", stipple="gray50", width=0)
+
+    def on_waveform_zoom(self, event):
+        self.zoom_waveform(event.x, 0.8 if event.delta > 0 else 1.25)
+
+    def zoom_waveform(self, x, factor):
+        """以鼠标所在位置为中心缩放波形视图"""
+        width = max(self.waveform_canvas.winfo_width(), 1)
+        anchor = self.view_start + (self.view_end - self.view_start) * x / width
+        length = min(max((self.view_end - self.view_start) * factor, 0.05), self.total_duration)
+        self.view_start = min(max(anchor - length * x / width, 0), self.total_duration - length)
+        self.view_end = self.view_start + length
+        self.draw_waveform()
+
     def show_tooltip(self, event, text):
         """显示悬浮提示文本"""
         self.tooltip.configure(text=text)
@@ -62,6 +148,7 @@ class MusicRangeSlider(customtkinter.CTkFrame):
     def on_start_slider_change(self, value):
         self.start_time = value
         self.is_dragging = True  # 标记为拖动中
+        self.draw_waveform()
         if self.on_update_callback:
             self.on_update_callback(self.start_time, self.end_time)
         self.after(100, self.check_drag_stop, 'start')
@@ -69,6 +156,7 @@ class MusicRangeSlider(customtkinter.CTkFrame):
     def on_end_slider_change(self, value):
         self.end_time = value
         self.is_dragging = True  # 标记为拖动中
+        self.draw_waveform()
         if self.on_update_callback:
             self.on_update_callback(self.start_time, self.end_time)
         self.after(100, self.check_drag_stop, 'end')
@@ -82,11 +170,49 @@ class MusicRangeSlider(customtkinter.CTkFrame):
                 self.play_segment(self.end_time - 1)
 
     def play_segment(self, start_time):
-        pygame.mixer.music.play(start=start_time)
-        pygame.mixer.music.set_endevent(pygame.constants.USEREVENT)
+        """试听 start_time 起最多 PREVIEW_SECONDS 秒；源文件在后台线程中解码，完成后才开始播放"""
+        self.stop_music()
+        self.preview_start = max(start_time, 0)
+        if self._samples is None:
+            if self.decode_thread is None or not self.decode_thread.is_alive():
+                self.decode_thread = threading.Thread(target=self.decode_for_preview, daemon=True)
+                self.decode_thread.start()
+            self.after(50, self.poll_preview)
+        else:
+            self.start_preview()
+
+    def decode_for_preview(self):
+        try:
+            self.load_samples()
+        except (OSError, ValueError, pygame.error) as e:
+            print(f"Preview unavailable for {self.audio_path}: {e}")
+
+    def poll_preview(self):
+        """在 Tk 线程中等待解码完成；窗口已关闭、试听已取消或解码失败时停止轮询"""
+        if not self.winfo_exists() or self.preview_start is None:
+            return
+        if self._samples is not None:
+            self.start_preview()
+        elif self.decode_thread.is_alive():
+            self.after(50, self.poll_preview)
+
+    def start_preview(self):
+        """只把试听窗口（不超过结束位置）复制为 Sound，避免每次拖动都复制整首的剩余部分"""
+        samples = self._samples
+        start, end = segment_bounds(len(samples), self.frequency, self.preview_start,
+                                    self.preview_start + PREVIEW_SECONDS)
+        if self.preview_start < self.end_time:
+            end = min(end, segment_bounds(len(samples), self.frequency, 0, self.end_time)[1])
+        self.preview_start = None
+        if end <= start:
+            return
+        # Sound.play 只使用未保留的声道，不会占用混音器的输出声道；没有空闲声道时返回 None
+        self.preview_channel = make_sound(samples[start:end]).play()
 
     def stop_music(self):
-        pygame.mixer.music.stop()
+        self.preview_start = None
+        if self.preview_channel is not None:
+            self.preview_channel.stop()
 
     def get_start_time(self):
         return self.start_time
@@ -0,0 +1,115 @@
+# pcm_cache.py
+
+import threading
+from collections import OrderedDict
+
+import numpy as np
+
+from src.audio_decode import decode_segment, mixer_format, segment_bounds
+
+
+class PCMCache:
+    """已解码 PCM 片段的内存缓存，超出字节预算时淘汰最久未使用的条目
+
+    设置了 disk（DecodedStore）时片段是磁盘缓存 memmap 上的视图，不占用 Python 内存，
+    只计入映射字节数，按条目数淘汰。
+    """
+
+    def __init__(self, max_bytes=512 * 1024 * 1024, disk=None, max_entries=4096):
+        self.max_bytes = max_bytes  # 内存预算（字节）
+        self.max_entries = max_entries
+        self.disk = disk  # 可选的 DecodedStore
+        self.current_bytes = 0
+        self.mapped_bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._entries = OrderedDict()  # (路径, 起始, 结束) -> 样本数组
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def make_key(path, start_time=0, end_time=None):
+        return (path, float(start_time or 0), None if end_time is None else float(end_time))
+
+    def get(self, music):
+        """获取 Music 片段（start_time..end_time）的 PCM"""
+        return self.get_segment(music.absolute_path, music.start_time, music.end_time, music.content_hash)
+
+    def get_segment(self, path, start_time=0, end_time=None, content_hash=None):
+        """获取指定片段的 PCM，未命中时从磁盘缓存映射或解码，并放入缓存"""
+        key = self.make_key(path, start_time, end_time)
+        with self._lock:
+            samples = self._entries.get(key)
+            if samples is not None:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return samples
+            self.misses += 1
+
+        # 在锁外解码，避免长时间解码阻塞混音线程的命中查询
+        if self.disk is not None:
+            samples = self.disk.get(path, content_hash)
+            frequency, _ = mixer_format()
+            start, end = segment_bounds(len(samples), frequency, start_time, end_time)
+            samples = samples[start:end]  # memmap 的切片仍是视图，不复制
+        else:
+            samples = decode_segment(path, start_time, end_time)
+        self.put(key, samples)
+        return samples
+
+    def _account(self, samples, sign):
+        if isinstance(samples, np.memmap):
+            self.mapped_bytes += sign * samples.nbytes
+        else:
+            self.current_bytes += sign * samples.nbytes
+
+    def put(self, key, samples):
+        """放入缓存并按预算淘汰旧条目；超过整个预算的片段不缓存"""
+        if not isinstance(samples, np.memmap) and samples.nbytes > self.max_bytes:
+            return
+        with self._lock:
+            old = self._entries.pop(key, None)
+            if old is not None:
+                self._account(old, -1)
+            self._entries[key] = samples
+            self._account(samples, 1)
+            while self.current_bytes > self.max_bytes or len(self._entries) > self.max_entries:
+                _, evicted = self._entries.popitem(last=False)
+                self._account(evicted, -1)
+                self.evictions += 1
+
+    def contains(self, music):
+        with self._lock:
+            return self.make_key(music.absolute_path, music.start_time, music.end_time) in self._entries
+
+    def invalidate(self, path, content_hash=None):
+        """移除某个文件的所有缓存片段（包括磁盘缓存）"""
+        with self._lock:
+            for key in [key for key in self._entries if key[0] == path]:
+                self._account(self._entries.pop(key), -1)
+        if self.disk is not None:
+            self.disk.invalidate(path, content_hash)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self.current_bytes = 0
+            self.mapped_bytes = 0
+
+    def stats(self):
+        """返回命中率和内存占用统计"""
+        with self._lock:
+            lookups = self.hits + self.misses
+            stats = {
+                "entries": len(self._entries),
+                "bytes": self.current_bytes,
+                "max_bytes": self.max_bytes,
+                "mapped_bytes": self.mapped_bytes,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "hit_rate": self.hits / lookups if lookups else 0.0,
+            }
+        if self.disk is not None:
+            stats.update(self.disk.stats())
+        return stats
@@ -3,3 +3,5 @@ from enum import Enum
 class PlayMode(Enum):
     ONCE = "Once"
     LOOP = "Loop"
+    CROSSFADE = "Crossfade"  # 在列表中播放，结束前与下一首交叉淡化
+    SEQUENCE = "Sequence"  # 在列表中播放，结束后无缝接上下一首
@@ -0,0 +1,89 @@
+# scene.py
+
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from src.play_mode import PlayMode
+
+
+class PreparedScene:
+    """已在后台准备好的场景：预设中的全部 Music 以及可直接加入混音的开场音轨"""
+
+    def __init__(self, preset_name, music_files, tracks, prepare_time):
+        self.preset_name = preset_name
+        self.music_files = music_files
+        self.tracks = tracks  # 已解码并预热开头的 MixerTrack
+        self.prepare_time = prepare_time  # 准备耗时（秒）
+
+
+class ScenePreparer:
+    """在后台准备下一个场景：读取预设、重新定位移动过的文件、解码开场音乐并预热开头的数据
+
+    开场音乐是上次离开该场景时正在播放的音乐；没有记录时为预设中的 LOOP 音乐（环境声）。
+    同一时间只保留最近一次准备的场景。
+    """
+
+    def __init__(self, library_store, content_store, prewarm_seconds=1.0):
+        self.library_store = library_store
+        self.content_store = content_store
+        self.prewarm_seconds = prewarm_seconds
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="ScenePreparer")
+        self._prepared = None  # (预设名, Future)
+        self._lock = threading.Lock()  # 界面和控制端口都可能发起准备
+
+    def prepare(self, preset_name, mixer_engine, opening_names=None):
+        """开始在后台准备场景，返回 Future；该场景已在准备时直接返回原来的 Future"""
+        with self._lock:
+            if self._prepared is not None and self._prepared[0] == preset_name:
+                return self._prepared[1]
+            if self._prepared is not None:
+                self._prepared[1].cancel()
+            future = self._executor.submit(self._prepare, preset_name, mixer_engine, opening_names)
+            self._prepared = (preset_name, future)
+            return future
+
+    def take(self, preset_name):
+        """取走已经开始准备的场景，没有时返回 None"""
+        with self._lock:
+            if self._prepared is None or self._prepared[0] != preset_name:
+                return None
+            future = self._prepared[1]
+            self._prepared = None
+            return future
+
+    def discard(self, preset_name=None):
+        """预设被修改后丢弃已准备的结果"""
+        with self._lock:
+            if self._prepared is not None and preset_name in (None, self._prepared[0]):
+                self._prepared[1].cancel()
+                self._prepared = None
+
+    def _prepare(self, preset_name, mixer_engine, opening_names):
+        started = time.perf_counter()
+        music_files = self.library_store.load_preset(preset_name)
+        relinked = [music for music in music_files if self.content_store.relink(music)]
+        if relinked:
+            self.library_store.upsert_many(relinked)
+
+        if opening_names is not None:
+            by_name = {music.name: music for music in music_files}
+            opening = [by_name[name] for name in opening_names if name in by_name]
+        else:
+            opening = [music for music in music_files if music.play_mode == PlayMode.LOOP]
+
+        tracks = []
+        prewarm_frames = int(self.prewarm_seconds * mixer_engine.frequency)
+        for music in opening:
+            try:
+                samples = mixer_engine.load(music)
+            except Exception as e:
+                print(f"Failed to prepare {music.name}: {e}")
+                continue
+            # 读一遍开头的样本：数据来自磁盘缓存的 memmap 时把对应的页调入内存，切换后第一个混音块不会等待磁盘
+            samples[:prewarm_frames].max(initial=0)
+            tracks.append(mixer_engine.make_track(music, samples))
+        return PreparedScene(preset_name, music_files, tracks, time.perf_counter() - started)
+
+    def shutdown(self):
+        self._executor.shutdown(wait=False, cancel_futures=True)
@@ -3,6 +3,7 @@
 import customtkinter
 from src.play_mode import PlayMode
 from src.music_range_slider import MusicRangeSlider
+from src.audio_analysis import suggest_tags
 import os
 
 class ScrollableMusicInfo(customtkinter.CTkToplevel):
@@ -34,13 +35,21 @@ class ScrollableMusicInfo(customtkinter.CTkToplevel):
         self.tags_frame = customtkinter.CTkScrollableFrame(self, height=50)
         self.tags_frame.pack(pady=10)
 
+        # 根据音频分析结果建议的标签，点击即可添加
+        self.suggestion_frame = customtkinter.CTkFrame(self, fg_color="transparent")
+        self.suggestion_frame.pack(pady=5)
+        self.suggestion_label = customtkinter.CTkLabel(self.suggestion_frame, text="Analyzing...", font=("Arial", 10))
+        self.suggestion_label.pack(side="left", padx=5)
+
         # 播放模式选择
-        self.play_mode_option = customtkinter.CTkOptionMenu(self, values=[PlayMode.ONCE.value, PlayMode.LOOP.value], command=self.set_play_mode)
+        self.play_mode_option = customtkinter.CTkOptionMenu(self, values=[mode.value for mode in PlayMode], command=self.set_play_mode)
         self.play_mode_option.pack(pady=10)
         self.play_mode = PlayMode.ONCE
 
         # 音乐范围滑块
-        self.range_slider = MusicRangeSlider(self, self.audio_path, on_update_callback=self.update_range)
+        self.range_slider = MusicRangeSlider(self, self.audio_path, on_update_callback=self.update_range,
+                                             duration_cache=self.master.duration_cache,
+                                             peaks_dir=os.path.join(self.master.cache_dir, "peaks"))
         self.range_slider.pack(pady=10, fill="x")
 
         # 完成和取消按钮
@@ -53,18 +62,39 @@ class ScrollableMusicInfo(customtkinter.CTkToplevel):
         # 在关闭窗口时停止音乐播放
         self.protocol("WM_DELETE_WINDOW", self.close_window)
 
+        self.check_analysis()
+
     def get_tag_color(self, tag):
         return self.master.get_tag_color(tag)
 
-    def add_tag(self):
-        tag = self.tag_entry.get().strip()
+    def add_tag(self, tag=None):
+        if tag is None:
+            tag = self.tag_entry.get().strip()
+            self.tag_entry.delete(0, 'end')
         if tag and tag not in self.tags:
             self.tags.append(tag)
             color = self.get_tag_color(tag)  # 获取标签颜色
 
             tag_label = customtkinter.CTkLabel(self.tags_frame, text=tag, corner_radius=5, fg_color=color, padx=5)
             tag_label.pack(side="left", padx=5, pady=5)
-            self.tag_entry.delete(0, 'end')
+
+    def check_analysis(self):
+        """等待后台分析完成后显示建议标签"""
+        if not self.winfo_exists():
+            return
+        features = self.master.analyze_file(self.audio_path)
+        if features is None:
+            if self.master.audio_analyzer.has_failed(self.audio_path):
+                self.suggestion_label.configure(text="Analysis failed")
+            else:
+                self.after(300, self.check_analysis)
+            return
+        tempo = f" · {features['tempo_bpm']:.0f} BPM" if features["tempo_bpm"] else ""
+        self.suggestion_label.configure(text=f"{features['loudness_db']:.1f} dB{tempo} · Suggested:")
+        for tag in suggest_tags(features):
+            button = customtkinter.CTkButton(self.suggestion_frame, text=tag, width=60, fg_color=self.get_tag_color(tag),
+                                             command=lambda t=tag: self.add_tag(t))
+            button.pack(side="left", padx=3)
 
     def set_play_mode(self, mode):
         self.play_mode = PlayMode(mode)
@@ -0,0 +1,84 @@
+# search_index.py
+
+
+def normalize(text):
+    """搜索用的规范化文本：忽略大小写（对 CJK 字符无影响）"""
+    return text.casefold()
+
+
+def grams(text):
+    """文本中的所有单字和双字片段；按字符切分，CJK 名称无需分词"""
+    result = set(text)
+    result.update(text[i:i + 2] for i in range(len(text) - 1))
+    return result
+
+
+class SearchIndex:
+    """音乐名称和标签上的 n-gram 倒排索引，支持随输入逐步收窄的子串搜索"""
+
+    def __init__(self):
+        self._texts = {}  # 名称 -> 规范化后的可搜索文本
+        self._postings = {}  # 片段 -> 含有该片段的名称集合
+        self._version = 0
+        self._last_query = None  # 上一次查询及其结果，用于逐字收窄
+        self._last_result = None
+        self._last_version = None
+
+    def add(self, name, tags=()):
+        """加入一个条目，已有的同名条目会被替换"""
+        if name in self._texts:
+            self.remove(name)
+        text = normalize("\n".join([name, *tags]))
+        self._texts[name] = text
+        for gram in grams(text):
+            self._postings.setdefault(gram, set()).add(name)
+        self._version += 1
+
+    def remove(self, name):
+        text = self._texts.pop(name, None)
+        if text is None:
+            return
+        for gram in grams(text):
+            names = self._postings.get(gram)
+            if names is not None:
+                names.discard(name)
+                if not names:
+                    del self._postings[gram]
+        self._version += 1
+
+    def clear(self):
+        self._texts.clear()
+        self._postings.clear()
+        self._version += 1
+
+    def _candidates(self, query):
+        """用查询的各个片段求交集，得到子串匹配的候选集合"""
+        query_grams = [query[i:i + 2] for i in range(len(query) - 1)] or [query]
+        postings = [self._postings.get(gram) for gram in query_grams]
+        if any(names is None for names in postings):
+            return set()
+        postings.sort(key=len)
+        return set(postings[0]).intersection(*postings[1:])
+
+    def search(self, query):
+        """返回名称或标签中包含 query 的条目名称集合；在上一次查询后继续输入时只在上次结果中收窄"""
+        query = normalize(query.strip())
+        if not query:
+            return None  # 空查询表示不限制
+        if (self._last_result is not None and self._last_version == self._version
+                and self._last_query in query):
+            # 包含新查询的文本必然包含旧查询，只需在上次结果中筛选
+            candidates = self._last_result
+        else:
+            candidates = self._candidates(query)
+        result = {name for name in candidates if query in self._texts[name]}
+
+        self._last_query = query
+        self._last_result = result
+        self._last_version = self._version
+        return result
+
+    def matches(self, query, name, tags=()):
+        """判断单个条目是否匹配查询，用于新加入的行"""
+        query = normalize(query.strip())
+        return not query or query in normalize("\n".join([name, *tags]))
@@ -0,0 +1,151 @@
+# soundboard.py
+
+import threading
+import time
+from collections import deque
+
+import numpy as np
+
+from src.audio_decode import decode_segment, make_sound, mixer_format
+
+
+class Soundboard:
+    """热键音效板：预先把音乐解码为 pygame Sound 常驻内存，按键时直接在空闲声道上播放
+
+    音效不经过 MixerEngine，总音量和全局暂停由调用方通过 set_volume、pause_all 等同步过来。
+    """
+
+    def __init__(self, pcm_cache, buffer_frames=512, history=1000):
+        self.pcm_cache = pcm_cache
+        self.buffer_frames = buffer_frames  # 声卡输出缓冲区大小，播放开始后还要经过这段延迟才能听到
+        self.volume = 1.0  # 与混音器一致的总音量（0~1）
+        self.bindings = {}  # 按键 -> 音乐名称
+        self._sounds = {}  # 音乐名称 -> (Sound, 生成时的参数)
+        self._channels = {}  # 音乐名称 -> (播放它的 Channel, Sound)
+        self._lock = threading.Lock()
+        self._preload_thread = None
+        self.latencies = deque(maxlen=history)  # 最近的按键到首个缓冲区的耗时（秒）
+        self.misses = 0  # 按键时尚未预加载、只能现场解码的次数
+
+    @staticmethod
+    def _sound_key(music):
+        return music.absolute_path, music.start_time, music.end_time, music.gain_db
+
+    def _make_sound(self, music):
+        """解码片段并把归一化增益预先乘进样本，播放时不再做任何样本运算"""
+        samples = self.pcm_cache.get(music) if self.pcm_cache is not None else None
+        if samples is None:
+            samples = decode_segment(music.absolute_path, music.start_time, music.end_time)
+        gain = music.normalization_gain
+        if gain != 1.0:
+            samples = np.clip(samples * np.float32(gain), -32768, 32767).astype(np.int16)
+        return make_sound(samples)
+
+    def set_bindings(self, music_files):
+        """根据 Music.hotkey 重建按键映射，并在后台预加载尚未加载或已变化的音乐"""
+        bindings = {music.hotkey: music.name for music in music_files if music.hotkey}
+        with self._lock:
+            self.bindings = bindings
+            wanted = {music.name for music in music_files if music.hotkey}
+            for name in list(self._sounds):
+                if name not in wanted:
+                    del self._sounds[name]  # 释放不再绑定的音效
+        self.preload([music for music in music_files if music.hotkey])
+
+    def preload(self, music_files):
+        """在后台线程中解码，完成前按键会退回到现场解码"""
+        def run():
+            for music in music_files:
+                key = self._sound_key(music)
+                with self._lock:
+                    cached = self._sounds.get(music.name)
+                if cached is not None and cached[1] == key:
+                    continue
+                try:
+                    sound = self._make_sound(music)
+                except Exception as e:
+                    print(f"Failed to preload {music.name}: {e}")
+                    continue
+                with self._lock:
+                    self._sounds[music.name] = (sound, key)
+
+        self._preload_thread = threading.Thread(target=run, name="SoundboardPreload", daemon=True)
+        self._preload_thread.start()
+
+    @property
+    def preloaded(self):
+        with self._lock:
+            return len(self._sounds)
+
+    def music_for_key(self, key):
+        return self.bindings.get(key)
+
+    def trigger(self, music, started=None):
+        """播放一个音效；started 为按键事件开始处理的时刻，用于记录延迟。同一音效再次触发时从头播放"""
+        started = time.perf_counter() if started is None else started
+        with self._lock:
+            cached = self._sounds.get(music.name)
+        if cached is None or cached[1] != self._sound_key(music):
+            self.misses += 1
+            sound = self._make_sound(music)
+            with self._lock:
+                self._sounds[music.name] = (sound, self._sound_key(music))
+        else:
+            sound = cached[0]
+        with self._lock:
+            channel, _ = self._channels.get(music.name, (None, None))
+        if channel is not None and channel.get_sound() is sound:
+            channel.play(sound)
+        else:
+            # Sound.play 只使用未保留的声道，不会抢占混音器的输出声道；声道全部占用时返回 None
+            channel = sound.play()
+            if channel is None:
+                return
+        channel.set_volume(self.volume)
+        with self._lock:
+            self._channels[music.name] = (channel, sound)
+        self.latencies.append(time.perf_counter() - started)
+
+    def _active_channels(self):
+        """仍在播放音效的声道；声道播放结束后可能已被试听等其他声音复用，这些不算在内"""
+        with self._lock:
+            playing = list(self._channels.values())
+        return [channel for channel, sound in playing if channel.get_sound() is sound]
+
+    def stop(self, music_name):
+        with self._lock:
+            channel, sound = self._channels.pop(music_name, (None, None))
+        if channel is not None and channel.get_sound() is sound:
+            channel.stop()
+
+    ##################################全局控制##############################################
+    def set_volume(self, volume):
+        """设置总音量（0~1），正在播放的音效立即生效"""
+        self.volume = min(max(volume, 0.0), 1.0)
+        for channel in self._active_channels():
+            channel.set_volume(self.volume)
+
+    def pause_all(self):
+        for channel in self._active_channels():
+            channel.pause()
+
+    def resume_all(self):
+        for channel in self._active_channels():
+            channel.unpause()
+
+    def stop_all(self):
+        channels = self._active_channels()
+        with self._lock:
+            self._channels.clear()
+        for channel in channels:
+            channel.stop()
+
+    def latency_stats(self):
+        """返回按键延迟的百分位数（毫秒）"""
+        if not self.latencies:
+            return None
+        values = np.array(self.latencies) * 1000
+        p50, p95, p99 = np.percentile(values, [50, 95, 99])
+        frequency, _ = mixer_format()
+        return {"count": len(values), "p50": float(p50), "p95": float(p95), "p99": float(p99), "max": float(values.max()),
+                "misses": self.misses, "output_ms": self.buffer_frames / frequency * 1000}
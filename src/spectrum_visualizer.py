@@ -0,0 +1,191 @@
+# spectrum_visualizer.py
+
+import time
+
+import customtkinter
+import numpy as np
+
+
+class RingBuffer:
+    """混音线程写入、界面线程读取的单声道环形缓冲区
+
+    写入方只做一次内存复制且不加锁；读取方根据写入计数判断读取期间数据是否被覆盖，被覆盖时重读。
+    """
+
+    def __init__(self, capacity=16384):
+        self.capacity = capacity
+        self._data = np.zeros(capacity, dtype=np.float32)
+        self.written = 0  # 累计写入的帧数
+
+    def write(self, block):
+        """写入 (帧数, 声道数) 的混音块（在混音线程中调用）"""
+        mono = block.mean(axis=1) if block.ndim == 2 else block
+        frames = min(len(mono), self.capacity)
+        mono = mono[-frames:]
+        start = self.written % self.capacity
+        first = min(frames, self.capacity - start)
+        self._data[start:start + first] = mono[:first]
+        self._data[:frames - first] = mono[first:]
+        self.written += frames
+
+    def latest(self, frames):
+        """返回最近写入的 frames 帧及其写入计数"""
+        frames = min(frames, self.capacity)
+        while True:
+            written = self.written
+            end = written % self.capacity
+            indices = np.arange(end - frames, end) % self.capacity
+            result = self._data[indices]
+            # 读取期间写入方前进的距离小于空余容量时数据完整
+            if self.written - written <= self.capacity - frames:
+                return result, written
+
+
+class SpectrumVisualizer(customtkinter.CTkFrame):
+    """实时频谱和电平表：以固定帧预算在 Tk 线程中重绘，来不及时丢帧"""
+
+    def __init__(self, master, ring_buffer=None, sample_rate=44100, bands=48, fps=30,
+                 fft_size=2048, batch=4, hop=512, **kwargs):
+        super().__init__(master, **kwargs)
+        self.ring_buffer = ring_buffer
+        self.sample_rate = sample_rate
+        self.bands = bands
+        self.frame_interval = 1.0 / fps
+        self.fft_size = fft_size
+        self.batch = batch  # 每帧对最近的 batch 个重叠窗口一次性做 FFT 并取平均
+        self.hop = hop
+        self.window = np.hanning(fft_size).astype(np.float32)
+        self._band_edges = self._make_band_edges()
+        self.levels = np.zeros(self.bands, dtype=np.float32)  # 平滑后的各频段电平（0~1）
+        self.rms_level = 0.0
+        self.peak_level = 0.0
+        self._last_written = -1
+
+        # 性能统计
+        self.frames_drawn = 0
+        self.frames_dropped = 0
+        self._cpu_time = 0.0
+        self._stats_started = time.perf_counter()
+        self._next_frame = None
+        self._running = False
+
+        self.grid_columnconfigure(0, weight=1)
+        self.grid_rowconfigure(0, weight=1)
+        self.canvas = customtkinter.CTkCanvas(self, height=220, highlightthickness=0, bg="#1a1a1a")
+        self.canvas.grid(row=0, column=0, sticky="nsew")
+        self.stats_label = customtkinter.CTkLabel(self, text="", font=("Arial", 10))
+        self.stats_label.grid(row=1, column=0, sticky="w", padx=5)
+
+        # 频段柱和电平表的图形预先创建，每帧只修改坐标
+        self.bar_items = [self.canvas.create_rectangle(0, 0, 0, 0, fill="#3fa7d6", width=0) for _ in range(bands)]
+        self.rms_item = self.canvas.create_rectangle(0, 0, 0, 0, fill="#59cd90", width=0)
+        self.peak_item = self.canvas.create_line(0, 0, 0, 0, fill="#ee6352", width=2)
+
+    def _make_band_edges(self):
+        """对数间隔的频段边界（FFT bin 下标），用于 np.add.reduceat"""
+        nyquist_bin = self.fft_size // 2
+        lowest = max(1, int(30 * self.fft_size / self.sample_rate))
+        edges = np.unique(np.geomspace(lowest, nyquist_bin, self.bands + 1).astype(np.int64))
+        self.bands = len(edges) - 1
+        return edges
+
+    def set_source(self, ring_buffer, sample_rate):
+        self.ring_buffer = ring_buffer
+        self.sample_rate = sample_rate
+        self.bands = len(self.bar_items)
+        self._band_edges = self._make_band_edges()
+        self.levels = np.zeros(self.bands, dtype=np.float32)
+
+    ##################################分析##############################################
+    def analyze(self, samples):
+        """批量 FFT：把最近的若干重叠窗口堆叠后一次计算，返回各频段的 0~1 电平"""
+        starts = len(samples) - self.fft_size - self.hop * np.arange(self.batch)
+        frames = samples[starts[:, np.newaxis] + np.arange(self.fft_size)] * self.window
+        power = np.mean(np.abs(np.fft.rfft(frames, axis=1)) ** 2, axis=0)
+        band_power = np.add.reduceat(power, self._band_edges[:-1]) / np.diff(self._band_edges)
+        band_db = 10 * np.log10(band_power / (self.fft_size * 8192.0) ** 2 + 1e-12)
+        return np.clip((band_db + 90) / 90, 0, 1)
+
+    def update_levels(self):
+        """读取环形缓冲区并更新平滑后的电平；没有新数据时逐渐衰减"""
+        needed = self.fft_size + self.hop * (self.batch - 1)
+        if self.ring_buffer is not None:
+            samples, written = self.ring_buffer.latest(needed)
+        else:
+            samples, written = None, self._last_written
+        if written == self._last_written:
+            target = np.zeros(self.bands, dtype=np.float32)
+            rms = peak = 0.0
+        else:
+            self._last_written = written
+            target = self.analyze(samples)
+            recent = samples[-self.hop * 2:] / 32768.0
+            rms = float(np.sqrt(np.mean(recent ** 2)))
+            peak = float(np.max(np.abs(recent)))
+        # 上升立即跟随，下降按固定速率回落
+        self.levels = np.maximum(target, self.levels * 0.85)
+        self.rms_level = max(rms, self.rms_level * 0.85)
+        self.peak_level = max(peak, self.peak_level * 0.95)
+
+    ##################################绘制##############################################
+    def draw(self):
+        width = self.canvas.winfo_width()
+        height = self.canvas.winfo_height()
+        meter_width = 24
+        bar_area = max(width - meter_width - 10, 1)
+        bar_width = bar_area / self.bands
+        for index, (item, level) in enumerate(zip(self.bar_items, self.levels)):
+            x0 = index * bar_width
+            self.canvas.coords(item, x0 + 1, height - level * height, x0 + bar_width - 1, height)
+        for item in self.bar_items[self.bands:]:
+            self.canvas.coords(item, 0, 0, 0, 0)
+
+        meter_x = width - meter_width
+        rms_y = height - min(self.rms_level * 2, 1.0) * height  # RMS 一般远低于峰值，放大显示
+        peak_y = height - min(self.peak_level, 1.0) * height
+        self.canvas.coords(self.rms_item, meter_x, rms_y, width, height)
+        self.canvas.coords(self.peak_item, meter_x, peak_y, width, peak_y)
+
+    def start(self):
+        if not self._running:
+            self._running = True
+            self._next_frame = time.perf_counter()
+            self.after(0, self.render_frame)
+
+    def stop(self):
+        self._running = False
+
+    def render_frame(self):
+        """按固定帧间隔绘制；落后超过一帧时跳过错过的帧而不是补画"""
+        if not self._running or not self.winfo_exists():
+            return
+        cpu_started = time.thread_time()
+        if self.winfo_ismapped():
+            self.update_levels()
+            self.draw()
+            self.frames_drawn += 1
+        self._cpu_time += time.thread_time() - cpu_started
+
+        now = time.perf_counter()
+        self._next_frame += self.frame_interval
+        if now > self._next_frame:
+            missed = int((now - self._next_frame) / self.frame_interval) + 1
+            self.frames_dropped += missed
+            self._next_frame += missed * self.frame_interval
+        self.update_stats(now)
+        self.after(max(int((self._next_frame - now) * 1000), 1), self.render_frame)
+
+    def update_stats(self, now):
+        """每秒刷新一次可视化自身的 CPU 占用"""
+        elapsed = now - self._stats_started
+        if elapsed < 1.0:
+            return
+        per_frame = self._cpu_time / self.frames_drawn * 1000 if self.frames_drawn else 0.0
+        self.stats_label.configure(
+            text=f"Visualizer {self.frames_drawn / elapsed:.0f} fps · {per_frame:.2f} ms/frame · "
+                 f"CPU {self._cpu_time / elapsed * 100:.1f}% · dropped {self.frames_dropped}"
+        )
+        self.frames_drawn = 0
+        self.frames_dropped = 0
+        self._cpu_time = 0.0
+        self._stats_started = now
@@ -0,0 +1,61 @@
+# startup_profile.py
+
+import threading
+import time
+from contextlib import contextmanager
+
+
+class StartupProfiler:
+    """记录启动过程中每个阶段的耗时，后台任务全部完成后输出报告"""
+
+    def __init__(self, enabled=False, origin=None):
+        self.enabled = enabled  # 为 False 时只记录不输出
+        self.origin = origin if origin is not None else time.perf_counter()  # 计时起点（进程开始导入时）
+        self.phases = []  # (阶段名, 开始偏移, 耗时, 线程名)
+        self._last_checkpoint = self.origin
+        self._pending = set()  # 尚未完成的后台任务
+        self._lock = threading.Lock()
+
+    def _record(self, name, started, ended):
+        with self._lock:
+            self.phases.append((name, started - self.origin, ended - started, threading.current_thread().name))
+
+    def checkpoint(self, name):
+        """把上一个检查点到现在的时间记为一个阶段（用于主线程中的顺序步骤）"""
+        now = time.perf_counter()
+        self._record(name, self._last_checkpoint, now)
+        self._last_checkpoint = now
+
+    @contextmanager
+    def phase(self, name):
+        """记录一个代码块的耗时（可在后台线程中使用）"""
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self._record(name, started, time.perf_counter())
+
+    def expect(self, *names):
+        """登记需要等待完成的后台任务"""
+        with self._lock:
+            self._pending.update(names)
+
+    def done(self, name):
+        """标记一个后台任务完成，全部完成时输出报告"""
+        with self._lock:
+            self._pending.discard(name)
+            finished = not self._pending
+        if finished and self.enabled:
+            print(self.report())
+
+    def report(self):
+        """生成按开始时间排序的阶段耗时表"""
+        with self._lock:
+            phases = sorted(self.phases, key=lambda phase: phase[1])
+        width = max([len(name) for name, *_ in phases] + [5])
+        lines = [f"{'phase':<{width}}  {'start ms':>9}  {'took ms':>9}  thread"]
+        for name, start, duration, thread in phases:
+            lines.append(f"{name:<{width}}  {start * 1000:>9.1f}  {duration * 1000:>9.1f}  {thread}")
+        total = max((start + duration for _, start, duration, _ in phases), default=0)
+        lines.append(f"{'total':<{width}}  {'':>9}  {total * 1000:>9.1f}")
+        return "\n".join(lines)
@@ -0,0 +1,121 @@
+# tag_query.py
+
+import re
+
+# 括号、带引号的标签或普通标签（不含空白、括号和引号）
+_TOKEN_PATTERN = re.compile(r'\s*(?:(\()|(\))|"((?:[^"\\]|\\.)*)"|([^\s()"]+))')
+_OPERATORS = {"AND", "OR", "NOT"}
+
+
+class TagQueryError(ValueError):
+    """标签查询语法错误"""
+
+
+def quote_tag(tag):
+    """需要时为标签加引号，使其可以安全地放进查询字符串"""
+    if tag.upper() in _OPERATORS or re.search(r'[\s()"]', tag):
+        return '"' + tag.replace("\\", "\\\\").replace('"', '\\"') + '"'
+    return tag
+
+
+def tokenize(query):
+    """把查询字符串切分为 (类型, 值) 列表，运算符不区分大小写"""
+    tokens = []
+    position = 0
+    query = query.rstrip()
+    while position < len(query):
+        match = _TOKEN_PATTERN.match(query, position)
+        if not match:
+            raise TagQueryError(f"无法解析的查询：{query[position:]}")
+        lparen, rparen, quoted, word = match.groups()
+        if lparen:
+            tokens.append(("(", lparen))
+        elif rparen:
+            tokens.append((")", rparen))
+        elif quoted is not None:
+            tokens.append(("tag", re.sub(r"\\(.)", r"\1", quoted)))
+        elif word.upper() in _OPERATORS:
+            tokens.append((word.upper(), word))
+        else:
+            tokens.append(("tag", word))
+        position = match.end()
+    return tokens
+
+
+class _Parser:
+    """递归下降解析：OR 优先级最低，相邻的项之间默认为 AND，NOT 为一元运算"""
+
+    def __init__(self, tokens):
+        self.tokens = tokens
+        self.position = 0
+
+    def peek(self):
+        return self.tokens[self.position][0] if self.position < len(self.tokens) else None
+
+    def take(self):
+        token = self.tokens[self.position]
+        self.position += 1
+        return token
+
+    def parse(self):
+        if not self.tokens:
+            raise TagQueryError("查询为空")
+        node = self.parse_or()
+        if self.peek() is not None:
+            raise TagQueryError(f"多余的符号：{self.tokens[self.position][1]}")
+        return node
+
+    def parse_or(self):
+        node = self.parse_and()
+        while self.peek() == "OR":
+            self.take()
+            node = ("or", node, self.parse_and())
+        return node
+
+    def parse_and(self):
+        node = self.parse_unary()
+        while self.peek() not in (None, "OR", ")"):
+            if self.peek() == "AND":
+                self.take()
+            # “a NOT b” 等价于 “a AND NOT b”
+            node = ("and", node, self.parse_unary())
+        return node
+
+    def parse_unary(self):
+        kind = self.peek()
+        if kind == "NOT":
+            self.take()
+            return ("not", self.parse_unary())
+        if kind == "(":
+            self.take()
+            node = self.parse_or()
+            if self.peek() != ")":
+                raise TagQueryError("缺少右括号")
+            self.take()
+            return node
+        if kind == "tag":
+            return ("tag", self.take()[1])
+        raise TagQueryError("查询不完整" if kind is None else f"意外的符号：{self.tokens[self.position][1]}")
+
+
+def parse(query):
+    """把查询字符串解析为语法树"""
+    return _Parser(tokenize(query)).parse()
+
+
+def evaluate(node, lookup, universe):
+    """在位集上计算语法树：lookup(tag) 返回该标签的位掩码，universe 为全部条目的掩码"""
+    kind = node[0]
+    if kind == "tag":
+        return lookup(node[1])
+    if kind == "not":
+        return universe & ~evaluate(node[1], lookup, universe)
+    left = evaluate(node[1], lookup, universe)
+    right = evaluate(node[2], lookup, universe)
+    return left & right if kind == "and" else left | right
+
+
+def matches(node, tags):
+    """判断单个条目的标签列表是否满足查询"""
+    tag_set = set(tags)
+    return bool(evaluate(node, lambda tag: 1 if tag in tag_set else 0, 1))
@@ -0,0 +1,127 @@
+# waveform.py
+
+import os
+import struct
+import threading
+
+import numpy as np
+
+from src.content_store import hash_file
+
+# 旁路文件头：魔数、版本、第 0 层每个 bin 的帧数、第 0 层 bin 数、源文件大小、采样率
+_HEADER = struct.Struct("<4sIIQQI")
+_MAGIC = b"LAPK"
+_VERSION = 3
+
+
+def sidecar_path(peaks_dir, content_hash):
+    """波形峰值旁路文件的路径：与内容仓库和解码缓存一样以内容哈希为键，同名的不同文件互不覆盖"""
+    return os.path.join(peaks_dir, content_hash + ".peaks")
+
+
+def level_lengths(base_bins):
+    """每一层的 bin 数，逐层减半直到只剩 1 个"""
+    lengths = [base_bins]
+    while lengths[-1] > 1:
+        lengths.append((lengths[-1] + 1) // 2)
+    return lengths
+
+
+def _pad_to_multiple(values, multiple):
+    """用最后一个值把数组补齐到 multiple 的整数倍"""
+    remainder = len(values) % multiple
+    if remainder == 0:
+        return values
+    return np.concatenate([values, np.repeat(values[-1:], multiple - remainder, axis=0)])
+
+
+def build_peak_levels(samples, base_block=256):
+    """由 int16 PCM (帧数, 声道数) 构建 min/max 峰值金字塔，每层形状为 (bin 数, 2)"""
+    if len(samples) == 0:
+        return [np.zeros((1, 2), dtype=np.int16)]
+    # 先在声道间取 min/max，再按 base_block 分块
+    mins = _pad_to_multiple(samples.min(axis=1), base_block).reshape(-1, base_block).min(axis=1)
+    maxs = _pad_to_multiple(samples.max(axis=1), base_block).reshape(-1, base_block).max(axis=1)
+    levels = [np.stack([mins, maxs], axis=1).astype(np.int16)]
+    while len(levels[-1]) > 1:
+        previous = _pad_to_multiple(levels[-1], 2).reshape(-1, 2, 2)
+        levels.append(np.stack([previous[:, :, 0].min(axis=1), previous[:, :, 1].max(axis=1)], axis=1))
+    return levels
+
+
+class PeakPyramid:
+    """内存映射的多分辨率峰值金字塔，按像素列数查询，代价与样本数无关"""
+
+    def __init__(self, data, base_block, base_bins, sample_rate):
+        self.base_block = base_block
+        self.sample_rate = sample_rate
+        self.total_frames = base_bins * base_block  # 按 bin 向上取整后的帧数
+        self.levels = []
+        offset = 0
+        for length in level_lengths(base_bins):
+            self.levels.append(data[offset:offset + length])
+            offset += length
+
+    @classmethod
+    def build(cls, samples, sample_rate, path, source_size, base_block=256):
+        """构建金字塔并原子地写入旁路文件"""
+        levels = build_peak_levels(samples, base_block)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp_path = f"{path}.{threading.get_ident()}.tmp"
+        with open(tmp_path, "wb") as f:
+            f.write(_HEADER.pack(_MAGIC, _VERSION, base_block, len(levels[0]), source_size, sample_rate))
+            for level in levels:
+                f.write(np.ascontiguousarray(level, dtype="<i2").tobytes())
+        os.replace(tmp_path, path)
+        return cls.load(path, source_size, sample_rate)
+
+    @classmethod
+    def load(cls, path, source_size, sample_rate):
+        """以内存映射方式打开旁路文件；文件不存在或格式、采样率不符时返回 None"""
+        if not os.path.exists(path):
+            return None
+        with open(path, "rb") as f:
+            header = f.read(_HEADER.size)
+        if len(header) < _HEADER.size:
+            return None
+        magic, version, base_block, base_bins, stored_size, stored_rate = _HEADER.unpack(header)
+        if magic != _MAGIC or version != _VERSION or stored_size != source_size or stored_rate != sample_rate:
+            return None
+        total = sum(level_lengths(base_bins))
+        data = np.memmap(path, dtype="<i2", mode="r", offset=_HEADER.size, shape=(total, 2))
+        return cls(data, base_block, base_bins, sample_rate)
+
+    def peaks(self, start_time, end_time, columns):
+        """返回 start_time..end_time 范围内每个像素列的 (最小值, 最大值)，归一化到 -1~1"""
+        start = max(int(start_time * self.sample_rate), 0)
+        end = min(max(int(end_time * self.sample_rate), start + 1), self.total_frames)
+        frames_per_column = max((end - start) / max(columns, 1), 1)
+
+        # 选择每列至少覆盖一个 bin 的最粗层，读取量约为列数的 1~2 倍
+        level_index = 0
+        while (level_index + 1 < len(self.levels)
+               and self.base_block * 2 ** (level_index + 1) <= frames_per_column):
+            level_index += 1
+        bin_frames = self.base_block * 2 ** level_index
+        level = self.levels[level_index]
+        first = min(start // bin_frames, len(level) - 1)
+        last = min(max(-(-end // bin_frames), first + 1), len(level))
+        window = np.asarray(level[first:last], dtype=np.float32)
+
+        edges = np.linspace(0, len(window), columns, endpoint=False).astype(np.intp)
+        mins = np.minimum.reduceat(window[:, 0], edges)
+        maxs = np.maximum.reduceat(window[:, 1], edges)
+        return mins / 32768.0, maxs / 32768.0
+
+
+def load_or_build(audio_path, peaks_dir, sample_rate, decode):
+    """读取已有的旁路文件，不存在时调用 decode() 取得 PCM 构建一次
+
+    decode 由调用方提供（例如只在内存中解码），构建波形不会把导入前的源文件写入 PCM 磁盘缓存。
+    """
+    path = sidecar_path(peaks_dir, hash_file(audio_path))
+    source_size = os.path.getsize(audio_path)
+    pyramid = PeakPyramid.load(path, source_size, sample_rate)
+    if pyramid is None:
+        pyramid = PeakPyramid.build(decode(), sample_rate, path, source_size)
+    return pyramid